@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Rebuild the daily_rollups documents behind GET /reports/workorder-trends from
+each tenant's work orders, invoices, expenses and payments.
+
+Tenants are backfilled automatically the first time their trends are read;
+run this at deploy time to avoid that first slow read, or again after bulk
+imports and scripts that write to the collections directly:
+
+    python backfill_daily_rollups.py                   # every company
+    python backfill_daily_rollups.py --company <id>    # one company
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+
+from pymongo.errors import BulkWriteError, OperationFailure
+
+from server import client, db, rebuild_daily_rollups
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--company", help="only backfill this company id")
+    args = parser.parse_args()
+
+    print(f"Database: {db.name}")
+    try:
+        if args.company:
+            company_ids = [args.company]
+        else:
+            company_ids = [company['id'] async for company in db.companies.find({}, {"_id": 0, "id": 1})]
+
+        failed = 0
+        for company_id in company_ids:
+            start = time.perf_counter()
+            try:
+                days = await rebuild_daily_rollups(company_id)
+            except (BulkWriteError, OperationFailure) as e:
+                failed += 1
+                print(f"❌ {company_id}: {e}")
+                continue
+            print(f"✅ {company_id}: {days} days in {time.perf_counter() - start:.2f} s")
+        print(f"Backfilled {len(company_ids) - failed} of {len(company_ids)} companies")
+        return 1 if failed else 0
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: cost of the get_current_user dependency for a repeated token,
+with and without the verified-token memo. The user is pre-cached so the
+numbers isolate token handling from MongoDB.
+
+Usage:
+    python bench_auth_dependency.py [--iterations 100000]
+"""
+
+import argparse
+import asyncio
+import time
+
+from fastapi.security import HTTPAuthorizationCredentials
+
+import server
+
+
+async def run(credentials, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await server.get_current_user(credentials)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=100000)
+    args = parser.parse_args()
+
+    user = {"id": "bench-user", "company_id": "bench-company", "role": "ADMIN", "email": "bench@example.com",
+            "display_name": "Bench", "is_active": True}
+    token = server.create_token(user["id"], user["company_id"], user["role"])
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+    async def bench():
+        await server.user_cache.set(user["id"], user)
+        results = {}
+        for label, max_size in (("without memo", 0), ("with memo", server.TOKEN_CACHE_MAX_SIZE or 4096)):
+            server.verified_token_cache.max_size = max_size
+            server.verified_token_cache.entries.clear()
+            await run(credentials, 1000)  # warm up
+            results[label] = await run(credentials, args.iterations)
+        return results
+
+    results = asyncio.run(bench())
+    print(f"get_current_user, {args.iterations} calls with the same token")
+    for label, elapsed in results.items():
+        print(f"  {label:13s} {elapsed / args.iterations * 1e6:8.2f} us/call")
+    print(f"  speedup       {results['without memo'] / results['with memo']:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark: approving and re-prioritizing N work orders one call per item
+(approve_work_order / update_work_order, as the UI does today) against a
+single POST /workorders/bulk per operation.
+
+Usage:
+    python bench_bulk_work_orders.py [--work-orders 1000]
+"""
+
+import argparse
+import asyncio
+import os
+import time
+import uuid
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+load_dotenv(Path(__file__).parent / '.env')
+
+import server
+from server import WorkOrder, WorkOrderBulkUpdate, WorkOrderUpdate
+
+
+async def seed(db, company_id, admin, total):
+    work_orders = [
+        WorkOrder(company_id=company_id, order_number=f"WO-{i + 1:06d}", title=f"Bulk {i}", created_by=admin["id"],
+                  assigned_technicians=[str(uuid.uuid4()), str(uuid.uuid4())]).model_dump()
+        for i in range(total)
+    ]
+    await db.work_orders.insert_many(work_orders)
+    return [work_order["id"] for work_order in work_orders]
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--work-orders", type=int, default=1000)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    db = client[os.environ.get('DB_NAME', 'erp_crm_database') + "_bench_bulk"]
+    server.db = db
+    try:
+        await server.apply_index_specs()
+        print(f"{args.work_orders} work orders: approve + set priority")
+        for label in ("per-item calls", "bulk endpoint"):
+            company_id = str(uuid.uuid4())
+            admin = {"id": str(uuid.uuid4()), "company_id": company_id, "role": "ADMIN"}
+            ids = await seed(db, company_id, admin, args.work_orders)
+
+            start = time.perf_counter()
+            if label == "per-item calls":
+                for work_order_id in ids:
+                    await server.approve_work_order(company_id, work_order_id, current_user=admin)
+                    await server.update_work_order(company_id, work_order_id, WorkOrderUpdate(priority="HIGH"),
+                                                   current_user=admin)
+            else:
+                await server.bulk_update_work_orders(
+                    company_id, WorkOrderBulkUpdate(ids=ids, operation="approve"), current_user=admin)
+                await server.bulk_update_work_orders(
+                    company_id, WorkOrderBulkUpdate(ids=ids, operation="priority", priority="HIGH"), current_user=admin)
+            elapsed = time.perf_counter() - start
+
+            approved = await db.work_orders.count_documents({"company_id": company_id, "status": "APPROVED",
+                                                             "priority": "HIGH"})
+            assert approved == args.work_orders, f"{label}: only {approved} work orders updated"
+            print(f"  {label:15s} {elapsed:8.2f} s  {args.work_orders / elapsed:10.0f} work orders/s")
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
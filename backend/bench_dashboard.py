@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark: time to first render of the MSAM admin dashboard - the five
+requests it fires with Promise.all (overview, work orders, company, clients,
+employees) against one GET /dashboard. Requests go through the full ASGI app
+(auth, CORS, gzip); --rtt-ms adds a simulated network round trip per request.
+
+Usage:
+    python bench_dashboard.py [--work-orders 2000] [--rtt-ms 20] [--repeat 20]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+import bcrypt
+import httpx
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+load_dotenv(Path(__file__).parent / '.env')
+
+import server
+
+COMPANY_ID = "bench-dashboard-company"
+EMAIL = "bench-dashboard-admin@example.com"
+PASSWORD = "bench-password"
+
+
+class DelayedTransport(httpx.ASGITransport):
+    """ASGI transport that adds a fixed network round trip to every request"""
+
+    def __init__(self, rtt: float, **kwargs):
+        super().__init__(**kwargs)
+        self.rtt = rtt
+
+    async def handle_async_request(self, request):
+        await asyncio.sleep(self.rtt)
+        return await super().handle_async_request(request)
+
+
+async def seed(db, work_orders):
+    now = datetime.now(timezone.utc)
+    await db.companies.insert_one({"id": COMPANY_ID, "name": "Bench", "industry": "technical_solutions", "created_at": now})
+    await db.users.insert_one({
+        "id": "bench-admin", "company_id": COMPANY_ID, "role": "ADMIN", "email": EMAIL, "display_name": "Admin",
+        "is_active": True, "password_hash": bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt()).decode(), "created_at": now
+    })
+    technicians = [str(uuid.uuid4()) for _ in range(25)]
+    await db.users.insert_many([{"id": tech_id, "company_id": COMPANY_ID, "role": "EMPLOYEE", "is_active": True,
+                                 "email": f"tech{i}@example.com", "display_name": f"Tech {i}", "created_at": now}
+                                for i, tech_id in enumerate(technicians)])
+    await db.employees.insert_many([{"id": str(uuid.uuid4()), "company_id": COMPANY_ID, "user_id": tech_id,
+                                     "position": "Technician", "created_at": now} for tech_id in technicians])
+    await db.clients.insert_many([{"id": str(uuid.uuid4()), "company_id": COMPANY_ID, "name": f"Client {i}",
+                                   "created_at": now} for i in range(50)])
+    await db.work_orders.insert_many([
+        server.WorkOrder(company_id=COMPANY_ID, order_number=f"WO-{i + 1:06d}", title=f"Job {i}",
+                         created_by="bench-admin", assigned_technicians=[technicians[i % len(technicians)]],
+                         status=["PENDING", "APPROVED", "IN_PROGRESS", "COMPLETED"][i % 4]).model_dump()
+        for i in range(work_orders)
+    ])
+
+
+async def timed(call, repeat):
+    await call()  # warm up
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await call()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--work-orders", type=int, default=2000)
+    parser.add_argument("--rtt-ms", type=float, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    mongo = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    db = mongo[os.environ.get('DB_NAME', 'erp_crm_database') + "_bench_dashboard"]
+    server.db = db
+    transport = DelayedTransport(args.rtt_ms / 1000, app=server.app)
+    try:
+        await server.apply_index_specs()
+        await seed(db, args.work_orders)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                     headers={"Accept-Encoding": "gzip"}) as http:
+            login = await http.post("/api/auth/login", json={"email": EMAIL, "password": PASSWORD})
+            http.headers["Authorization"] = f"Bearer {login.json()['token']}"
+            base = f"/api/companies/{COMPANY_ID}"
+
+            async def five_calls():
+                responses = await asyncio.gather(
+                    http.get(f"{base}/reports/overview"),
+                    http.get(f"{base}/workorders", params={"page": 1, "limit": 10}),
+                    http.get(base),
+                    http.get(f"{base}/clients"),
+                    http.get(f"{base}/employees"),
+                )
+                assert all(response.status_code == 200 for response in responses)
+                return sum(len(response.content) for response in responses)
+
+            async def bundle():
+                response = await http.get(f"{base}/dashboard", params={"page": 1, "limit": 10})
+                assert response.status_code == 200
+                return len(response.content)
+
+            print(f"{args.work_orders} work orders, {args.rtt_ms:.0f} ms simulated RTT, median of {args.repeat} runs")
+            for label, call in (("five calls (Promise.all)", five_calls), ("GET /dashboard", bundle)):
+                size = await call()
+                print(f"  {label:26s} {await timed(call, args.repeat):9.2f} ms  {size / 1024:8.1f} KiB decoded")
+    finally:
+        await mongo.drop_database(db.name)
+        mongo.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark: memory per idle /events connection and insert-to-delivery latency
+when one change fans out to every connection of a tenant. Connections are the
+endpoint's own stream generators, all sharing this process's single change
+stream. Needs MongoDB running as a replica set.
+
+Usage:
+    python bench_event_stream.py [--connections 5000] [--changes 20]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+load_dotenv(Path(__file__).parent / '.env')
+
+import server
+from server import WorkOrder
+
+COMPANY_ID = "bench-events-company"
+ADMIN = {"id": "bench-admin", "company_id": COMPANY_ID, "role": "ADMIN"}
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--connections", type=int, default=5000)
+    parser.add_argument("--changes", type=int, default=20)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    db = client[os.environ.get('DB_NAME', 'erp_crm_database') + "_bench_events"]
+    server.db = db
+    await db.create_collection("work_orders")
+    streams = []
+    try:
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        for _ in range(args.connections):
+            response = await server.stream_company_events(COMPANY_ID, current_user=ADMIN)
+            stream = response.body_iterator
+            await stream.__anext__()  # ready event; the connection is now subscribed
+            streams.append(stream)
+        per_connection = (tracemalloc.get_traced_memory()[0] - baseline) / args.connections
+        tracemalloc.stop()
+        await asyncio.sleep(1)  # let the change stream open
+
+        samples = []
+        for i in range(args.changes):
+            receivers = [asyncio.ensure_future(stream.__anext__()) for stream in streams]
+            start = time.perf_counter()
+            await db.work_orders.insert_one(
+                WorkOrder(company_id=COMPANY_ID, order_number=f"WO-{i + 1:06d}", title=f"Event {i}",
+                          created_by=ADMIN["id"]).model_dump())
+            messages = await asyncio.gather(*receivers)
+            samples.append((time.perf_counter() - start) * 1000)
+            assert all(message.startswith("event: work_order.created") for message in messages), messages[0]
+
+        print(f"{args.connections} idle connections: {per_connection / 1024:.1f} KiB each")
+        print(f"insert -> delivered to all: median {statistics.median(samples):.1f} ms, "
+              f"max {max(samples):.1f} ms over {args.changes} changes")
+        print(server.tenant_events.stats())
+    finally:
+        for stream in streams:
+            await stream.aclose()
+        await client.drop_database(db.name)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
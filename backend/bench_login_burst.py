@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark: latency of an unrelated cached endpoint (GET /api/users/me) while a
+burst of concurrent logins runs bcrypt on the same server.
+
+Usage:
+    python bench_login_burst.py [--base-url http://localhost:8000] [--logins 50]
+
+Run it once against the current server and once with PASSWORD_HASH_WORKERS=1
+to see how the bcrypt pool size affects queueing.
+"""
+
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+LOGIN = {"email": "superadmin@erp.com", "password": "password123"}
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def login(base_url):
+    start = time.perf_counter()
+    response = requests.post(f"{base_url}/api/auth/login", json=LOGIN, timeout=30)
+    elapsed = (time.perf_counter() - start) * 1000
+    token = response.json().get("token") if response.status_code == 200 else None
+    return response.status_code, elapsed, token
+
+
+def poll_me(base_url, headers, stop, latencies):
+    session = requests.Session()
+    while not stop.is_set():
+        start = time.perf_counter()
+        session.get(f"{base_url}/api/users/me", headers=headers, timeout=30)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+def measure_me(base_url, headers, duration, pollers=4, during=None):
+    """Poll /users/me for `duration` seconds, optionally while running `during`"""
+    stop = threading.Event()
+    latencies = []
+    threads = [threading.Thread(target=poll_me, args=(base_url, headers, stop, latencies)) for _ in range(pollers)]
+    for thread in threads:
+        thread.start()
+    result = None
+    if during:
+        result = during()
+    else:
+        time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return latencies, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=3.0)
+    args = parser.parse_args()
+
+    status, _, token = login(args.base_url)
+    if status != 200:
+        print(f"❌ Login failed with status {status}")
+        return
+    headers = {"Authorization": f"Bearer {token}"}
+
+    print("Measuring GET /api/users/me baseline...")
+    idle, _ = measure_me(args.base_url, headers, args.duration)
+
+    def burst():
+        with ThreadPoolExecutor(max_workers=args.logins) as executor:
+            return list(executor.map(lambda _: login(args.base_url), range(args.logins)))
+
+    print(f"Measuring GET /api/users/me during {args.logins} concurrent logins...")
+    busy, logins = measure_me(args.base_url, headers, args.duration, during=burst)
+
+    login_times = [elapsed for _, elapsed, _ in logins]
+    failures = sum(1 for code, _, _ in logins if code != 200)
+
+    print("\nResults (ms)")
+    print(f"  /users/me idle:  n={len(idle):5d}  p50={percentile(idle, 0.5):7.2f}  p99={percentile(idle, 0.99):7.2f}")
+    print(f"  /users/me burst: n={len(busy):5d}  p50={percentile(busy, 0.5):7.2f}  p99={percentile(busy, 0.99):7.2f}")
+    print(f"  login:           n={len(login_times):5d}  mean={statistics.mean(login_times):7.2f}  "
+          f"p99={percentile(login_times, 0.99):7.2f}  failures={failures}")
+
+    metrics = requests.get(f"{args.base_url}/api/superadmin/metrics", headers=headers, timeout=30)
+    if metrics.status_code == 200:
+        print(f"\nPassword pool (pid {metrics.json()['pid']}): {metrics.json()['password_pool']}")
+
+
+if __name__ == "__main__":
+    main()
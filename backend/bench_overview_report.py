@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Benchmark: latency and peak Python memory of the overview report per tenant
+size: the original load-everything implementation, a full recount with
+aggregations (what a missing company_stats document or reconciliation costs)
+and the company_stats primary-key read get_overview_report now serves. The
+original also stops counting at 10000 documents per collection; the totals
+column shows where that bites.
+
+Seeds a separate database (<DB_NAME>_bench_overview) once per tenant size and reuses it.
+
+Usage:
+    python bench_overview_report.py [--sizes 1000,10000,50000] [--repeat 5]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+load_dotenv(Path(__file__).parent / '.env')
+
+import server
+
+STATUSES = ["PENDING", "APPROVED", "IN_PROGRESS", "COMPLETED"]
+
+
+async def seed(db, company_id, total):
+    if await db.work_orders.count_documents({"company_id": company_id}) >= total:
+        return
+    for collection in ("work_orders", "invoices", "expenses", "clients", "employees", "preventive_tasks"):
+        await db[collection].delete_many({"company_id": company_id})
+    print(f"Seeding {total} work orders (plus invoices, expenses, clients, tasks) for {company_id}...")
+    rng = random.Random(total)
+    now = datetime.now(timezone.utc)
+    for offset in range(0, total, 10000):
+        count = min(10000, total - offset)
+        work_orders = [
+            server.WorkOrder(company_id=company_id, order_number=f"WO-{offset + i + 1:07d}", title=f"Job {offset + i}",
+                             description="Routine maintenance " * 10, created_by="bench-admin",
+                             status=rng.choice(STATUSES), quoted_price=rng.uniform(50, 500)).model_dump()
+            for i in range(count)
+        ]
+        await db.work_orders.insert_many(work_orders, ordered=False)
+        await db.invoices.insert_many([
+            {"id": str(uuid.uuid4()), "company_id": company_id, "work_order_id": wo["id"],
+             "invoice_number": f"INV-{wo['order_number']}", "total_amount": round(rng.uniform(50, 500), 2),
+             "status": rng.choice(["DRAFT", "ISSUED", "PAID"]), "created_at": now}
+            for wo in work_orders
+        ], ordered=False)
+        await db.expenses.insert_many([
+            {"id": str(uuid.uuid4()), "company_id": company_id, "work_order_id": wo["id"], "description": "Parts",
+             "amount": round(rng.uniform(5, 200), 2), "uploaded_by": "bench-admin", "created_at": now}
+            for wo in work_orders
+        ], ordered=False)
+    await db.clients.insert_many([{"id": str(uuid.uuid4()), "company_id": company_id, "name": f"Client {i}",
+                                   "created_at": now} for i in range(max(total // 10, 1))])
+    await db.employees.insert_many([{"id": str(uuid.uuid4()), "company_id": company_id, "user_id": str(uuid.uuid4()),
+                                     "position": "Technician", "created_at": now} for i in range(max(total // 100, 1))])
+    await db.preventive_tasks.insert_many([{"id": str(uuid.uuid4()), "company_id": company_id, "title": f"Task {i}",
+                                            "status": rng.choice(["ACTIVE", "PAUSED"]), "created_at": now}
+                                           for i in range(max(total // 10, 1))])
+
+
+async def legacy_overview(db, company_id):
+    """The body get_overview_report used to have"""
+    work_orders = await db.work_orders.find({"company_id": company_id}, {"_id": 0}).to_list(10000)
+    status_counts = {}
+    for wo in work_orders:
+        status_counts[wo['status']] = status_counts.get(wo['status'], 0) + 1
+    invoices = await db.invoices.find({"company_id": company_id}, {"_id": 0}).to_list(10000)
+    total_revenue = sum(inv['total_amount'] for inv in invoices if inv['status'] in ['ISSUED', 'PAID'])
+    pending_invoices = sum(1 for inv in invoices if inv['status'] == 'ISSUED')
+    expenses = await db.expenses.find({"company_id": company_id}, {"_id": 0}).to_list(10000)
+    total_expenses = sum(exp['amount'] for exp in expenses)
+    vehicle_count = await db.vehicles.count_documents({"company_id": company_id})
+    preventive_task_count = await db.preventive_tasks.count_documents({"company_id": company_id})
+    return {
+        "total_work_orders": len(work_orders),
+        "status_breakdown": status_counts,
+        "total_revenue": total_revenue,
+        "total_expenses": total_expenses,
+        "profit_margin": total_revenue - total_expenses,
+        "pending_invoices": pending_invoices,
+        "active_clients": len(await db.clients.find({"company_id": company_id}, {"_id": 0}).to_list(10000)),
+        "active_employees": len(await db.employees.find({"company_id": company_id}, {"_id": 0}).to_list(10000)),
+        "total_vehicles": vehicle_count,
+        "preventive_tasks": {
+            "total": preventive_task_count,
+            "active": len([t for t in await db.preventive_tasks.find({"company_id": company_id}, {"_id": 0}).to_list(10000)
+                           if t.get('status') == 'ACTIVE'])
+        }
+    }
+
+
+async def measure(call, repeat):
+    tracemalloc.start()
+    report = await call()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await call()
+        samples.append((time.perf_counter() - start) * 1000)
+    return report, statistics.median(samples), peak
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,10000,50000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    db = client[os.environ.get('DB_NAME', 'erp_crm_database') + "_bench_overview"]
+    server.db = db
+    try:
+        await server.apply_index_specs()
+        for size in (int(value) for value in args.sizes.split(',')):
+            company_id = f"bench-overview-{size}"
+            await seed(db, company_id, size)
+            admin = {"id": "bench-admin", "company_id": company_id, "role": "ADMIN"}
+
+            async def recount():
+                await db.company_stats.delete_one({"_id": company_id})
+                return await server.get_overview_report(company_id, current_user=admin)
+
+            print(f"\n{size} work orders, median of {args.repeat} runs")
+            for label, call in (("load everything", lambda: legacy_overview(db, company_id)),
+                                ("aggregations", recount),
+                                ("company_stats", lambda: server.get_overview_report(company_id, current_user=admin))):
+                report, latency, peak = await measure(call, args.repeat)
+                print(f"  {label:16s} {latency:9.2f} ms  peak {peak / 1024 / 1024:7.2f} MiB  "
+                      f"work orders counted {report['total_work_orders']:>7}  revenue {report['total_revenue']:14.2f}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
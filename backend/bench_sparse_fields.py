@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark: payload size and latency of a WorkOrdersList-style page with and
+without a sparse fieldset (?fields=...). Work orders are seeded with the
+products, attachments, metadata and long descriptions real tenants carry.
+
+Usage:
+    python bench_sparse_fields.py [--work-orders 2000] [--limit 100] [--repeat 20]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+from dotenv import load_dotenv
+from fastapi.encoders import jsonable_encoder
+from motor.motor_asyncio import AsyncIOMotorClient
+
+load_dotenv(Path(__file__).parent / '.env')
+
+import server
+
+COMPANY_ID = "bench-fields-company"
+ADMIN = {"id": "bench-admin", "company_id": COMPANY_ID, "role": "ADMIN"}
+# Fields rendered by frontend/src/components/WorkOrdersList.jsx
+LIST_FIELDS = "order_number,title,description,status,priority,promise_date"
+
+
+def make_work_order(i):
+    now = datetime.now(timezone.utc).isoformat()
+    return {
+        "id": str(uuid.uuid4()),
+        "company_id": COMPANY_ID,
+        "order_number": f"WO-{i + 1:06d}",
+        "title": f"Service request {i}",
+        "description": "Customer reports intermittent fault; full inspection requested. " * 8,
+        "created_by": ADMIN["id"],
+        "assigned_technicians": [str(uuid.uuid4()) for _ in range(2)],
+        "status": "PENDING",
+        "priority": "MEDIUM",
+        "attachments": [f"/api/uploads/{uuid.uuid4()}.jpg" for _ in range(4)],
+        "products": [
+            {"name": f"Part {n}", "sku": f"SKU-{n:05d}", "quantity": n % 5 + 1, "unit_price": 12.5 * n}
+            for n in range(10)
+        ],
+        "metadata": {"source": "bench", "notes": "x" * 300},
+        "promise_date": now,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--work-orders", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    db = client[os.environ.get('DB_NAME', 'erp_crm_database') + "_bench_fields"]
+    server.db = db
+    try:
+        await server.apply_index_specs()
+        await db.work_orders.insert_many([make_work_order(i) for i in range(args.work_orders)])
+
+        print(f"WorkOrdersList page of {args.limit}, median of {args.repeat} runs")
+        for label, fields in (("full documents", None), ("fields=list view", LIST_FIELDS)):
+            async def call():
+                response = await server.get_work_orders(
+                    COMPANY_ID, status=None, assigned_to=None, client_id=None, priority=None, search=None,
+                    page=1, limit=args.limit, after=None, include_total=False, fields=fields, current_user=ADMIN
+                )
+                # Serialize as the endpoint would so the encoding cost is included
+                return json.dumps(jsonable_encoder(response)).encode('utf-8')
+
+            payload = await call()  # warm up
+            samples = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                await call()
+                samples.append((time.perf_counter() - start) * 1000)
+            print(f"  {label:18s} {len(payload) / 1024:8.1f} KiB  {statistics.median(samples):8.2f} ms")
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
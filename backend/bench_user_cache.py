@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: per-process user cache lookup cost and memory at 100k users.
+
+Compares the original implementation (plain dict of datetime-stamped entries,
+expiry checked with datetime.now on every lookup) against LocalUserCache
+(slotted entries, monotonic deadlines, O(1) LRU).
+
+Usage:
+    python bench_user_cache.py [--users 100000] [--lookups 1000000]
+"""
+
+import argparse
+import asyncio
+import gc
+import random
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from server import LocalUserCache
+
+CACHE_TTL = 600
+
+
+class LegacyCacheEntry:
+    def __init__(self, data):
+        self.data = data
+        self.timestamp = datetime.now(timezone.utc)
+
+    def is_expired(self):
+        return (datetime.now(timezone.utc) - self.timestamp).total_seconds() > CACHE_TTL
+
+
+class LegacyUserCache:
+    """The dict + CacheEntry lookup that get_current_user used to do inline"""
+
+    def __init__(self):
+        self.entries = {}
+
+    async def get(self, key):
+        cache_entry = self.entries.get(key)
+        if cache_entry and isinstance(cache_entry, LegacyCacheEntry) and not cache_entry.is_expired():
+            return cache_entry.data.copy()
+        return None
+
+    async def set(self, key, value):
+        self.entries[key] = LegacyCacheEntry(value)
+
+
+def make_user(i):
+    return {
+        "id": f"user-{i:08d}",
+        "company_id": f"company-{i % 50}",
+        "role": "EMPLOYEE",
+        "email": f"user{i}@example.com",
+        "display_name": f"User {i}",
+        "is_active": True,
+        "notifications_enabled": True,
+        "metadata": {},
+        "created_at": "2025-01-01T00:00:00+00:00",
+        "last_login": None,
+    }
+
+
+async def fill(cache, users):
+    for user in users:
+        await cache.set(user["id"], user)
+
+
+async def lookups(cache, keys):
+    start = time.perf_counter()
+    for key in keys:
+        await cache.get(key)
+    return time.perf_counter() - start
+
+
+def measure(name, factory, users, keys):
+    gc.collect()
+    tracemalloc.start()
+    cache = factory()
+    asyncio.run(fill(cache, users))
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    elapsed = asyncio.run(lookups(cache, keys))
+    print(f"  {name:8s} lookup {elapsed / len(keys) * 1e9:8.1f} ns/op   "
+          f"cache overhead {memory / len(users):7.1f} B/user   ({memory / 1024 / 1024:.1f} MiB total)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=1000000)
+    args = parser.parse_args()
+
+    # Users are created up front so both caches are charged only for their own structures
+    users = [make_user(i) for i in range(args.users)]
+    keys = [users[random.randrange(args.users)]["id"] for _ in range(args.lookups)]
+
+    print(f"User cache at {args.users} cached users, {args.lookups} random lookups")
+    measure("legacy", LegacyUserCache, users, keys)
+    measure("lru", lambda: LocalUserCache(max_size=args.users, ttl=CACHE_TTL), users, keys)
+
+
+if __name__ == "__main__":
+    main()
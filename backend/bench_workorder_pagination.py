@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark: GET /companies/{id}/workorders page 1 vs page 500 on one large tenant,
+comparing skip/limit page numbers with the keyset cursor (after=...), with and
+without the exact total count.
+
+Seeds a separate database (<DB_NAME>_bench_pagination) once and reuses it.
+
+Usage:
+    python bench_workorder_pagination.py [--work-orders 1000000] [--page 500] [--limit 10]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+load_dotenv(Path(__file__).parent / '.env')
+
+import server
+
+COMPANY_ID = "bench-pagination-company"
+ADMIN = {"id": "bench-admin", "company_id": COMPANY_ID, "role": "ADMIN"}
+
+
+async def seed(db, total):
+    existing = await db.work_orders.count_documents({"company_id": COMPANY_ID})
+    if existing >= total:
+        return
+    await db.work_orders.delete_many({"company_id": COMPANY_ID})
+    print(f"Seeding {total} work orders...")
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    statuses = ["PENDING", "APPROVED", "IN_PROGRESS", "COMPLETED"]
+    batch = []
+    for i in range(total):
+        created_at = (start + timedelta(seconds=i * 30)).isoformat()
+        batch.append({
+            "id": str(uuid.uuid4()),
+            "company_id": COMPANY_ID,
+            "order_number": f"WO-{i + 1:07d}",
+            "title": f"Work order {i}",
+            "description": "Benchmark work order " * 5,
+            "created_by": ADMIN["id"],
+            "assigned_technicians": [],
+            "status": statuses[i % len(statuses)],
+            "priority": "MEDIUM",
+            "created_at": created_at,
+            "updated_at": created_at,
+        })
+        if len(batch) == 10000:
+            await db.work_orders.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await db.work_orders.insert_many(batch, ordered=False)
+
+
+async def timed(call, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await call()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--work-orders", type=int, default=1000000)
+    parser.add_argument("--page", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    server.db = client[os.environ.get('DB_NAME', 'erp_crm_database') + "_bench_pagination"]
+    try:
+        await server.apply_index_specs()
+        await seed(server.db, args.work_orders)
+
+        def page_call(page, include_total, after=None):
+            return lambda: server.get_work_orders(
+                COMPANY_ID, status=None, assigned_to=None, client_id=None, priority=None, search=None,
+                page=page, limit=args.limit, after=after, include_total=include_total, current_user=ADMIN
+            )
+
+        # Cursor for the last item of the page before the target page (not timed)
+        previous = await server.get_work_orders(
+            COMPANY_ID, status=None, assigned_to=None, client_id=None, priority=None, search=None,
+            page=args.page - 1, limit=args.limit, after=None, include_total=False, current_user=ADMIN
+        )
+        deep_cursor = previous["pagination"]["next_cursor"]
+
+        rows = [
+            ("page=1  skip   + total", page_call(1, True)),
+            (f"page={args.page} skip + total", page_call(args.page, True)),
+            ("page=1  skip   no total", page_call(1, False)),
+            (f"page={args.page} skip no total", page_call(args.page, False)),
+            (f"page={args.page} cursor no total", page_call(1, False, deep_cursor)),
+        ]
+        print(f"\nMedian latency over {args.repeat} runs, {args.work_orders} work orders, limit={args.limit}")
+        for label, call in rows:
+            await call()  # warm up
+            print(f"  {label:28s} {await timed(call, args.repeat):9.2f} ms")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
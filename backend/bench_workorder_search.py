@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Benchmark: work-order search latency per tenant size, comparing the original
+unanchored $regex search with the work_orders_search text index and the exact
+order-number lookup. Both paths return the first page plus the total.
+
+Seeds a separate database (<DB_NAME>_bench_search) once per tenant size and reuses it.
+
+Usage:
+    python bench_workorder_search.py [--sizes 100000,1000000] [--repeat 5]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+load_dotenv(Path(__file__).parent / '.env')
+
+import server
+
+WORDS = ["brake", "engine", "oil", "filter", "tyre", "battery", "inspection", "pump", "valve", "hydraulic",
+         "compressor", "generator", "alignment", "coolant", "gearbox", "clutch", "sensor", "wiring", "leak", "service"]
+
+
+async def seed(db, company_id, total):
+    if await db.work_orders.count_documents({"company_id": company_id}) >= total:
+        return
+    await db.work_orders.delete_many({"company_id": company_id})
+    print(f"Seeding {total} work orders for {company_id}...")
+    rng = random.Random(total)
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    batch = []
+    for i in range(total):
+        created_at = (start + timedelta(seconds=i * 30)).isoformat()
+        batch.append({
+            "id": str(uuid.uuid4()),
+            "company_id": company_id,
+            "order_number": f"WO-{i + 1:06d}",
+            "title": " ".join(rng.sample(WORDS, 3)).capitalize(),
+            "description": " ".join(rng.choice(WORDS) for _ in range(20)),
+            "created_by": "bench-admin",
+            "assigned_technicians": [],
+            "status": "PENDING",
+            "priority": "MEDIUM",
+            "created_at": created_at,
+            "updated_at": created_at,
+        })
+        if len(batch) == 10000:
+            await db.work_orders.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await db.work_orders.insert_many(batch, ordered=False)
+
+
+async def legacy_search(db, company_id, search, limit=10):
+    """The $regex query get_work_orders used to build"""
+    query = {"company_id": company_id, "$or": [
+        {'title': {'$regex': search, '$options': 'i'}},
+        {'description': {'$regex': search, '$options': 'i'}},
+        {'order_number': {'$regex': search, '$options': 'i'}}
+    ]}
+    total = await db.work_orders.count_documents(query)
+    page = await db.work_orders.find(query, {"_id": 0}).sort("created_at", -1).limit(limit).to_list(limit)
+    return total, page
+
+
+async def timed(call, repeat):
+    await call()  # warm up
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await call()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="100000,1000000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    db = client[os.environ.get('DB_NAME', 'erp_crm_database') + "_bench_search"]
+    server.db = db
+    try:
+        await server.apply_index_specs()
+        for size in (int(value) for value in args.sizes.split(',')):
+            company_id = f"bench-search-{size}"
+            await seed(db, company_id, size)
+            admin = {"id": "bench-admin", "company_id": company_id, "role": "ADMIN"}
+            order_number = f"WO-{size // 2:06d}"
+
+            def indexed(search):
+                async def call():
+                    # Bypass the total cache so every run pays for the count
+                    server.list_counts.entries.clear()
+                    return await server.get_work_orders(
+                        company_id, status=None, assigned_to=None, client_id=None, priority=None, search=search,
+                        page=1, limit=10, after=None, include_total=True, current_user=admin
+                    )
+                return call
+
+            rows = [
+                ("word   $regex", lambda: legacy_search(db, company_id, "hydraulic")),
+                ("word   text index", indexed("hydraulic")),
+                ("order  $regex", lambda: legacy_search(db, company_id, order_number)),
+                ("order  exact lookup", indexed(order_number)),
+            ]
+            print(f"\n{size} work orders, median of {args.repeat} runs (first page + total)")
+            for label, call in rows:
+                print(f"  {label:22s} {await timed(call, args.repeat):9.2f} ms")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
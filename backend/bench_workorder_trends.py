@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark: trend report latency per tenant history size, comparing the
+original scan-and-bucket-in-Python implementation with the daily_rollups
+read, for a one-year range grouped by day, week, month and quarter.
+
+Seeds a separate database (<DB_NAME>_bench_trends) once per history size and reuses it.
+
+Usage:
+    python bench_workorder_trends.py [--sizes 10000,100000] [--years 3] [--repeat 5]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+load_dotenv(Path(__file__).parent / '.env')
+
+import server
+
+
+async def seed(db, company_id, total, years):
+    if await db.work_orders.count_documents({"company_id": company_id}) >= total:
+        return
+    await db.work_orders.delete_many({"company_id": company_id})
+    await db.companies.update_one({"id": company_id}, {"$set": {"name": company_id}, "$unset": {"rollups_backfilled_at": ""}},
+                                  upsert=True)
+    print(f"Seeding {total} work orders over {years} years for {company_id}...")
+    end = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    step = timedelta(days=365 * years) / total
+    batch = []
+    for i in range(total):
+        created_at = (end - step * (total - i)).isoformat()
+        batch.append(server.WorkOrder(company_id=company_id, order_number=f"WO-{i + 1:07d}", title=f"Job {i}",
+                                      created_by="bench-admin", status="COMPLETED" if i % 3 == 0 else "PENDING",
+                                      created_at=created_at, updated_at=created_at).model_dump())
+        if len(batch) == 10000:
+            await db.work_orders.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await db.work_orders.insert_many(batch, ordered=False)
+
+
+async def legacy_trends(db, company_id, from_date, to_date, group_by):
+    """The body get_workorder_trends used to have"""
+    query = {"company_id": company_id, "created_at": {"$gte": from_date, "$lte": to_date}}
+    work_orders = await db.work_orders.find(query, {"_id": 0}).to_list(10000)
+    trends = {}
+    for wo in work_orders:
+        date_str = wo['created_at'][:10]
+        key = date_str[:7] if group_by in ("month", "week") else date_str
+        trends[key] = trends.get(key, 0) + 1
+    return trends
+
+
+async def timed(call, repeat):
+    await call()  # warm up (and backfill)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await call()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000")
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    db = client[os.environ.get('DB_NAME', 'erp_crm_database') + "_bench_trends"]
+    server.db = db
+    from_date, to_date = "2024-01-01", "2024-12-31"
+    try:
+        await server.apply_index_specs()
+        for size in (int(value) for value in args.sizes.split(',')):
+            company_id = f"bench-trends-{size}"
+            await seed(db, company_id, size, args.years)
+            admin = {"id": "bench-admin", "company_id": company_id, "role": "ADMIN"}
+
+            start = time.perf_counter()
+            days = await server.rebuild_daily_rollups(company_id)
+            print(f"\n{size} work orders: backfilled {days} days in {(time.perf_counter() - start) * 1000:.0f} ms; "
+                  f"{from_date}..{to_date}, median of {args.repeat} runs")
+            for group_by in server.TREND_GROUPS:
+                async def scan():
+                    return await legacy_trends(db, company_id, from_date, to_date, group_by)
+
+                async def rollups():
+                    return await server.get_workorder_trends(company_id, from_date=from_date, to_date=to_date,
+                                                             group_by=group_by, current_user=admin)
+
+                scanned, report = await scan(), await rollups()
+                print(f"  {group_by:8s} scan {await timed(scan, args.repeat):9.2f} ms ({sum(scanned.values()):>6} counted)"
+                      f"   rollups {await timed(rollups, args.repeat):8.2f} ms ({sum(report['trends'].values()):>6} counted, "
+                      f"{len(report['series'])} periods)")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
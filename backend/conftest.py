@@ -0,0 +1,86 @@
+"""
+Shared setup for the backend tests, which run against the MongoDB at MONGO_URL.
+
+Each check gets a scratch database named DB_NAME + "_test_<name>" that
+server.db points at while it runs and that is dropped afterwards. When
+MONGO_URL cannot be reached the test modules are skipped instead of failing
+on import or on their first query.
+
+A test module passes its async check to the run_with_test_db fixture:
+
+    def test_something(run_with_test_db):
+        run_with_test_db("something", run_something_checks)
+
+and runs it directly with asyncio.run(with_test_db("something", run_something_checks)).
+"""
+
+import asyncio
+import functools
+import os
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+import pytest
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+load_dotenv(Path(__file__).parent / '.env')
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = os.environ.get('DB_NAME', 'erp_crm_database')
+PING_TIMEOUT_MS = 3000
+
+
+@functools.lru_cache(maxsize=None)
+def mongo_unavailable() -> Optional[str]:
+    """Why MONGO_URL cannot be used, or None when the server answers a ping"""
+    client = None
+    try:
+        client = MongoClient(MONGO_URL, serverSelectionTimeoutMS=PING_TIMEOUT_MS, connectTimeoutMS=PING_TIMEOUT_MS)
+        client.admin.command('ping')
+    except PyMongoError as e:
+        return f"no MongoDB reachable at MONGO_URL: {e}"
+    finally:
+        if client:
+            client.close()
+    return None
+
+
+class UnavailableModule(pytest.Module):
+    """A test module skipped as a whole; importing server already needs a resolvable MONGO_URL"""
+
+    def collect(self):
+        pytest.skip(mongo_unavailable(), allow_module_level=True)
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pycollect_makemodule(module_path, parent):
+    if module_path.name.startswith("test_") and mongo_unavailable():
+        return UnavailableModule.from_parent(parent, path=module_path)
+    return None
+
+
+async def with_test_db(name: str, check: Callable[[Any], Awaitable[Any]], **client_options) -> Any:
+    """Run check(db) against a scratch database, with server.db pointing at it for the duration"""
+    import server
+
+    client = AsyncIOMotorClient(MONGO_URL, **client_options)
+    db = client[f"{DB_NAME}_test_{name}"]
+    previous_db = server.db
+    server.db = db
+    try:
+        return await check(db)
+    finally:
+        server.db = previous_db
+        await client.drop_database(db.name)
+        client.close()
+
+
+@pytest.fixture
+def run_with_test_db():
+    """with_test_db for synchronous tests: runs the check in a fresh event loop"""
+    def run(name: str, check: Callable[[Any], Awaitable[Any]], **client_options) -> Any:
+        return asyncio.run(with_test_db(name, check, **client_options))
+    return run
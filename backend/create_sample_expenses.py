@@ -33,7 +33,7 @@ async def create_sample_expenses():
                 'description': f'Sample expense {j+1} for {wo["order_number"]}',
                 'amount': 100.0 * (j + 1),  # $100, $200, $300
                 'category': 'materials' if j % 2 == 0 else 'labor',
-                'created_at': datetime.now(timezone.utc).isoformat()
+                'created_at': datetime.now(timezone.utc)
             }
             expenses_to_create.append(expense)
     
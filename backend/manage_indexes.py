@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Apply or verify the database indexes declared in server.INDEX_SPECS.
+
+Run this as a deploy/migration step before starting the workers:
+
+    python manage_indexes.py apply                      # create missing indexes, then report drift
+    python manage_indexes.py apply --drop-conflicting   # rebuild indexes whose keys/options changed
+    python manage_indexes.py apply --strict             # fail the deploy if any index could not be created
+    python manage_indexes.py apply --renumber-duplicates  # renumber reused order/invoice numbers first
+    python manage_indexes.py check                      # report drift only, exit 1 if any
+    python manage_indexes.py duplicates                 # report keys that block a unique index, exit 1 if any
+
+"Drift" is any index that is missing, differs from the spec (conflicting),
+or exists in the database but not in the spec (extra). A unique index
+cannot be built while its key is already duplicated: apply reports those
+keys, and --renumber-duplicates gives every reused work order or invoice
+number but the oldest a fresh one from the tenant's counter. Other
+duplicates have to be cleaned up by hand.
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+
+from server import (INDEX_SPECS, apply_index_specs, check_index_drift, client, db, find_unique_duplicates,
+                    renumber_duplicate_numbers)
+
+
+def print_drift(drift):
+    if not drift:
+        print(f"✅ Indexes match the spec ({len(INDEX_SPECS)} collections)")
+        return
+    for collection_name, problems in drift.items():
+        for kind in ("missing", "conflicting", "extra"):
+            for name in problems[kind]:
+                print(f"❌ {collection_name}.{name}: {kind}")
+
+
+def print_duplicates(duplicates):
+    if not duplicates:
+        print("✅ No duplicate keys under unique indexes")
+        return
+    for collection_name, indexes in duplicates.items():
+        for name, groups in indexes.items():
+            for group in groups:
+                print(f"❌ {collection_name}.{name}: {group['key']} is used by {len(group['ids'])} documents")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["apply", "check", "duplicates"])
+    parser.add_argument("--drop-conflicting", action="store_true",
+                        help="drop indexes whose keys or options differ from the spec before creating them")
+    parser.add_argument("--drop-extra", action="store_true",
+                        help="drop indexes that exist in the database but not in the spec")
+    parser.add_argument("--strict", action="store_true",
+                        help="exit non-zero from apply if any index could not be created")
+    parser.add_argument("--renumber-duplicates", action="store_true",
+                        help="give reused work order and invoice numbers fresh ones before creating indexes")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    print(f"Database: {db.name}")
+    try:
+        if args.command == "duplicates":
+            duplicates = await find_unique_duplicates(only_missing=False)
+            print_duplicates(duplicates)
+            return 1 if duplicates else 0
+
+        errors = {}
+        if args.command == "apply":
+            if args.renumber_duplicates:
+                for collection_name, count in (await renumber_duplicate_numbers()).items():
+                    print(f"Renumbered {count} {collection_name}")
+            duplicates = await find_unique_duplicates()
+            if duplicates:
+                print_duplicates(duplicates)
+            errors = await apply_index_specs(drop_conflicting=args.drop_conflicting)
+            if args.drop_extra:
+                for collection_name, problems in (await check_index_drift()).items():
+                    for name in problems["extra"]:
+                        print(f"Dropping extra index {collection_name}.{name}")
+                        await db[collection_name].drop_index(name)
+
+        drift = await check_index_drift()
+        print_drift(drift)
+        if args.command == "check":
+            return 1 if drift else 0
+        return 1 if errors and args.strict else 0
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
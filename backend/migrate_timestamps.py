@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Convert timestamps stored as ISO strings to native BSON dates, for every
+field listed in server.TIMESTAMP_FIELDS.
+
+The migration runs online: the workers keep serving while it walks each
+collection in _id order, converting one batch per bulk write. The server
+reads both forms, but date-range filters only match converted documents,
+so run it right after deploying:
+
+    python migrate_timestamps.py                          # convert everything
+    python migrate_timestamps.py --batch-size 500 --pause 0.2   # gentler on a busy cluster
+    python migrate_timestamps.py --collection work_orders # one collection
+    python migrate_timestamps.py --check                  # report what is left, exit 1 if anything
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+
+from server import TIMESTAMP_FIELDS, client, count_string_timestamps, db, migrate_timestamp_field
+
+
+def print_remaining(remaining):
+    if not remaining:
+        print("✅ All timestamps are BSON dates")
+        return
+    for collection_name, fields in remaining.items():
+        for field, count in fields.items():
+            print(f"❌ {collection_name}.{field}: {count} strings")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collection", choices=sorted(TIMESTAMP_FIELDS), help="only migrate this collection")
+    parser.add_argument("--batch-size", type=int, default=1000, help="documents converted per bulk write")
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between batches")
+    parser.add_argument("--check", action="store_true", help="only count the timestamps still stored as strings")
+    args = parser.parse_args()
+
+    print(f"Database: {db.name}")
+    try:
+        if not args.check:
+            collections = [args.collection] if args.collection else list(TIMESTAMP_FIELDS)
+            for collection_name in collections:
+                for field in TIMESTAMP_FIELDS[collection_name]:
+                    start = time.perf_counter()
+                    result = await migrate_timestamp_field(collection_name, field, args.batch_size, args.pause)
+                    note = f", {result['unparseable']} unparseable left as strings" if result['unparseable'] else ""
+                    print(f"{collection_name}.{field}: {result['converted']} converted "
+                          f"in {time.perf_counter() - start:.2f} s{note}")
+
+        remaining = await count_string_timestamps()
+        print_remaining(remaining)
+        return 1 if remaining and args.check else 0
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Rebuild the company_stats documents behind GET /reports/overview from the
+tenants' collections and report which counters had drifted.
+
+The write handlers keep company_stats current with $inc; run this after bulk
+imports, manual data fixes or scripts that write to the collections directly,
+or on a schedule as a safety net:
+
+    python reconcile_company_stats.py                   # every company
+    python reconcile_company_stats.py --company <id>    # one company
+    python reconcile_company_stats.py --check           # exit 1 if anything had drifted
+"""
+
+import argparse
+import asyncio
+import sys
+
+from server import client, company_stats_drift, db, rebuild_company_stats
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--company", help="only reconcile this company id")
+    parser.add_argument("--check", action="store_true", help="exit non-zero if any counter had drifted")
+    args = parser.parse_args()
+
+    print(f"Database: {db.name}")
+    try:
+        if args.company:
+            company_ids = [args.company]
+        else:
+            company_ids = [company['id'] async for company in db.companies.find({}, {"_id": 0, "id": 1})]
+
+        drifted = 0
+        for company_id in company_ids:
+            stored = await db.company_stats.find_one({"_id": company_id})
+            drift = company_stats_drift(stored, await rebuild_company_stats(company_id))
+            if stored is None:
+                print(f"➕ {company_id}: built")
+            elif drift:
+                drifted += 1
+                for key, values in sorted(drift.items()):
+                    print(f"❌ {company_id} {key}: stored {values['stored']}, actual {values['actual']}")
+            else:
+                print(f"✅ {company_id}")
+        print(f"Reconciled {len(company_ids)} companies, {drifted} had drifted")
+        return 1 if drifted and args.check else 0
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
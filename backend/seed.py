@@ -39,7 +39,7 @@ async def seed_database():
             'address': 'Dubai, UAE',
             'contact_email': 'contact@sama.com',
             'contact_phone': '+971-123456789',
-            'created_at': datetime.now(timezone.utc).isoformat()
+            'created_at': datetime.now(timezone.utc)
         },
         {
             'id': str(uuid.uuid4()),
@@ -49,7 +49,7 @@ async def seed_database():
             'address': 'Abu Dhabi, UAE',
             'contact_email': 'contact@vigor.com',
             'contact_phone': '+971-987654321',
-            'created_at': datetime.now(timezone.utc).isoformat()
+            'created_at': datetime.now(timezone.utc)
         },
         {
             'id': str(uuid.uuid4()),
@@ -59,7 +59,7 @@ async def seed_database():
             'address': 'Sharjah, UAE',
             'contact_email': 'contact@msam.com',
             'contact_phone': '+971-555555555',
-            'created_at': datetime.now(timezone.utc).isoformat()
+            'created_at': datetime.now(timezone.utc)
         }
     ]
     
@@ -79,7 +79,7 @@ async def seed_database():
         'is_active': True,
         'notifications_enabled': True,
         'metadata': {},
-        'created_at': datetime.now(timezone.utc).isoformat(),
+        'created_at': datetime.now(timezone.utc),
         'last_login': None
     }
     await db.users.insert_one(superadmin)
@@ -100,7 +100,7 @@ async def seed_database():
             'is_active': True,
             'notifications_enabled': True,
             'metadata': {},
-            'created_at': datetime.now(timezone.utc).isoformat(),
+            'created_at': datetime.now(timezone.utc),
             'last_login': None
         }
         admins.append(admin)
@@ -124,7 +124,7 @@ async def seed_database():
                 'is_active': True,
                 'notifications_enabled': True,
                 'metadata': {},
-                'created_at': datetime.now(timezone.utc).isoformat(),
+                'created_at': datetime.now(timezone.utc),
                 'last_login': None
             }
             await db.users.insert_one(employee_user)
@@ -138,7 +138,7 @@ async def seed_database():
                 'skills': ['Repair', 'Installation'],
                 'hourly_rate': 50.0 + (i * 10),
                 'metadata': {},
-                'created_at': datetime.now(timezone.utc).isoformat()
+                'created_at': datetime.now(timezone.utc)
             }
             await db.employees.insert_one(employee)
         
@@ -154,7 +154,7 @@ async def seed_database():
                 'address': f"Address {i+1}, UAE",
                 'contact_person': f"Contact Person {i+1}",
                 'metadata': {},
-                'created_at': datetime.now(timezone.utc).isoformat()
+                'created_at': datetime.now(timezone.utc)
             }
             await db.clients.insert_one(client)
     
@@ -175,7 +175,7 @@ async def seed_database():
                 'vin': f"VIN{uuid.uuid4().hex[:10].upper()}",
                 'owner_client_id': client['id'],
                 'registration_details': {},
-                'created_at': datetime.now(timezone.utc).isoformat()
+                'created_at': datetime.now(timezone.utc)
             }
             await db.vehicles.insert_one(vehicle)
         print("✅ Created sample vehicles for Vigor Automotive")
@@ -207,8 +207,8 @@ async def seed_database():
                     'preventive_flag': False,
                     'scheduled_date': None,
                     'metadata': {},
-                    'created_at': datetime.now(timezone.utc).isoformat(),
-                    'updated_at': datetime.now(timezone.utc).isoformat()
+                    'created_at': datetime.now(timezone.utc),
+                    'updated_at': datetime.now(timezone.utc)
                 }
                 await db.work_orders.insert_one(work_order)
     
@@ -227,10 +227,10 @@ async def seed_database():
                     'description': f"Description for preventive task {i+1}",
                     'asset_location': f"Asset Location {i+1}",
                     'frequency': ['monthly', 'weekly'][i % 2],
-                    'next_due_date': (datetime.now(timezone.utc) + timedelta(days=30*(i+1))).isoformat(),
+                    'next_due_date': datetime.now(timezone.utc) + timedelta(days=30*(i+1)),
                     'assigned_technicians': [employees[0]['user_id']],
                     'status': 'ACTIVE',
-                    'created_at': datetime.now(timezone.utc).isoformat()
+                    'created_at': datetime.now(timezone.utc)
                 }
                 await db.preventive_tasks.insert_one(preventive_task)
         print("✅ Created sample preventive tasks for MSAM")
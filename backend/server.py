@@ -1,22 +1,27 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, File, UploadFile, Query, Form
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, File, UploadFile, Query, Form, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from starlette.middleware.gzip import GZipMiddleware
-from starlette.responses import Response
+from starlette.responses import Response, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional, Dict, Any, Union
+from pymongo import IndexModel, ASCENDING, DESCENDING, TEXT, ReturnDocument, UpdateOne, ReplaceOne, DeleteMany
+from pymongo.errors import OperationFailure, DuplicateKeyError, BulkWriteError
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, AfterValidator, PlainSerializer, TypeAdapter
+from typing import List, Optional, Dict, Any, Union, Callable, Tuple, Type, Annotated
 from datetime import datetime, timezone, timedelta
 import os
 import logging
 import uuid
+import math
+import hashlib
 import bcrypt
 import jwt
 from pathlib import Path
 import json
 import base64
+import re
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from reportlab.lib.units import inch
@@ -25,6 +30,11 @@ import shutil
 from contextlib import asynccontextmanager
 from functools import lru_cache
 import asyncio
+import time
+import socket
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any
 
 ROOT_DIR = Path(__file__).parent
@@ -50,6 +60,7 @@ try:
         retryWrites=True,  # Enable retryable writes
         retryReads=True,  # Enable retryable reads
         connect=False,  # Connect lazily - don't connect immediately
+        tz_aware=True,  # Timestamps are BSON dates; read them back as UTC-aware datetimes
     )
     db = client[os.environ.get('DB_NAME', 'erp_crm_database')]
 except Exception as e:
@@ -60,49 +71,649 @@ except Exception as e:
 JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key-change-in-production')
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION = 24  # hours
+# Order/invoice numbers reserved per counter round trip; numbers left in a block when a
+# worker exits are skipped, so keep this at 1 unless gap-free numbering is not required
+SEQUENCE_BLOCK_SIZE = int(os.environ.get('SEQUENCE_BLOCK_SIZE', 1))
+TOKEN_CACHE_MAX_SIZE = int(os.environ.get('TOKEN_CACHE_MAX_SIZE', 4096))  # Verified tokens remembered per process, 0 disables
+# Stateless principal mode: login also issues a short-lived access token carrying every
+# claim read routes need for authorization, so get_principal skips the cache and database
+STATELESS_PRINCIPAL = os.environ.get('STATELESS_PRINCIPAL', 'false').lower() == 'true'
+ACCESS_TOKEN_EXPIRATION = int(os.environ.get('ACCESS_TOKEN_EXPIRATION', 15))  # minutes
+# Revoked users are mirrored from MongoDB into a per-worker Bloom filter
+REVOCATION_BLOOM_CAPACITY = int(os.environ.get('REVOCATION_BLOOM_CAPACITY', 10000))
+REVOCATION_REFRESH_INTERVAL = int(os.environ.get('REVOCATION_REFRESH_INTERVAL', 10))  # seconds
+
+# Password hashing pool - bcrypt is CPU bound and must stay off the event loop
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1)))
 
 # Create uploads directory
 UPLOADS_DIR = ROOT_DIR / 'uploads'
 UPLOADS_DIR.mkdir(exist_ok=True)
 
 # Simple in-memory cache for frequently accessed data
-user_cache: Dict[str, Any] = {}
-CACHE_TTL = 600  # Increased to 10 minutes for better performance
+# User writes invalidate cached entries on every worker, so the TTL only bounds
+# staleness when an invalidation is lost and can safely be hours long
+CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 4 * 3600))
+
+# User cache backend: "local" keeps a dict per worker process, "unix" shares one
+# warm copy across all workers on the host via user_cache_server.py
+USER_CACHE_BACKEND = os.environ.get('USER_CACHE_BACKEND', 'local')
+USER_CACHE_SOCKET = os.environ.get('USER_CACHE_SOCKET', '/tmp/multitenantcrm-user-cache.sock')
+USER_CACHE_MAX_SIZE = int(os.environ.get('USER_CACHE_MAX_SIZE', 10000))  # Entries per process before LRU eviction
+# Each worker binds a datagram socket here to receive cache invalidations from its peers
+CACHE_INVALIDATION_DIR = os.environ.get('CACHE_INVALIDATION_DIR', '/tmp/multitenantcrm-invalidation')
+# List totals are cached per tenant and filter; result sets above the exact limit are
+# answered with an estimate first and counted exactly in the background
+LIST_COUNT_CACHE_TTL = int(os.environ.get('LIST_COUNT_CACHE_TTL', 300))  # seconds
+LIST_COUNT_CACHE_MAX_SIZE = int(os.environ.get('LIST_COUNT_CACHE_MAX_SIZE', 4096))
+LIST_COUNT_EXACT_LIMIT = int(os.environ.get('LIST_COUNT_EXACT_LIMIT', 10000))
+
+# Notification outbox: requests enqueue, a background dispatcher writes in batches
+NOTIFICATION_QUEUE_SIZE = int(os.environ.get('NOTIFICATION_QUEUE_SIZE', 10000))
+NOTIFICATION_BATCH_SIZE = int(os.environ.get('NOTIFICATION_BATCH_SIZE', 500))
+NOTIFICATION_FLUSH_INTERVAL = float(os.environ.get('NOTIFICATION_FLUSH_INTERVAL', 0.05))  # seconds
+NOTIFICATION_MAX_RETRIES = int(os.environ.get('NOTIFICATION_MAX_RETRIES', 5))
+# Channels besides in-app are delivered to local stand-ins that append JSON lines to <spool dir>/<channel>.jsonl
+NOTIFICATION_CHANNELS = [channel.strip() for channel in os.environ.get('NOTIFICATION_CHANNELS', 'in-app').split(',') if channel.strip()]
+NOTIFICATION_SPOOL_DIR = os.environ.get('NOTIFICATION_SPOOL_DIR', '/tmp/multitenantcrm-outbox')
+
+# Server-Sent Events: per-connection buffer before a slow client is told to resync, and keep-alive interval
+EVENT_STREAM_QUEUE_SIZE = int(os.environ.get('EVENT_STREAM_QUEUE_SIZE', 256))
+EVENT_STREAM_HEARTBEAT = float(os.environ.get('EVENT_STREAM_HEARTBEAT', 15))  # seconds
+
+def json_default(value: Any) -> str:
+    """json.dumps fallback for MongoDB documents: datetimes as ISO 8601, anything else (ObjectId) via str"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
 
 class CacheEntry:
-    def __init__(self, data: Dict[str, Any]):
+    """Cached value with a monotonic expiry deadline"""
+    __slots__ = ('data', 'expires_at')
+    
+    def __init__(self, data: Dict[str, Any], ttl: float):
         self.data = data
-        self.timestamp = datetime.now(timezone.utc)
+        self.expires_at = time.monotonic() + ttl
+
+class LocalUserCache:
+    """Per-process LRU cache with lazy TTL expiry - always available and used as the fallback backend.
+    
+    get, set and eviction are all O(1): the OrderedDict keeps entries in recency
+    order, expired entries are dropped when they are looked up, and the least
+    recently used entry is evicted once max_size is exceeded.
+    """
+    name = "local"
+    
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        cache_entry = self.entries.get(key)
+        if cache_entry is None:
+            self.misses += 1
+            return None
+        if time.monotonic() > cache_entry.expires_at:
+            del self.entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return cache_entry.data.copy()
+    
+    async def set(self, key: str, value: Dict[str, Any]):
+        self.entries[key] = CacheEntry(value, self.ttl)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+    
+    async def delete(self, key: str):
+        self.discard(key)
+    
+    def discard(self, key: str):
+        self.entries.pop(key, None)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
     
-    def is_expired(self) -> bool:
-        return (datetime.now(timezone.utc) - self.timestamp).total_seconds() > CACHE_TTL
+    async def close(self):
+        pass
 
-# Background task to clean expired cache entries
-async def clean_expired_cache():
-    while True:
+class UnixSocketUserCache:
+    """Client for the host-wide user_cache_server.py over a Unix socket.
+    
+    Requests are newline-delimited JSON, with datetimes tagged as
+    {"$date": "<ISO 8601>"} so a cached user reads back with the same types
+    as from the local cache. If the socket is unreachable the local fallback
+    serves reads and writes until the next reconnect attempt.
+    """
+    name = "unix"
+    
+    def __init__(self, path: str, fallback: LocalUserCache, max_idle_connections: int = 8, retry_after: float = 5.0):
+        self.path = path
+        self.fallback = fallback
+        self.max_idle_connections = max_idle_connections
+        self.retry_after = retry_after
+        self._idle: List[Any] = []
+        self._down_until = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+    
+    async def _request(self, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Send one request; returns None when the shared cache is unavailable"""
+        if time.monotonic() < self._down_until:
+            return None
+        connection = None
         try:
-            # Clean expired cache entries every 5 minutes
-            await asyncio.sleep(300)
-            current_time = datetime.now(timezone.utc)
-            expired_keys = []
-            
-            # Create a copy of keys to avoid modification during iteration
-            keys_to_check = list(user_cache.keys())
-            
-            for key in keys_to_check:
-                cache_entry = user_cache.get(key)
-                if cache_entry and isinstance(cache_entry, CacheEntry) and cache_entry.is_expired():
-                    expired_keys.append(key)
-            
-            # Remove expired entries
-            for key in expired_keys:
-                if key in user_cache:
-                    del user_cache[key]
-            
-            if expired_keys:
-                logging.info(f"Cleaned {len(expired_keys)} expired cache entries")
-        except Exception as e:
-            logging.error(f"Error in cache cleanup: {e}")
+            connection = self._idle.pop() if self._idle else await asyncio.wait_for(
+                asyncio.open_unix_connection(self.path), timeout=0.5
+            )
+            reader, writer = connection
+            writer.write(json.dumps(message, separators=(',', ':'), default=self._encode).encode('utf-8') + b'\n')
+            await writer.drain()
+            line = await asyncio.wait_for(reader.readline(), timeout=0.5)
+            if not line:
+                raise ConnectionError("user cache server closed the connection")
+            response = json.loads(line, object_hook=self._decode)
+        except (OSError, asyncio.TimeoutError, ValueError, ConnectionError) as e:
+            self.errors += 1
+            self._down_until = time.monotonic() + self.retry_after
+            if connection:
+                connection[1].close()
+            logging.warning(f"Shared user cache unavailable, using local fallback: {e}")
+            return None
+        
+        if len(self._idle) < self.max_idle_connections:
+            self._idle.append(connection)
+        else:
+            connection[1].close()
+        return response
+    
+    @staticmethod
+    def _encode(value: Any) -> Any:
+        if isinstance(value, datetime):
+            return {"$date": value.isoformat()}
+        return json_default(value)
+    
+    @staticmethod
+    def _decode(value: Dict[str, Any]) -> Any:
+        if len(value) == 1 and "$date" in value:
+            return datetime.fromisoformat(value["$date"])
+        return value
+    
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        response = await self._request({"op": "get", "key": key})
+        if response is None:
+            return await self.fallback.get(key)
+        value = response.get("value")
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+    
+    async def set(self, key: str, value: Dict[str, Any]):
+        response = await self._request({"op": "set", "key": key, "value": value, "ttl": CACHE_TTL})
+        if response is None:
+            await self.fallback.set(key, value)
+    
+    async def delete(self, key: str):
+        await self._request({"op": "delete", "key": key})
+        await self.fallback.delete(key)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "socket": self.path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "available": time.monotonic() >= self._down_until,
+            "fallback": self.fallback.stats()
+        }
+    
+    async def close(self):
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+local_user_cache = LocalUserCache(max_size=USER_CACHE_MAX_SIZE, ttl=CACHE_TTL)
+if USER_CACHE_BACKEND == 'unix':
+    user_cache = UnixSocketUserCache(USER_CACHE_SOCKET, fallback=local_user_cache)
+else:
+    user_cache = local_user_cache
+
+class CacheInvalidationBus:
+    """Host-local pub/sub for cache invalidations between uvicorn workers.
+    
+    Every worker binds a Unix datagram socket named after its pid inside
+    CACHE_INVALIDATION_DIR. Publishing sends one small datagram to every other
+    socket in the directory; sockets left behind by dead workers are removed.
+    Delivery is best effort - a lost message only means an entry lives until its TTL.
+    """
+    
+    class _Protocol(asyncio.DatagramProtocol):
+        def __init__(self, bus: "CacheInvalidationBus"):
+            self.bus = bus
+        
+        def datagram_received(self, data, addr):
+            self.bus._dispatch(data)
+    
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.path = self.directory / f"{os.getpid()}.sock"
+        self.handlers: Dict[str, List[Callable[[List[str]], None]]] = {}
+        self.transport = None
+        self.sender = None
+        self.published = 0
+        self.received = 0
+        self.dropped = 0
+    
+    def subscribe(self, topic: str, handler: Callable[[List[str]], None]):
+        self.handlers.setdefault(topic, []).append(handler)
+    
+    async def start(self):
+        if not hasattr(socket, 'AF_UNIX'):
+            logging.warning("Unix sockets unavailable - cache invalidations stay local to this worker")
+            return
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # The pid may be reused after a worker is recycled, so always rebind fresh
+            self.path = self.directory / f"{os.getpid()}.sock"
+            if self.path.exists():
+                self.path.unlink()
+            receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            receiver.bind(str(self.path))
+            receiver.setblocking(False)
+            loop = asyncio.get_running_loop()
+            self.transport, _ = await loop.create_datagram_endpoint(lambda: self._Protocol(self), sock=receiver)
+            self.sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self.sender.setblocking(False)
+        except OSError as e:
+            logging.warning(f"Could not start cache invalidation bus: {e}")
+            self.transport = None
+    
+    def publish(self, topic: str, keys: List[str]):
+        """Send an invalidation to every other worker on this host"""
+        if not self.sender or not keys:
+            return
+        message = json.dumps({"topic": topic, "keys": keys}, separators=(',', ':')).encode('utf-8')
+        for peer in self.directory.glob("*.sock"):
+            if peer == self.path:
+                continue
+            try:
+                self.sender.sendto(message, str(peer))
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Worker is gone - clean up its socket file
+                try:
+                    peer.unlink()
+                except OSError:
+                    pass
+            except OSError:
+                self.dropped += 1
+        self.published += 1
+    
+    def _dispatch(self, data: bytes):
+        try:
+            message = json.loads(data)
+        except ValueError:
+            return
+        self.received += 1
+        for handler in self.handlers.get(message.get("topic"), []):
+            try:
+                handler(message.get("keys", []))
+            except Exception as e:
+                logging.error(f"Error handling cache invalidation: {e}")
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.transport is not None,
+            "published": self.published,
+            "received": self.received,
+            "dropped": self.dropped
+        }
+    
+    async def close(self):
+        if self.transport:
+            self.transport.close()
+            self.transport = None
+        if self.sender:
+            self.sender.close()
+            self.sender = None
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+
+invalidation_bus = CacheInvalidationBus(CACHE_INVALIDATION_DIR)
+
+# A database read that started before a user's last invalidation must not
+# re-cache what it read: user_invalidated_at maps user id -> the value of
+# invalidation_sequence when this worker last dropped that user, oldest first.
+# Entries no older than every read still in flight can no longer stop a
+# re-cache, so they are evicted; with no reads in flight the map is empty.
+invalidation_sequence = 0
+user_invalidated_at: "OrderedDict[str, int]" = OrderedDict()
+active_user_reads: Dict[int, int] = {}  # invalidation_sequence a read started at -> reads in flight
+
+def begin_user_read() -> int:
+    active_user_reads[invalidation_sequence] = active_user_reads.get(invalidation_sequence, 0) + 1
+    return invalidation_sequence
+
+def end_user_read(read_started: int):
+    remaining = active_user_reads[read_started] - 1
+    if remaining:
+        active_user_reads[read_started] = remaining
+    else:
+        del active_user_reads[read_started]
+    _evict_invalidations()
+
+def _evict_invalidations():
+    oldest_read = min(active_user_reads, default=invalidation_sequence)
+    while user_invalidated_at and next(iter(user_invalidated_at.values())) <= oldest_read:
+        user_invalidated_at.popitem(last=False)
+
+def mark_users_invalidated(user_ids: List[str]):
+    global invalidation_sequence
+    for user_id in user_ids:
+        invalidation_sequence += 1
+        user_invalidated_at[user_id] = invalidation_sequence
+        user_invalidated_at.move_to_end(user_id)
+        user_lookups.forget(user_id)
+    _evict_invalidations()
+
+def invalidated_since(user_id: str, sequence: int) -> bool:
+    return user_invalidated_at.get(user_id, 0) > sequence
+
+def _drop_local_users(user_ids: List[str]):
+    mark_users_invalidated(user_ids)
+    for user_id in user_ids:
+        local_user_cache.discard(user_id)
+
+invalidation_bus.subscribe("user", _drop_local_users)
+
+async def invalidate_cached_users(user_ids: List[str]):
+    """Drop users from every cache after a write so the next request re-reads them"""
+    mark_users_invalidated(user_ids)
+    for user_id in user_ids:
+        await user_cache.delete(user_id)
+    invalidation_bus.publish("user", user_ids)
+
+# =======================
+# Database Indexes
+# =======================
+
+# Set to true to apply INDEX_SPECS from every worker on startup (e.g. local development)
+ENSURE_INDEXES_ON_STARTUP = os.environ.get('ENSURE_INDEXES_ON_STARTUP', 'false').lower() == 'true'
+
+# Declarative index registry - the single source of truth for every collection's indexes.
+# Applied by `python manage_indexes.py apply`, which also reports drift from the live database.
+INDEX_SPECS: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("email", ASCENDING)], unique=True),
+        IndexModel([("company_id", ASCENDING)]),
+        IndexModel([("role", ASCENDING)]),
+    ],
+    "companies": [
+        IndexModel([("id", ASCENDING)], unique=True),
+    ],
+    "clients": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("company_id", ASCENDING)]),
+    ],
+    "employees": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("company_id", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING)], unique=True),
+    ],
+    "work_orders": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("company_id", ASCENDING), ("status", ASCENDING)]),
+        IndexModel([("company_id", ASCENDING), ("assigned_technicians", ASCENDING)]),
+        IndexModel([("company_id", ASCENDING), ("requested_by_client_id", ASCENDING)]),
+        IndexModel([("created_at", ASCENDING)]),
+        # Serves the newest-first list and its keyset cursor
+        IndexModel([("company_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        # Order numbers restart at WO-000001 for every company
+        IndexModel([("company_id", ASCENDING), ("order_number", ASCENDING)], unique=True),
+        # ETag revalidation: covers the updated_at read for one work order, and the newest change per tenant
+        IndexModel([("id", ASCENDING), ("company_id", ASCENDING), ("updated_at", ASCENDING)]),
+        IndexModel([("company_id", ASCENDING), ("updated_at", DESCENDING)]),
+        # Full-text search; the company_id prefix keeps each search inside one tenant's keys
+        IndexModel(
+            [("company_id", ASCENDING), ("title", TEXT), ("description", TEXT), ("order_number", TEXT)],
+            name="work_orders_search",
+            weights={"order_number": 10, "title": 5, "description": 1},
+            default_language="english"
+        ),
+    ],
+    "invoices": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("company_id", ASCENDING), ("status", ASCENDING)]),
+        IndexModel([("work_order_id", ASCENDING)]),
+        IndexModel([("company_id", ASCENDING), ("invoice_number", ASCENDING)], unique=True),
+        IndexModel([("id", ASCENDING), ("company_id", ASCENDING), ("updated_at", ASCENDING)]),
+        IndexModel([("company_id", ASCENDING), ("updated_at", DESCENDING)]),
+    ],
+    "expenses": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("company_id", ASCENDING), ("work_order_id", ASCENDING)]),
+    ],
+    "payments": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("company_id", ASCENDING), ("work_order_id", ASCENDING)]),
+    ],
+    "vehicles": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("company_id", ASCENDING)]),
+        IndexModel([("plate_number", ASCENDING)]),
+    ],
+    "comments": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("work_order_id", ASCENDING)]),
+        IndexModel([("company_id", ASCENDING)]),
+    ],
+    "preventive_tasks": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("company_id", ASCENDING)]),
+        IndexModel([("vehicle_id", ASCENDING)]),
+    ],
+    "notifications": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        # Serves the per-user inbox sorted newest first
+        IndexModel([("user_id", ASCENDING), ("sent_at", DESCENDING)]),
+    ],
+    "token_revocations": [
+        IndexModel([("user_id", ASCENDING)], unique=True),
+        IndexModel([("revoked_at", ASCENDING)]),
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "daily_rollups": [
+        # One document per tenant and UTC day; trend reports range-scan it
+        IndexModel([("company_id", ASCENDING), ("day", ASCENDING)], unique=True),
+    ],
+}
+
+# Index options that must match for a live index to satisfy the spec
+INDEX_COMPARED_OPTIONS = ('unique', 'sparse', 'expireAfterSeconds', 'partialFilterExpression', 'weights', 'default_language')
+
+def index_key(spec: Dict[str, Any]) -> List[tuple]:
+    """Key of an index spec as the server reports it (text fields collapse into _fts/_ftsx)"""
+    key = []
+    for field, direction in spec['key'].items():
+        if direction == TEXT:
+            if ('_fts', 'text') not in key:
+                key += [('_fts', 'text'), ('_ftsx', 1)]
+        else:
+            key.append((field, direction))
+    return key
+
+async def apply_index_specs(drop_conflicting: bool = False) -> Dict[str, List[str]]:
+    """Create every index in INDEX_SPECS with one createIndexes call per collection.
+    
+    Collections are processed concurrently. Creation is idempotent - existing
+    identical indexes are left alone. If a batch fails (e.g. an existing index
+    has different options) each index is retried on its own so one conflict
+    does not block the rest. Returns error messages per collection.
+    """
+    logger = logging.getLogger(__name__)
+    
+    async def apply(collection_name: str, models: List[IndexModel]) -> List[str]:
+        collection = db[collection_name]
+        if drop_conflicting:
+            drift = await check_collection_drift(collection_name, models)
+            for name in drift['conflicting']:
+                logger.info(f"Dropping conflicting index {collection_name}.{name}")
+                await collection.drop_index(name)
+        try:
+            await collection.create_indexes(models)
+            return []
+        except OperationFailure:
+            errors = []
+            for model in models:
+                try:
+                    await collection.create_indexes([model])
+                except OperationFailure as e:
+                    errors.append(f"{model.document['name']}: {e}")
+            return errors
+    
+    results = await asyncio.gather(*(apply(name, models) for name, models in INDEX_SPECS.items()))
+    errors = {name: result for name, result in zip(INDEX_SPECS, results) if result}
+    for collection_name, messages in errors.items():
+        for message in messages:
+            logger.warning(f"Could not create index on {collection_name}.{message}")
+    logger.info("Database indexes processed successfully")
+    return errors
+
+async def check_collection_drift(collection_name: str, models: List[IndexModel]) -> Dict[str, List[str]]:
+    live = await db[collection_name].index_information()
+    expected = {model.document['name']: model.document for model in models}
+    missing, conflicting = [], []
+    for name, spec in expected.items():
+        if name not in live:
+            missing.append(name)
+            continue
+        live_index = live[name]
+        same_keys = [tuple(key) for key in live_index['key']] == index_key(spec)
+        same_options = all(live_index.get(option) == spec.get(option) for option in INDEX_COMPARED_OPTIONS)
+        if not (same_keys and same_options):
+            conflicting.append(name)
+    extra = [name for name in live if name != '_id_' and name not in expected]
+    return {"missing": missing, "conflicting": conflicting, "extra": extra}
+
+async def find_unique_duplicates(only_missing: bool = True) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+    """Keys that occur more than once under a unique index of INDEX_SPECS.
+    
+    A unique index cannot be built over them. Returns, per collection and
+    index name, each duplicated key with the _ids of its documents, oldest
+    first. With only_missing, indexes that already exist (and so hold no
+    duplicates) are not scanned.
+    """
+    async def scan(collection_name: str, models: List[IndexModel]) -> Dict[str, List[Dict[str, Any]]]:
+        missing = set((await check_collection_drift(collection_name, models))['missing']) if only_missing else None
+        found = {}
+        for model in models:
+            spec = model.document
+            if not spec.get('unique') or (missing is not None and spec['name'] not in missing):
+                continue
+            pipeline = [
+                {"$sort": {"_id": 1}},
+                {"$group": {"_id": {field: f"${field}" for field in spec['key']},
+                            "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+                {"$match": {"count": {"$gt": 1}}}
+            ]
+            groups = await db[collection_name].aggregate(pipeline, allowDiskUse=True).to_list(None)
+            if groups:
+                found[spec['name']] = [{"key": group['_id'], "ids": group['ids']} for group in groups]
+        return found
+    
+    results = await asyncio.gather(*(scan(name, models) for name, models in INDEX_SPECS.items()))
+    return {name: result for name, result in zip(INDEX_SPECS, results) if result}
+
+async def check_index_drift() -> Dict[str, Dict[str, List[str]]]:
+    """Compare INDEX_SPECS with the live database; only collections with drift are returned"""
+    results = await asyncio.gather(*(check_collection_drift(name, models) for name, models in INDEX_SPECS.items()))
+    return {
+        name: drift for name, drift in zip(INDEX_SPECS, results)
+        if drift['missing'] or drift['conflicting'] or drift['extra']
+    }
+
+# Timestamp fields per collection. They are BSON dates; documents written while they
+# were ISO strings are converted online by migrate_timestamps.py
+TIMESTAMP_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "users": ("created_at", "last_login"),
+    "companies": ("created_at", "rollups_backfilled_at"),
+    "clients": ("created_at",),
+    "employees": ("created_at",),
+    "vehicles": ("created_at",),
+    "work_orders": ("created_at", "updated_at", "completed_at"),
+    "expenses": ("date", "created_at"),
+    "invoices": ("issued_date", "due_date", "created_at", "updated_at"),
+    "payments": ("created_at",),
+    "preventive_tasks": ("next_due_date", "last_completed_date", "created_at"),
+    "notifications": ("sent_at", "read_at"),
+    "comments": ("created_at", "updated_at"),
+    "token_revocations": ("revoked_at",),
+    "company_stats": ("reconciled_at",),
+}
+
+async def migrate_timestamp_field(collection_name: str, field: str, batch_size: int = 1000,
+                                  pause: float = 0.0) -> Dict[str, int]:
+    """Convert one field's ISO strings to BSON dates, a batch at a time in _id order.
+    
+    Each update matches the string it read, so a write that lands in between
+    is never overwritten. Strings that do not parse are left as they are.
+    """
+    collection = db[collection_name]
+    converted = unparseable = 0
+    last_id = None
+    while True:
+        query: Dict[str, Any] = {field: {"$type": "string"}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await collection.find(query, {"_id": 1, field: 1}).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            return {"converted": converted, "unparseable": unparseable}
+        last_id = batch[-1]['_id']
+        updates = []
+        for document in batch:
+            try:
+                value = to_timestamp(document[field])
+            except ValueError:
+                unparseable += 1
+                continue
+            updates.append(UpdateOne({"_id": document['_id'], field: document[field]}, {"$set": {field: value}}))
+        if updates:
+            converted += (await collection.bulk_write(updates, ordered=False)).modified_count
+        if pause:
+            await asyncio.sleep(pause)  # Leave room for live traffic between batches
+
+async def count_string_timestamps() -> Dict[str, Dict[str, int]]:
+    """Timestamp values still stored as strings, per collection and field; only non-zero counts are returned"""
+    fields = [(name, field) for name, fields in TIMESTAMP_FIELDS.items() for field in fields]
+    counts = await asyncio.gather(*(db[name].count_documents({field: {"$type": "string"}}) for name, field in fields))
+    remaining: Dict[str, Dict[str, int]] = {}
+    for (name, field), count in zip(fields, counts):
+        if count:
+            remaining.setdefault(name, {})[field] = count
+    return remaining
 
 # Lifespan event handler
 @asynccontextmanager
@@ -115,132 +726,36 @@ async def lifespan(app: FastAPI):
     logger = logging.getLogger(__name__)
     logger.info("Starting up the application")
     
-    # Create database indexes for better performance
-    try:
-        # Users collection indexes
-        try:
-            await db.users.create_index("email")
-        except Exception as e:
-            logger.warning(f"Could not create index on users.email: {e}")
-        try:
-            await db.users.create_index("company_id")
-        except Exception as e:
-            logger.warning(f"Could not create index on users.company_id: {e}")
-        try:
-            await db.users.create_index("role")
-        except Exception as e:
-            logger.warning(f"Could not create index on users.role: {e}")
-        
-        # Companies collection indexes
-        try:
-            await db.companies.create_index("id")
-        except Exception as e:
-            logger.warning(f"Could not create index on companies.id: {e}")
-        
-        # Clients collection indexes
-        try:
-            await db.clients.create_index("company_id")
-        except Exception as e:
-            logger.warning(f"Could not create index on clients.company_id: {e}")
-        
-        # Employees collection indexes
-        try:
-            await db.employees.create_index("company_id")
-        except Exception as e:
-            logger.warning(f"Could not create index on employees.company_id: {e}")
-        try:
-            await db.employees.create_index("user_id")
-        except Exception as e:
-            logger.warning(f"Could not create index on employees.user_id: {e}")
-        
-        # Work Orders collection indexes
-        try:
-            await db.work_orders.create_index([("company_id", 1), ("status", 1)])
-        except Exception as e:
-            logger.warning(f"Could not create index on work_orders company_id+status: {e}")
-        try:
-            await db.work_orders.create_index([("company_id", 1), ("assigned_technicians", 1)])
-        except Exception as e:
-            logger.warning(f"Could not create index on work_orders company_id+assigned_technicians: {e}")
-        try:
-            await db.work_orders.create_index([("company_id", 1), ("requested_by_client_id", 1)])
-        except Exception as e:
-            logger.warning(f"Could not create index on work_orders company_id+requested_by_client_id: {e}")
-        try:
-            await db.work_orders.create_index("created_at")
-        except Exception as e:
-            logger.warning(f"Could not create index on work_orders.created_at: {e}")
-        try:
-            await db.work_orders.create_index("order_number")
-        except Exception as e:
-            logger.warning(f"Could not create index on work_orders.order_number: {e}")
-        
-        # Invoices collection indexes
-        try:
-            await db.invoices.create_index([("company_id", 1), ("status", 1)])
-        except Exception as e:
-            logger.warning(f"Could not create index on invoices company_id+status: {e}")
-        try:
-            await db.invoices.create_index("work_order_id")
-        except Exception as e:
-            logger.warning(f"Could not create index on invoices.work_order_id: {e}")
-        try:
-            await db.invoices.create_index("invoice_number")
-        except Exception as e:
-            logger.warning(f"Could not create index on invoices.invoice_number: {e}")
-        
-        # Vehicles collection indexes
-        try:
-            await db.vehicles.create_index("company_id")
-        except Exception as e:
-            logger.warning(f"Could not create index on vehicles.company_id: {e}")
-        try:
-            await db.vehicles.create_index("plate_number")
-        except Exception as e:
-            logger.warning(f"Could not create index on vehicles.plate_number: {e}")
-        
-        # Comments collection indexes
-        try:
-            await db.comments.create_index("work_order_id")
-        except Exception as e:
-            logger.warning(f"Could not create index on comments.work_order_id: {e}")
-        try:
-            await db.comments.create_index("company_id")
-        except Exception as e:
-            logger.warning(f"Could not create index on comments.company_id: {e}")
-        
-        # Preventive Tasks collection indexes
-        try:
-            await db.preventive_tasks.create_index("company_id")
-        except Exception as e:
-            logger.warning(f"Could not create index on preventive_tasks.company_id: {e}")
-        try:
-            await db.preventive_tasks.create_index("vehicle_id")
-        except Exception as e:
-            logger.warning(f"Could not create index on preventive_tasks.vehicle_id: {e}")
-        
-        # Notifications collection indexes
-        try:
-            await db.notifications.create_index("user_id")
-        except Exception as e:
-            logger.warning(f"Could not create index on notifications.user_id: {e}")
+    # Indexes are applied at deploy time by manage_indexes.py, so workers boot
+    # without index round-trips unless explicitly asked to
+    if ENSURE_INDEXES_ON_STARTUP:
         try:
-            await db.notifications.create_index("sent_at")
+            await apply_index_specs()
         except Exception as e:
-            logger.warning(f"Could not create index on notifications.sent_at: {e}")
-        
-        logger.info("Database indexes processed successfully")
+            logger.error(f"Failed to create database indexes: {e}")
+    
+    # Listen for cache invalidations from the other workers
+    await invalidation_bus.start()
+    
+    # Mirror token revocations into this worker's Bloom filter
+    try:
+        await revocation_list.rebuild()
     except Exception as e:
-        logger.error(f"Failed to create database indexes: {e}")
+        logger.warning(f"Could not load token revocations: {e}")
+    revocation_refresh_task = asyncio.create_task(refresh_token_revocations())
     
-    # Start background cache cleanup task
-    cache_cleanup_task = asyncio.create_task(clean_expired_cache())
+    # Deliver notifications in the background
+    notification_outbox.start()
     
     # Yield control to the application
     yield
     
     # Shutdown event
-    cache_cleanup_task.cancel()
+    revocation_refresh_task.cancel()
+    await notification_outbox.close()
+    password_pool.shutdown()
+    await user_cache.close()
+    await invalidation_bus.close()
     logger.info("Shutting down the application")
     client.close()
 
@@ -252,6 +767,22 @@ security = HTTPBearer()
 # Pydantic Models
 # =======================
 
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def as_utc(value: datetime) -> datetime:
+    """Naive datetimes (date-only input, clients opened without tz_aware) are taken as UTC"""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+# Stored as a BSON date; ISO 8601 strings are accepted on input and produced only in JSON responses
+Timestamp = Annotated[datetime, AfterValidator(as_utc),
+                      PlainSerializer(lambda value: value.isoformat(), return_type=str, when_used='json')]
+timestamp_adapter = TypeAdapter(Timestamp)
+
+def to_timestamp(value: Union[datetime, str]) -> datetime:
+    """UTC datetime from a stored timestamp, which is still an ISO string until migrate_timestamps.py has run"""
+    return timestamp_adapter.validate_python(value)
+
 class User(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -263,8 +794,9 @@ class User(BaseModel):
     is_active: bool = True
     notifications_enabled: bool = True
     metadata: Optional[Dict[str, Any]] = {}
-    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
-    last_login: Optional[str] = None
+    created_at: Timestamp = Field(default_factory=utc_now)
+    last_login: Optional[Timestamp] = None
+    version: int = 0  # Incremented by every edit, for optimistic concurrency
 
 class UserCreate(BaseModel):
     company_id: Optional[str] = None
@@ -274,6 +806,7 @@ class UserCreate(BaseModel):
     phone: Optional[str] = None
     display_name: str
     client_id: Optional[str] = None  # For linking CLIENT users to client records
+    version: Optional[int] = None  # Updates only: reject the edit if the user changed since this version
 
 class UserLogin(BaseModel):
     email: EmailStr
@@ -288,7 +821,7 @@ class Company(BaseModel):
     address: Optional[str] = None
     contact_email: Optional[str] = None
     contact_phone: Optional[str] = None
-    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    created_at: Timestamp = Field(default_factory=utc_now)
 
 class CompanyCreate(BaseModel):
     name: str
@@ -308,7 +841,7 @@ class Client(BaseModel):
     address: Optional[str] = None
     contact_person: Optional[str] = None
     metadata: Optional[Dict[str, Any]] = {}
-    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    created_at: Timestamp = Field(default_factory=utc_now)
 
 class ClientCreate(BaseModel):
     name: str
@@ -326,7 +859,7 @@ class Employee(BaseModel):
     skills: Optional[List[str]] = []
     hourly_rate: Optional[float] = None
     metadata: Optional[Dict[str, Any]] = {}
-    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    created_at: Timestamp = Field(default_factory=utc_now)
 
 class EmployeeCreate(BaseModel):
     user_id: str
@@ -345,7 +878,7 @@ class Vehicle(BaseModel):
     vin: Optional[str] = None
     owner_client_id: Optional[str] = None
     registration_details: Optional[Dict[str, Any]] = {}
-    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    created_at: Timestamp = Field(default_factory=utc_now)
 
 class VehicleCreate(BaseModel):
     plate_number: str
@@ -384,8 +917,10 @@ class WorkOrder(BaseModel):
     asset_code: Optional[str] = None  # Asset code for MSAM Technical Solutions
     category: Optional[str] = None  # Category for MSAM Technical Solutions
     metadata: Optional[Dict[str, Any]] = {}
-    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
-    updated_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    created_at: Timestamp = Field(default_factory=utc_now)
+    updated_at: Timestamp = Field(default_factory=utc_now)
+    completed_at: Optional[Timestamp] = None  # Set when the status changes to COMPLETED
+    version: int = 0
 
 class WorkOrderCreate(BaseModel):
     title: str
@@ -428,6 +963,18 @@ class WorkOrderUpdate(BaseModel):
     promise_date: Optional[str] = None  # Promise completion date
     asset_code: Optional[str] = None  # Asset code for MSAM Technical Solutions
     category: Optional[str] = None  # Category for MSAM Technical Solutions
+    version: Optional[int] = None  # Reject the edit if the work order changed since this version
+
+WORK_ORDER_STATUSES = ["DRAFT", "PENDING", "APPROVED", "IN_PROGRESS", "COMPLETED", "CANCELLED"]
+WORK_ORDER_PRIORITIES = ["LOW", "MEDIUM", "HIGH", "URGENT"]
+WORK_ORDER_BULK_LIMIT = 5000
+
+class WorkOrderBulkUpdate(BaseModel):
+    ids: List[str] = Field(min_length=1, max_length=WORK_ORDER_BULK_LIMIT)
+    operation: str  # status, assign, priority, approve
+    status: Optional[str] = None  # For operation=status
+    priority: Optional[str] = None  # For operation=priority
+    assigned_technicians: Optional[List[str]] = None  # For operation=assign
 
 class Expense(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -437,16 +984,16 @@ class Expense(BaseModel):
     description: str
     amount: float
     currency: str = "AED"
-    date: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    date: Timestamp = Field(default_factory=utc_now)
     uploaded_by: str
     receipts: List[str] = []
-    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    created_at: Timestamp = Field(default_factory=utc_now)
 
 class ExpenseCreate(BaseModel):
     description: str
     amount: float
     currency: str = "AED"
-    date: Optional[str] = None
+    date: Optional[Timestamp] = None
 
 class Invoice(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -459,9 +1006,11 @@ class Invoice(BaseModel):
     tax_amount: float = 0
     paid_amount: float = 0
     status: str = "DRAFT"  # DRAFT, ISSUED, PAID, CANCELLED
-    issued_date: Optional[str] = None
-    due_date: Optional[str] = None
-    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    issued_date: Optional[Timestamp] = None
+    due_date: Optional[Timestamp] = None
+    created_at: Timestamp = Field(default_factory=utc_now)
+    updated_at: Timestamp = Field(default_factory=utc_now)
+    version: int = 0
 
 class InvoiceCreate(BaseModel):
     work_order_id: str
@@ -472,8 +1021,9 @@ class InvoiceCreate(BaseModel):
 class InvoiceUpdate(BaseModel):
     items: Optional[List[Dict[str, Any]]] = None
     tax_amount: Optional[float] = None
-    due_date: Optional[str] = None
+    due_date: Optional[Timestamp] = None
     status: Optional[str] = None
+    version: Optional[int] = None
 
 class PreventiveTask(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -483,18 +1033,18 @@ class PreventiveTask(BaseModel):
     description: Optional[str] = None
     asset_location: Optional[str] = None
     frequency: str  # daily, weekly, monthly, yearly
-    next_due_date: str
+    next_due_date: Timestamp
     assigned_technicians: List[str] = []
-    last_completed_date: Optional[str] = None
+    last_completed_date: Optional[Timestamp] = None
     status: str = "ACTIVE"  # ACTIVE, PAUSED, COMPLETED
-    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    created_at: Timestamp = Field(default_factory=utc_now)
 
 class PreventiveTaskCreate(BaseModel):
     title: str
     description: Optional[str] = None
     asset_location: Optional[str] = None
     frequency: str
-    start_date: Optional[str] = None
+    start_date: Optional[Timestamp] = None
     assigned_technicians: List[str] = []
 
 class Notification(BaseModel):
@@ -504,8 +1054,8 @@ class Notification(BaseModel):
     company_id: str
     type: str
     payload: Dict[str, Any]
-    read_at: Optional[str] = None
-    sent_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    read_at: Optional[Timestamp] = None
+    sent_at: Timestamp = Field(default_factory=utc_now)
     channel: str = "in-app"  # in-app, email, sms
 
 class Comment(BaseModel):
@@ -515,14 +1065,16 @@ class Comment(BaseModel):
     company_id: str
     user_id: str
     content: str
-    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
-    updated_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    created_at: Timestamp = Field(default_factory=utc_now)
+    updated_at: Timestamp = Field(default_factory=utc_now)
+    version: int = 0
 
 class CommentCreate(BaseModel):
     content: str
 
 class CommentUpdate(BaseModel):
     content: str
+    version: Optional[int] = None
 
 # =======================
 # Payment Model
@@ -537,7 +1089,7 @@ class Payment(BaseModel):
     payment_method: str  # 'cash' or 'card'
     reference_number: Optional[str] = None
     created_by: str
-    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    created_at: Timestamp = Field(default_factory=utc_now)
 
 class PaymentCreate(BaseModel):
     work_order_id: str
@@ -549,84 +1101,1302 @@ class PaymentCreate(BaseModel):
 # Utility Functions
 # =======================
 
-def hash_password(password: str) -> str:
+class PasswordHasherPool:
+    """Bounded thread pool for bcrypt work with queue-depth and wait-time metrics"""
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.recent_waits = deque(maxlen=1000)  # seconds spent queued, newest last
+        self.recent_runs = deque(maxlen=1000)  # seconds spent hashing
+    
+    def _execute(self, submitted_at: float, fn, *args):
+        started_at = time.monotonic()
+        with self._lock:
+            self.queue_depth -= 1
+            self.in_flight += 1
+            self.recent_waits.append(started_at - submitted_at)
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+                self.recent_runs.append(time.monotonic() - started_at)
+    
+    async def run(self, fn, *args):
+        with self._lock:
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._execute, time.monotonic(), fn, *args)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self.recent_waits)
+            runs = sorted(self.recent_runs)
+            stats = {
+                "workers": self.max_workers,
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+            }
+        
+        def percentile_ms(values, pct):
+            if not values:
+                return 0.0
+            return round(values[min(len(values) - 1, int(len(values) * pct))] * 1000, 2)
+        
+        stats.update({
+            "wait_ms_p50": percentile_ms(waits, 0.50),
+            "wait_ms_p99": percentile_ms(waits, 0.99),
+            "wait_ms_max": percentile_ms(waits, 1.0),
+            "hash_ms_p50": percentile_ms(runs, 0.50),
+            "hash_ms_p99": percentile_ms(runs, 0.99),
+        })
+        return stats
+    
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+password_pool = PasswordHasherPool(PASSWORD_HASH_WORKERS)
+
+def _hash_password_sync(password: str) -> str:
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
-def verify_password(password: str, hashed: str) -> bool:
+def _verify_password_sync(password: str, hashed: str) -> bool:
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
+async def hash_password(password: str) -> str:
+    """Hash a password on the bcrypt pool without blocking the event loop"""
+    return await password_pool.run(_hash_password_sync, password)
+
+async def verify_password(password: str, hashed: str) -> bool:
+    """Verify a password on the bcrypt pool without blocking the event loop"""
+    if not hashed:
+        return False
+    return await password_pool.run(_verify_password_sync, password, hashed)
+
 def create_token(user_id: str, company_id: Optional[str], role: str) -> str:
     payload = {
         'user_id': user_id,
         'company_id': company_id,
         'role': role,
+        'iat': datetime.now(timezone.utc),
         'exp': datetime.now(timezone.utc) + timedelta(hours=JWT_EXPIRATION)
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
+def create_access_token(user: Dict[str, Any]) -> str:
+    """Short-lived token embedding the authorization claims used by get_principal"""
+    payload = {
+        'user_id': user['id'],
+        'company_id': user.get('company_id'),
+        'role': user['role'],
+        'client_id': user.get('client_id'),
+        'is_active': user.get('is_active', True),
+        'typ': 'access',
+        'iat': datetime.now(timezone.utc),
+        'exp': datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRATION)
+    }
+    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+class VerifiedTokenCache:
+    """LRU of already verified JWT payloads keyed by the token's SHA-256 digest.
+    
+    A hit skips signature verification and claim parsing. Entries are only
+    served until the token's own exp, so expiry behaves exactly as before.
+    """
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        if not self.max_size:
+            return None
+        key = hashlib.sha256(token.encode('utf-8')).digest()
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, payload = entry
+        if time.time() >= expires_at:
+            # Let jwt.decode report the expiry
+            del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return dict(payload)
+    
+    def put(self, token: str, payload: Dict[str, Any]):
+        if not self.max_size or 'exp' not in payload:
+            return
+        key = hashlib.sha256(token.encode('utf-8')).digest()
+        self.entries[key] = (payload['exp'], dict(payload))
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.entries), "max_size": self.max_size}
+
+verified_token_cache = VerifiedTokenCache(TOKEN_CACHE_MAX_SIZE)
+
 def decode_token(token: str) -> Dict[str, Any]:
+    payload = verified_token_cache.get(token)
+    if payload is not None:
+        return payload
     try:
-        return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    verified_token_cache.put(token, payload)
+    return payload
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings - no false negatives, tunable false positive rate"""
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(1, capacity)
+        self.size = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+    
+    def _positions(self, key: str):
+        # Double hashing: k probe positions derived from one 128-bit digest
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+    
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+    
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+class TokenRevocationList:
+    """Revoked users from the token_revocations collection, mirrored into a Bloom filter.
+    
+    A revocation rejects every token of the user issued before its not_before
+    timestamp. The filter answers the common "not revoked" case in O(1); only
+    filter hits go to MongoDB to rule out a false positive. Each worker pulls
+    new revocations incrementally and rebuilds the filter hourly so expired
+    revocations drop out.
+    
+    revoked_at comes from the revoking worker's clock, so a revocation can land
+    behind another worker's cursor, or tie with it. Every refresh re-reads the
+    last CLOCK_SKEW before the cursor and skips the records it already saw.
+    """
+    REBUILD_INTERVAL = 3600  # seconds
+    CLOCK_SKEW = timedelta(minutes=1)
+    
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.filter = BloomFilter(capacity)
+        self.cursor: Optional[datetime] = None  # Newest revoked_at mirrored so far
+        self.seen: Dict[str, datetime] = {}  # user_id -> revoked_at mirrored within CLOCK_SKEW of the cursor
+        self.last_rebuild = 0.0
+        self.checks = 0
+        self.filter_hits = 0
+        self.false_positives = 0
+        self.rejected = 0
+    
+    async def rebuild(self):
+        revoked_count = await db.token_revocations.count_documents({})
+        bloom = BloomFilter(max(self.capacity, revoked_count * 2))
+        seen = {}
+        async for revocation in db.token_revocations.find({}, {"_id": 0, "user_id": 1, "revoked_at": 1}):
+            bloom.add(revocation['user_id'])
+            seen[revocation['user_id']] = to_timestamp(revocation['revoked_at'])
+        self.filter = bloom
+        self.cursor = max(seen.values(), default=None)
+        self.seen = seen
+        self._forget_seen()
+        self.last_rebuild = time.monotonic()
+    
+    async def refresh(self):
+        if time.monotonic() - self.last_rebuild > self.REBUILD_INTERVAL:
+            await self.rebuild()
+            return
+        query = {"revoked_at": {"$gte": self.cursor - self.CLOCK_SKEW}} if self.cursor else {}
+        revocations = db.token_revocations.find(query, {"_id": 0, "user_id": 1, "revoked_at": 1}).sort("revoked_at", 1)
+        async for revocation in revocations:
+            user_id, revoked_at = revocation['user_id'], to_timestamp(revocation['revoked_at'])
+            if self.seen.get(user_id) == revoked_at:
+                continue
+            self.filter.add(user_id)
+            self.seen[user_id] = revoked_at
+            self.cursor = revoked_at if self.cursor is None else max(self.cursor, revoked_at)
+        self._forget_seen()
+    
+    def _forget_seen(self):
+        """Drop records that have left the re-read window"""
+        if self.cursor is not None:
+            window_start = self.cursor - self.CLOCK_SKEW
+            self.seen = {user_id: revoked_at for user_id, revoked_at in self.seen.items() if revoked_at >= window_start}
+    
+    def add_local(self, user_ids: List[str]):
+        for user_id in user_ids:
+            self.filter.add(user_id)
+    
+    async def revoke(self, user_ids: List[str]):
+        """Invalidate all tokens issued so far to these users"""
+        if not user_ids:
+            return
+        now = datetime.now(timezone.utc)
+        for user_id in user_ids:
+            await db.token_revocations.update_one(
+                {"user_id": user_id},
+                {"$set": {
+                    "user_id": user_id,
+                    "revoked_at": now,
+                    # Token iat has second precision, so round up to cover this second
+                    "not_before": math.ceil(now.timestamp()),
+                    # BSON date so the TTL index drops the record once every token it covers has expired
+                    "expires_at": now + timedelta(hours=JWT_EXPIRATION)
+                }},
+                upsert=True
+            )
+        self.add_local(user_ids)
+        invalidation_bus.publish("revoke", user_ids)
+    
+    async def is_revoked(self, payload: Dict[str, Any]) -> bool:
+        self.checks += 1
+        user_id = payload['user_id']
+        if user_id not in self.filter:
+            return False
+        self.filter_hits += 1
+        revocation = await db.token_revocations.find_one({"user_id": user_id}, {"_id": 0, "not_before": 1})
+        if revocation and payload.get('iat', 0) < revocation['not_before']:
+            self.rejected += 1
+            return True
+        self.false_positives += 1
+        return False
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "filter_entries": self.filter.count,
+            "filter_bits": self.filter.size,
+            "checks": self.checks,
+            "filter_hits": self.filter_hits,
+            "false_positives": self.false_positives,
+            "rejected": self.rejected
+        }
+
+revocation_list = TokenRevocationList(REVOCATION_BLOOM_CAPACITY)
+invalidation_bus.subscribe("revoke", revocation_list.add_local)
+
+async def refresh_token_revocations():
+    while True:
+        try:
+            await asyncio.sleep(REVOCATION_REFRESH_INTERVAL)
+            await revocation_list.refresh()
+        except Exception as e:
+            logging.error(f"Error refreshing token revocations: {e}")
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one shared in-flight task.
+    
+    The task is shielded, so a caller that disconnects does not cancel the
+    lookup for the others waiting on it.
+    """
+    def __init__(self):
+        self.in_flight: Dict[str, asyncio.Future] = {}
+        self.started = 0
+        self.coalesced = 0
+    
+    async def do(self, key: str, factory: Callable[[], Any]):
+        future = self.in_flight.get(key)
+        if future is None:
+            self.started += 1
+            future = asyncio.ensure_future(factory())
+            self.in_flight[key] = future
+            future.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(future)
+    
+    def _finish(self, key: str, future: asyncio.Future):
+        if self.in_flight.get(key) is future:
+            del self.in_flight[key]
+        if not future.cancelled():
+            future.exception()  # Mark as retrieved even if every waiter went away
+    
+    def forget(self, key: str):
+        """Let the next call start a fresh task instead of joining the current one"""
+        self.in_flight.pop(key, None)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"started": self.started, "coalesced": self.coalesced, "in_flight": len(self.in_flight)}
+
+user_lookups = SingleFlight()
+
+async def cache_user_read(user: Dict[str, Any], read_started: int):
+    """Cache a user read from the database unless it was invalidated while the read was in flight"""
+    user_id = user['id']
+    if invalidated_since(user_id, read_started):
+        return
+    await user_cache.set(user_id, user)
+    # An invalidation that landed during the set may have deleted before we wrote
+    if invalidated_since(user_id, read_started):
+        await user_cache.delete(user_id)
+
+async def load_user(user_id: str) -> Optional[Dict[str, Any]]:
+    """Fetch a user from the database and populate the cache"""
+    read_started = begin_user_read()
+    try:
+        # Password hashes never enter the cache, which may be shared across workers
+        user = await db.users.find_one({"id": user_id}, {"_id": 0, "password_hash": 0})
+        if user:
+            await cache_user_read(user, read_started)
+    finally:
+        end_user_read(read_started)
+    return user
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token = credentials.credentials
     payload = decode_token(token)
     user_id = payload['user_id']
     
-    # Check cache first (non-blocking check)
-    cache_entry = user_cache.get(user_id)
-    # Check if it's a CacheEntry object and not expired
-    if cache_entry and isinstance(cache_entry, CacheEntry) and not cache_entry.is_expired():
-        user = cache_entry.data.copy()
+    if await revocation_list.is_revoked(payload):
+        raise HTTPException(status_code=401, detail="Token revoked")
+    
+    # Check cache first
+    user = await user_cache.get(user_id)
+    if user:
+        if not user.get('is_active', True):
+            raise HTTPException(status_code=403, detail="Account is inactive")
         user['token_payload'] = payload
         return user
     
-    # If not in cache or expired, fetch from database
-    user = await db.users.find_one({"id": user_id}, {"_id": 0})
+    # If not in cache or expired, fetch from database - concurrent misses for
+    # the same user share a single query
+    user = await user_lookups.do(user_id, lambda: load_user(user_id))
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
+    if not user.get('is_active', True):
+        raise HTTPException(status_code=403, detail="Account is inactive")
     
-    # Update cache (non-blocking update)
-    user_cache[user_id] = CacheEntry(user)
-    
+    user = dict(user)
     user['token_payload'] = payload
     return user
 
+async def get_principal(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Lightweight authentication for read-only routes.
+    
+    Access tokens issued in stateless principal mode already carry id, role,
+    company_id, client_id and is_active, so the principal is built from the
+    verified claims alone. Any other token falls back to get_current_user.
+    """
+    payload = decode_token(credentials.credentials)
+    if not STATELESS_PRINCIPAL or payload.get('typ') != 'access':
+        return await get_current_user(credentials)
+    
+    if not payload.get('is_active', True):
+        raise HTTPException(status_code=403, detail="Account is inactive")
+    
+    if await revocation_list.is_revoked(payload):
+        raise HTTPException(status_code=401, detail="Token revoked")
+    
+    return {
+        'id': payload['user_id'],
+        'company_id': payload.get('company_id'),
+        'role': payload['role'],
+        'client_id': payload.get('client_id'),
+        'is_active': payload.get('is_active', True),
+        'token_payload': payload
+    }
+
+class SequenceAllocator:
+    """Per-company document numbers backed by the counters collection.
+    
+    Each counter document is advanced with an atomic find_one_and_update($inc),
+    so concurrent creates on any worker never receive the same number. With
+    block_size > 1 a worker reserves a block of numbers per round trip and
+    hands them out from memory. A counter is seeded from the highest number
+    already issued the first time it is used, so existing tenants continue
+    their sequence.
+    """
+    def __init__(self, block_size: int):
+        self.block_size = max(1, block_size)
+        self.blocks: Dict[str, List[int]] = {}  # key -> [next number, last reserved number]
+        self.locks: Dict[str, asyncio.Lock] = {}
+        self.seeded: set = set()
+    
+    async def _seed(self, key: str, company_id: str, collection_name: str, field: str):
+        if key in self.seeded:
+            return
+        if not await db.counters.find_one({"_id": key}, {"_id": 1}):
+            latest = await db[collection_name].find(
+                {"company_id": company_id}, {"_id": 0, field: 1}
+            ).sort(field, -1).limit(1).to_list(1)
+            highest = 0
+            if latest:
+                try:
+                    highest = int(latest[0][field].rsplit('-', 1)[-1])
+                except (KeyError, ValueError):
+                    highest = await db[collection_name].count_documents({"company_id": company_id})
+            try:
+                await db.counters.insert_one({"_id": key, "value": highest})
+            except DuplicateKeyError:
+                pass  # Another worker seeded it first
+        self.seeded.add(key)
+    
+    async def _reserve(self, key: str, count: int) -> int:
+        counter = await db.counters.find_one_and_update(
+            {"_id": key},
+            {"$inc": {"value": count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return counter['value']
+    
+    async def next(self, company_id: str, name: str, collection_name: str, field: str) -> int:
+        key = f"{company_id}:{name}"
+        await self._seed(key, company_id, collection_name, field)
+        if self.block_size == 1:
+            return await self._reserve(key, 1)
+        
+        lock = self.locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            block = self.blocks.get(key)
+            if not block or block[0] > block[1]:
+                last = await self._reserve(key, self.block_size)
+                block = self.blocks[key] = [last - self.block_size + 1, last]
+            number = block[0]
+            block[0] += 1
+            return number
+
+sequences = SequenceAllocator(SEQUENCE_BLOCK_SIZE)
+
 async def generate_order_number(company_id: str) -> str:
     """Generate unique order number for company"""
-    count = await db.work_orders.count_documents({"company_id": company_id}, hint=[("company_id", 1)])
-    return f"WO-{count + 1:06d}"
+    number = await sequences.next(company_id, "work_order", "work_orders", "order_number")
+    return f"WO-{number:06d}"
 
 async def generate_invoice_number(company_id: str) -> str:
     """Generate unique invoice number for company"""
-    count = await db.invoices.count_documents({"company_id": company_id}, hint=[("company_id", 1)])
-    return f"INV-{count + 1:06d}"
+    number = await sequences.next(company_id, "invoice", "invoices", "invoice_number")
+    return f"INV-{number:06d}"
+
+# Document numbers that renumber_duplicate_numbers may reassign: collection -> (field, generator)
+RENUMBERABLE_FIELDS = {
+    "work_orders": ("order_number", generate_order_number),
+    "invoices": ("invoice_number", generate_invoice_number),
+}
+
+async def renumber_duplicate_numbers() -> Dict[str, int]:
+    """Give every duplicated order or invoice number but the oldest a fresh number from the tenant's counter.
+    
+    Data written before the counters could reuse a number; the unique
+    (company_id, number) indexes cannot be built until it is repaired.
+    Returns how many documents were renumbered per collection.
+    """
+    duplicates = await find_unique_duplicates(only_missing=False)
+    renumbered = {}
+    for collection_name, (field, generate) in RENUMBERABLE_FIELDS.items():
+        count = 0
+        for groups in duplicates.get(collection_name, {}).values():
+            for group in groups:
+                if set(group['key']) != {"company_id", field}:
+                    continue
+                for _id in group['ids'][1:]:
+                    new_number = await generate(group['key']['company_id'])
+                    await db[collection_name].update_one(
+                        {"_id": _id}, {"$set": {field: new_number, "updated_at": utc_now()}, "$inc": {"version": 1}}
+                    )
+                    logging.info(f"Renumbered {collection_name} {_id}: {group['key'][field]} -> {new_number}")
+                    count += 1
+        renumbered[collection_name] = count
+    return renumbered
+
+class ListCountCache:
+    """Per-worker cache of list totals keyed by collection, tenant and normalized filter.
+    
+    Writes bump the tenant's generation instead of hunting down every cached
+    filter. A total from an older generation (or past its TTL) is still served,
+    flagged as an estimate, while one background recount per key refreshes it.
+    Uncached result sets larger than exact_limit get the same treatment, so a
+    list request never waits on counting a huge tenant.
+    """
+    def __init__(self, max_size: int, ttl: float, exact_limit: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.exact_limit = exact_limit
+        self.entries: "OrderedDict[str, Tuple[int, int, float]]" = OrderedDict()  # key -> (total, generation, expires_at)
+        self.generations: Dict[str, int] = {}
+        self.recounts = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.estimates = 0
+    
+    @staticmethod
+    def scope(collection: str, company_id: str) -> str:
+        return f"{collection}:{company_id}"
+    
+    async def total(self, collection: str, company_id: str, query: Dict[str, Any]) -> Tuple[int, bool]:
+        """Return (total, exact) for query, which must already be scoped to company_id"""
+        scope = self.scope(collection, company_id)
+        key = scope + ":" + json.dumps(query, sort_keys=True, separators=(',', ':'), default=str)
+        generation = self.generations.get(scope, 0)
+        entry = self.entries.get(key)
+        if entry is not None:
+            total, entry_generation, expires_at = entry
+            if entry_generation == generation and time.monotonic() < expires_at:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return total, True
+            self.estimates += 1
+            self._recount_later(key, collection, query, generation)
+            return total, False
+        
+        self.misses += 1
+        total = await db[collection].count_documents(query, limit=self.exact_limit + 1)
+        if total <= self.exact_limit:
+            self._store(key, total, generation)
+            return total, True
+        # Only a lower bound so far; the exact figure lands in the cache for the next request
+        self.estimates += 1
+        self._recount_later(key, collection, query, generation)
+        return total, False
+    
+    def _store(self, key: str, total: int, generation: int):
+        self.entries[key] = (total, generation, time.monotonic() + self.ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+    
+    def _recount_later(self, key: str, collection: str, query: Dict[str, Any], generation: int):
+        async def recount():
+            self._store(key, await db[collection].count_documents(query), generation)
+        
+        task = asyncio.ensure_future(self.recounts.do(key, recount))
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+    
+    def invalidate_local(self, scopes: List[str]):
+        for scope in scopes:
+            self.generations[scope] = self.generations.get(scope, 0) + 1
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "estimates": self.estimates,
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "recounts": self.recounts.stats()
+        }
+
+list_counts = ListCountCache(LIST_COUNT_CACHE_MAX_SIZE, LIST_COUNT_CACHE_TTL, LIST_COUNT_EXACT_LIMIT)
+invalidation_bus.subscribe("counts", list_counts.invalidate_local)
+
+def invalidate_list_counts(collection: str, company_id: str):
+    """Turn a tenant's cached list totals into estimates on every worker after a write"""
+    scope = ListCountCache.scope(collection, company_id)
+    list_counts.invalidate_local([scope])
+    invalidation_bus.publish("counts", [scope])
+
+def merge_deltas(*deltas: Dict[str, float]) -> Dict[str, float]:
+    merged: Dict[str, float] = {}
+    for delta in deltas:
+        for key, value in delta.items():
+            merged[key] = merged.get(key, 0) + value
+    return merged
+
+def work_order_status_deltas(old_status: Optional[str], new_status: Optional[str], count: int = 1) -> Dict[str, float]:
+    if old_status == new_status:
+        return {}
+    return merge_deltas(
+        {f"work_orders.{old_status}": -count} if old_status else {},
+        {f"work_orders.{new_status}": count} if new_status else {}
+    )
+
+def invoice_deltas(invoice: Dict[str, Any], sign: int = 1) -> Dict[str, float]:
+    status = invoice.get('status')
+    if not status:
+        return {}
+    return {f"invoices.{status}.count": sign, f"invoices.{status}.amount": sign * (invoice.get('total_amount') or 0)}
+
+async def inc_company_stats(company_id: str, deltas: Dict[str, float]):
+    """Apply counter changes to a tenant's company_stats document.
+    
+    The document is only updated, never created here: a missing document is
+    rebuilt from the collections on the next read, which already counts the
+    write. A failed increment is logged rather than failing the request that
+    has already written its data; reconciliation repairs the drift.
+    """
+    deltas = {key: value for key, value in deltas.items() if value}
+    if not deltas:
+        return
+    try:
+        await db.company_stats.update_one({"_id": company_id}, {"$inc": deltas})
+    except Exception as e:
+        logging.warning(f"company_stats increment failed for {company_id}, reconcile to repair: {e}")
+
+async def rebuild_company_stats(company_id: str) -> Dict[str, Any]:
+    """Recount a tenant's company_stats document from its collections"""
+    match = {"$match": {"company_id": company_id}}
+    (status_groups, invoice_groups, expense_totals, payment_totals, preventive_totals,
+     client_count, employee_count, vehicle_count) = await asyncio.gather(
+        db.work_orders.aggregate([
+            match,
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+        ]).to_list(None),
+        db.invoices.aggregate([
+            match,
+            {"$group": {"_id": "$status", "count": {"$sum": 1}, "amount": {"$sum": "$total_amount"}}}
+        ]).to_list(None),
+        db.expenses.aggregate([
+            match,
+            {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
+        ]).to_list(None),
+        db.payments.aggregate([
+            match,
+            {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
+        ]).to_list(None),
+        db.preventive_tasks.aggregate([
+            match,
+            {"$group": {
+                "_id": None,
+                "total": {"$sum": 1},
+                "active": {"$sum": {"$cond": [{"$eq": ["$status", "ACTIVE"]}, 1, 0]}}
+            }}
+        ]).to_list(None),
+        db.clients.count_documents({"company_id": company_id}),
+        db.employees.count_documents({"company_id": company_id}),
+        db.vehicles.count_documents({"company_id": company_id})
+    )
+    stats = {
+        "_id": company_id,
+        "work_orders": {group['_id']: group['count'] for group in status_groups if group['_id']},
+        "invoices": {
+            group['_id']: {"count": group['count'], "amount": group['amount']}
+            for group in invoice_groups if group['_id']
+        },
+        "expenses": expense_totals[0]['total'] if expense_totals else 0,
+        "payments": payment_totals[0]['total'] if payment_totals else 0,
+        "clients": client_count,
+        "employees": employee_count,
+        "vehicles": vehicle_count,
+        "preventive_tasks": {
+            "total": preventive_totals[0]['total'] if preventive_totals else 0,
+            "active": preventive_totals[0]['active'] if preventive_totals else 0
+        },
+        "reconciled_at": utc_now()
+    }
+    await db.company_stats.replace_one({"_id": company_id}, stats, upsert=True)
+    return stats
+
+def company_stats_drift(stored: Optional[Dict[str, Any]], rebuilt: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    """Counters whose stored value differs from the recount, keyed by dotted path"""
+    def flatten(document, prefix=''):
+        values = {}
+        for key, value in (document or {}).items():
+            if key in ('_id', 'reconciled_at'):
+                continue
+            if isinstance(value, dict):
+                values.update(flatten(value, f"{prefix}{key}."))
+            else:
+                values[f"{prefix}{key}"] = value
+        return values
+    stored_values, rebuilt_values = flatten(stored), flatten(rebuilt)
+    drift = {}
+    for key in stored_values.keys() | rebuilt_values.keys():
+        before, after = stored_values.get(key, 0), rebuilt_values.get(key, 0)
+        if abs(before - after) > 1e-6:
+            drift[key] = {"stored": before, "actual": after}
+    return drift
+
+# Invoice statuses that count as revenue in reports
+REVENUE_STATUSES = ('ISSUED', 'PAID')
+TREND_GROUPS = ('day', 'week', 'month', 'quarter')
+ROLLUP_FIELDS = ('created', 'completed', 'revenue', 'expenses', 'payments')
+
+def invoice_revenue(invoice: Dict[str, Any]) -> float:
+    return (invoice.get('total_amount') or 0) if invoice.get('status') in REVENUE_STATUSES else 0
+
+def rollup_day(timestamp: Optional[Union[datetime, str]]) -> str:
+    """UTC day (YYYY-MM-DD) of a timestamp, today if it is missing"""
+    return (to_timestamp(timestamp) if timestamp else utc_now()).strftime('%Y-%m-%d')
+
+def trend_period(day: str, group_by: str) -> str:
+    if group_by == 'day':
+        return day
+    if group_by == 'month':
+        return day[:7]
+    if group_by == 'week':
+        year, week, _ = datetime.strptime(day, '%Y-%m-%d').isocalendar()
+        return f"{year}-W{week:02d}"
+    return f"{day[:4]}-Q{(int(day[5:7]) - 1) // 3 + 1}"
+
+async def inc_daily_rollup(company_id: str, day: str, deltas: Dict[str, float]):
+    """Add to a tenant's daily_rollups document for one day, creating it if needed"""
+    deltas = {key: value for key, value in deltas.items() if value}
+    if not deltas:
+        return
+    try:
+        await db.daily_rollups.update_one({"company_id": company_id, "day": day}, {"$inc": deltas}, upsert=True)
+    except Exception as e:
+        logging.warning(f"daily_rollups increment failed for {company_id} {day}, backfill to repair: {e}")
+
+def completed_rollup_deltas(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, int]:
+    """Per-day changes to the completed counter when a work order goes from previous to current.
+    
+    completed counts the work orders whose status is COMPLETED, on the day of
+    their completed_at (updated_at for orders completed before it existed) -
+    the definition rebuild_daily_rollups uses - so reopening an order takes it
+    back off its completion day.
+    """
+    deltas: Dict[str, int] = {}
+    for work_order, sign in ((previous, -1), (current, 1)):
+        if work_order.get('status') == 'COMPLETED':
+            day = rollup_day(work_order.get('completed_at') or work_order.get('updated_at'))
+            deltas[day] = deltas.get(day, 0) + sign
+    return deltas
+
+async def inc_completed_rollups(company_id: str, deltas: Dict[str, int]):
+    for day, delta in deltas.items():
+        await inc_daily_rollup(company_id, day, {"completed": delta})
+
+async def rebuild_daily_rollups(company_id: str) -> int:
+    """Recompute a tenant's daily_rollups from its history; returns the number of days.
+    
+    The tenant is marked backfilled only once every day is written; a failed
+    write raises and leaves it unmarked.
+    """
+    def by_day(field):
+        # $convert also reads the ISO strings of documents migrate_timestamps.py has not reached yet
+        date = {"$convert": {"input": field, "to": "date", "onError": None, "onNull": None}}
+        return {"$dateToString": {"format": "%Y-%m-%d", "date": date}}
+    
+    match = {"$match": {"company_id": company_id}}
+    created, completed, revenue, expenses, payments = await asyncio.gather(
+        db.work_orders.aggregate([
+            match,
+            {"$group": {"_id": by_day("$created_at"), "value": {"$sum": 1}}}
+        ]).to_list(None),
+        db.work_orders.aggregate([
+            {"$match": {"company_id": company_id, "status": "COMPLETED"}},
+            # Work orders completed before completed_at existed fall back to their last update
+            {"$group": {"_id": by_day({"$ifNull": ["$completed_at", "$updated_at"]}), "value": {"$sum": 1}}}
+        ]).to_list(None),
+        db.invoices.aggregate([
+            {"$match": {"company_id": company_id, "status": {"$in": list(REVENUE_STATUSES)}}},
+            {"$group": {"_id": by_day({"$ifNull": ["$issued_date", "$created_at"]}), "value": {"$sum": "$total_amount"}}}
+        ]).to_list(None),
+        db.expenses.aggregate([
+            match,
+            {"$group": {"_id": by_day({"$ifNull": ["$date", "$created_at"]}), "value": {"$sum": "$amount"}}}
+        ]).to_list(None),
+        db.payments.aggregate([
+            match,
+            {"$group": {"_id": by_day("$created_at"), "value": {"$sum": "$amount"}}}
+        ]).to_list(None)
+    )
+    days: Dict[str, Dict[str, Any]] = {}
+    for field, groups in zip(ROLLUP_FIELDS, (created, completed, revenue, expenses, payments)):
+        for group in groups:
+            if group['_id']:
+                days.setdefault(group['_id'], {"company_id": company_id, "day": group['_id']})[field] = group['value']
+    
+    # Upserts, so increments from concurrent writes never collide with the rebuild on the unique (company_id, day) key
+    requests = [ReplaceOne({"company_id": company_id, "day": day}, document, upsert=True) for day, document in days.items()]
+    requests.append(DeleteMany({"company_id": company_id, "day": {"$nin": list(days)}}))
+    await db.daily_rollups.bulk_write(requests, ordered=False)
+    await db.companies.update_one({"id": company_id}, {"$set": {"rollups_backfilled_at": utc_now()}})
+    return len(days)
+
+rollup_tenants: set = set()
+rollup_backfills = SingleFlight()
+
+async def ensure_daily_rollups(company_id: str):
+    """Backfill a tenant's daily_rollups the first time its trends are read.
+    
+    A failed backfill answers 503 and is retried by the next read.
+    """
+    if company_id in rollup_tenants:
+        return
+    company = await db.companies.find_one({"id": company_id}, {"_id": 0, "rollups_backfilled_at": 1})
+    if not (company and company.get('rollups_backfilled_at')):
+        try:
+            await rollup_backfills.do(company_id, lambda: rebuild_daily_rollups(company_id))
+        except (BulkWriteError, OperationFailure) as e:
+            logging.warning(f"daily_rollups backfill failed for {company_id}, retrying on the next read: {e}")
+            raise HTTPException(status_code=503, detail="Trend data is being rebuilt, retry shortly")
+    rollup_tenants.add(company_id)
+
+def field_projection(
+    fields: Optional[str],
+    model: Type[BaseModel],
+    required: Tuple[str, ...] = ('id',),
+    computed: Tuple[str, ...] = (),
+    excluded: Tuple[str, ...] = ()
+) -> Dict[str, int]:
+    """MongoDB projection for a ?fields=a,b,c sparse fieldset.
+    
+    Names are validated against the model (plus any computed response
+    fields); required fields are always returned. Without fields the whole
+    document is returned apart from _id and the excluded fields.
+    """
+    if not fields:
+        return {"_id": 0, **{field: 0 for field in excluded}}
+    requested = {name.strip() for name in fields.split(',') if name.strip()}
+    unknown = sorted(requested - ((set(model.model_fields) | set(computed)) - set(excluded)))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    projection = {"_id": 0}
+    for field in sorted((requested - set(computed)) | set(required)):
+        projection[field] = 1
+    return projection
+
+def version_filter(version: Optional[int]) -> Dict[str, Any]:
+    """Optimistic concurrency: match only the version the client last read.
+    
+    Documents written before versioning have no version field and count as 0.
+    """
+    if version is None:
+        return {}
+    return {"version": version} if version else {"version": {"$in": [0, None]}}
+
+async def raise_update_miss(collection: str, query: Dict[str, Any], not_found: str):
+    """A conditional update matched nothing: 409 if the document exists (stale version), else 404"""
+    if await db[collection].find_one(query, {"_id": 1}):
+        raise HTTPException(status_code=409, detail="Modified by someone else since it was loaded; reload and retry")
+    raise HTTPException(status_code=404, detail=not_found)
+
+def make_etag(*parts: Any, weak: bool = False) -> str:
+    digest = hashlib.sha256(json.dumps(parts, separators=(',', ':'), default=str).encode('utf-8')).hexdigest()[:32]
+    return f'W/"{digest}"' if weak else f'"{digest}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Weak comparison of If-None-Match against etag, as RFC 9110 requires for GET"""
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    opaque = etag.removeprefix('W/')
+    return any(tag.strip().removeprefix('W/') == opaque for tag in header.split(','))
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+LIST_STAMP_PROJECTION = {"_id": 0, "id": 1, "updated_at": 1}
+
+def list_etag(collection: str, query: Dict[str, Any], request: Request, documents: List[Dict[str, Any]], *parts: Any) -> str:
+    """Weak ETag for a list response built from the (id, updated_at) of the documents it returns.
+    
+    Any write that adds, removes or updates a listed document changes it;
+    parts carries whatever else the response shows, such as the total.
+    """
+    stamps = [(document.get('id'), document.get('updated_at')) for document in documents]
+    return make_etag(collection, query, str(request.url.query), stamps, *parts, weak=True)
+
+def stamped_projection(projection: Dict[str, int]) -> Tuple[Dict[str, int], bool]:
+    """projection with updated_at added for list_etag, and whether it must be stripped from the response"""
+    if any(value == 1 for value in projection.values()) and 'updated_at' not in projection:
+        return {**projection, 'updated_at': 1}, True
+    return projection, False
+
+# An exact order number in a search box is looked up directly instead of ranked;
+# "wo-12" is padded to the stored "WO-000012"
+ORDER_NUMBER_PATTERN = re.compile(r'WO-(\d+)', re.IGNORECASE)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+def encode_page_cursor(created_at: Union[datetime, str], item_id: str) -> str:
+    """Opaque keyset cursor for list endpoints sorted by (created_at, id) descending.
+    
+    Dates are kept as epoch milliseconds, the precision BSON stores; documents
+    not yet migrated to BSON dates keep their ISO string.
+    """
+    if isinstance(created_at, datetime):
+        created_at = (as_utc(created_at) - EPOCH) // timedelta(milliseconds=1)
+    raw = json.dumps([created_at, item_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_page_cursor(cursor: str):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, item_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if isinstance(created_at, int) and not isinstance(created_at, bool):
+            created_at = EPOCH + timedelta(milliseconds=created_at)
+        if not isinstance(created_at, (datetime, str)) or not isinstance(item_id, str):
+            raise ValueError("cursor fields must be a timestamp and a string")
+    except (ValueError, TypeError, OverflowError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return created_at, item_id
+
+class SpoolTransport:
+    """Local stand-in for an email or SMS provider: appends one JSON line per message"""
+    
+    def __init__(self, channel: str, directory: str):
+        self.channel = channel
+        self.path = Path(directory) / f"{channel}.jsonl"
+        self.sent = 0
+    
+    def _append(self, lines: List[str]):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as spool:
+            spool.write(''.join(lines))
+    
+    async def send(self, messages: List[Dict[str, Any]]):
+        await asyncio.to_thread(self._append, [json.dumps(message, default=json_default) + '\n' for message in messages])
+        self.sent += len(messages)
+
+class NotificationOutbox:
+    """Takes notification writes off the request path.
+    
+    Requests enqueue Notification objects; one dispatcher task per worker
+    drains the queue in batches, stores in-app notifications with a single
+    insert_many and fans out to the other channels for users who have
+    notifications enabled. Every step is retried with backoff - in-app
+    inserts are idempotent thanks to the unique id index, the other channels
+    are at-least-once. The queue is bounded: when it is full, enqueue waits
+    up to enqueue_timeout and then delivers inline, so producers slow down
+    instead of growing memory. Without a running dispatcher (scripts, tests)
+    delivery is always inline.
+    """
+    
+    def __init__(self, max_queue: int, batch_size: int, flush_interval: float, max_retries: int,
+                 channels: List[str], spool_dir: str, enqueue_timeout: float = 1.0):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.enqueue_timeout = enqueue_timeout
+        self.transports = {channel: SpoolTransport(channel, spool_dir) for channel in channels if channel != 'in-app'}
+        self.in_app = 'in-app' in channels
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.enqueued = 0
+        self.delivered = 0
+        self.batches = 0
+        self.retries = 0
+        self.failed = 0
+        self.inline = 0
+    
+    def start(self):
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        self.task = asyncio.create_task(self._run())
+    
+    async def enqueue(self, notifications: List[Notification]):
+        if self.task is None or self.task.done():
+            self.inline += len(notifications)
+            await self.deliver(notifications)
+            return
+        for position, notification in enumerate(notifications):
+            try:
+                self.queue.put_nowait(notification)
+            except asyncio.QueueFull:
+                try:
+                    await asyncio.wait_for(self.queue.put(notification), timeout=self.enqueue_timeout)
+                except asyncio.TimeoutError:
+                    # Dispatcher is falling behind - pay for the rest on this request
+                    rest = notifications[position:]
+                    self.inline += len(rest)
+                    await self.deliver(rest)
+                    return
+            self.enqueued += 1
+    
+    async def _run(self):
+        while True:
+            batch = [await self.queue.get()]
+            if self.queue.qsize() < self.batch_size - 1 and self.flush_interval:
+                await asyncio.sleep(self.flush_interval)  # Let a burst accumulate into one batch
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                await self.deliver(batch)
+            except Exception as e:
+                logging.error(f"Dropping {len(batch)} notifications after {self.max_retries} retries: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+    
+    async def _retrying(self, step: str, count: int, action: Callable[[], Any]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await action()
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.failed += count
+                    raise
+                self.retries += 1
+                logging.warning(f"Notification {step} failed (attempt {attempt + 1}), retrying: {e}")
+                await asyncio.sleep(min(0.1 * 2 ** attempt, 5.0))
+    
+    async def _store(self, documents: List[Dict[str, Any]]):
+        try:
+            await db.notifications.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            # Documents inserted by an earlier attempt come back as duplicate ids
+            if any(error.get('code') != 11000 for error in e.details.get('writeErrors', [])):
+                raise
+    
+    async def deliver(self, notifications: List[Notification]):
+        if not notifications:
+            return
+        self.batches += 1
+        if self.in_app:
+            documents = [notification.model_dump() for notification in notifications]
+            await self._retrying("insert", len(documents), lambda: self._store(documents))
+        
+        if self.transports:
+            user_ids = list({notification.user_id for notification in notifications})
+            users = await self._retrying("recipient lookup", len(notifications), lambda: db.users.find(
+                {"id": {"$in": user_ids}, "notifications_enabled": {"$ne": False}},
+                {"_id": 0, "id": 1, "email": 1, "phone": 1}
+            ).to_list(None))
+            contacts = {user['id']: user for user in users}
+            for channel, transport in self.transports.items():
+                address_field = 'phone' if channel == 'sms' else 'email'
+                messages = [
+                    {"to": contacts[n.user_id][address_field], "type": n.type, "payload": n.payload,
+                     "notification_id": n.id, "company_id": n.company_id, "sent_at": n.sent_at}
+                    for n in notifications
+                    if contacts.get(n.user_id, {}).get(address_field)
+                ]
+                if messages:
+                    await self._retrying(channel, len(messages), lambda: transport.send(messages))
+        
+        self.delivered += len(notifications)
+        logging.info(f"{len(notifications)} notifications sent")
+    
+    async def close(self, timeout: float = 5.0):
+        """Flush what is queued, then stop the dispatcher"""
+        if self.task is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"Shutting down with {self.queue.qsize()} notifications undelivered")
+        self.task.cancel()
+        self.task = None
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.task is not None and not self.task.done(),
+            "queued": self.queue.qsize() if self.queue else 0,
+            "max_queue": self.max_queue,
+            "enqueued": self.enqueued,
+            "delivered": self.delivered,
+            "batches": self.batches,
+            "retries": self.retries,
+            "failed": self.failed,
+            "inline": self.inline,
+            "channels": {"in-app": self.in_app, **{channel: transport.sent for channel, transport in self.transports.items()}}
+        }
+
+notification_outbox = NotificationOutbox(
+    NOTIFICATION_QUEUE_SIZE, NOTIFICATION_BATCH_SIZE, NOTIFICATION_FLUSH_INTERVAL, NOTIFICATION_MAX_RETRIES,
+    NOTIFICATION_CHANNELS, NOTIFICATION_SPOOL_DIR
+)
+
+class TenantEventHub:
+    """Shares one change stream per worker between all SSE connections.
+    
+    The first subscriber starts a watch on work_orders, comments, invoices
+    and notifications; the last one to leave stops it. Each change is
+    encoded once and offered to the subscribers of its tenant whose role
+    can see it - the work order behind a comment or invoice is looked up
+    once per change, not per subscriber. Subscribers have bounded queues:
+    one that falls behind gets None (resync) and is dropped, so a slow
+    client never stalls the stream. Deletes are scoped with change stream
+    pre-images, which enable_pre_images turns on where the server allows.
+    """
+    COLLECTIONS = {"work_orders": "work_order", "comments": "comment", "invoices": "invoice", "notifications": "notification"}
+    OPERATIONS = {"insert": "created", "update": "updated", "replace": "updated", "delete": "deleted"}
+    # Code returned by standalone servers, which have no change streams
+    UNSUPPORTED_CODES = (40573,)
+    # Unknown field: servers before 6.0 reject fullDocumentBeforeChange
+    UNKNOWN_OPTION_CODES = (40415,)
+    # Resume token fell off the oplog
+    HISTORY_LOST_CODES = (286, 280)
+    
+    def __init__(self, queue_size: int, heartbeat: float):
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.subscribers: Dict[str, Dict[int, Tuple[dict, asyncio.Queue]]] = {}
+        self.task: Optional[asyncio.Task] = None
+        self.resume_token = None
+        self.available = True
+        self.pre_images_enabled = False
+        self.changes = 0
+        self.delivered = 0
+        self.resyncs = 0
+        self.restarts = 0
+    
+    def subscribe(self, company_id: str, user: dict) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.setdefault(company_id, {})[id(queue)] = (user, queue)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+        return queue
+    
+    def unsubscribe(self, company_id: str, queue: asyncio.Queue):
+        tenant = self.subscribers.get(company_id, {})
+        tenant.pop(id(queue), None)
+        if not tenant:
+            self.subscribers.pop(company_id, None)
+        if not self.subscribers and self.task is not None:
+            self.task.cancel()
+            self.task = None
+            self.resume_token = None
+    
+    def _resync(self, company_id: str, queue: asyncio.Queue):
+        self.resyncs += 1
+        self.subscribers.get(company_id, {}).pop(id(queue), None)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+    
+    def _resync_all(self):
+        for company_id, tenant in list(self.subscribers.items()):
+            for _, queue in list(tenant.values()):
+                self._resync(company_id, queue)
+    
+    async def enable_pre_images(self):
+        for collection in self.COLLECTIONS:
+            try:
+                await db.command({"collMod": collection, "changeStreamPreAndPostImages": {"enabled": True}})
+            except OperationFailure as e:
+                logging.warning(f"Delete events for {collection} need change stream pre-images: {e}")
+                return
+        self.pre_images_enabled = True
+    
+    async def _run(self):
+        if not self.pre_images_enabled:
+            await self.enable_pre_images()
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": list(self.COLLECTIONS)},
+            "operationType": {"$in": list(self.OPERATIONS)}
+        }}]
+        delay = 0.5
+        while True:
+            try:
+                before_change = 'whenAvailable' if self.pre_images_enabled else None
+                async with db.watch(pipeline, full_document='updateLookup', full_document_before_change=before_change,
+                                    resume_after=self.resume_token) as stream:
+                    delay = 0.5
+                    async for change in stream:
+                        self.resume_token = stream.resume_token
+                        await self._dispatch(change)
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code in self.UNSUPPORTED_CODES:
+                    logging.error(f"Event stream disabled, change streams need a replica set: {e}")
+                    self.available = False
+                    self._resync_all()
+                    return
+                if e.code in self.UNKNOWN_OPTION_CODES and self.pre_images_enabled:
+                    logging.warning(f"Change stream pre-images unsupported, delete events are skipped: {e}")
+                    self.pre_images_enabled = False
+                    continue
+                if e.code in self.HISTORY_LOST_CODES:
+                    self.resume_token = None
+                    self._resync_all()
+                self.restarts += 1
+                logging.warning(f"Change stream failed, restarting: {e}")
+            except Exception as e:
+                self.restarts += 1
+                logging.warning(f"Change stream failed, restarting: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+    
+    async def _dispatch(self, change: Dict[str, Any]):
+        self.changes += 1
+        document = change.get('fullDocument') or change.get('fullDocumentBeforeChange')
+        if not document or document.get('company_id') not in self.subscribers:
+            return
+        company_id = document['company_id']
+        kind = self.COLLECTIONS[change['ns']['coll']]
+        operation = self.OPERATIONS[change['operationType']]
+        document.pop('_id', None)
+        tenant = self.subscribers[company_id]
+        
+        work_order = document if kind == 'work_order' else None
+        if kind in ('comment', 'invoice') and any(user['role'] in ('EMPLOYEE', 'CLIENT') for user, _ in tenant.values()):
+            work_order = await db.work_orders.find_one(
+                {"id": document.get('work_order_id'), "company_id": company_id},
+                {"_id": 0, "assigned_technicians": 1, "status": 1, "requested_by_client_id": 1}
+            )
+        
+        data = document if operation != 'deleted' else {
+            key: document[key] for key in ('id', 'work_order_id', 'user_id') if key in document
+        }
+        message = f"event: {kind}.{operation}\ndata: {json.dumps(data, default=json_default)}\n\n"
+        for user, queue in list(tenant.values()):
+            if not self.visible(kind, document, work_order, user):
+                continue
+            try:
+                queue.put_nowait(message)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                self._resync(company_id, queue)
+    
+    @staticmethod
+    def visible(kind: str, document: Dict[str, Any], work_order: Optional[Dict[str, Any]], user: dict) -> bool:
+        if kind == 'notification':
+            return document.get('user_id') == user['id']
+        if user['role'] in ('SUPERADMIN', 'ADMIN'):
+            return True
+        if kind == 'invoice' and user['role'] == 'EMPLOYEE':
+            return True
+        return work_order is not None and work_order_visible(work_order, user)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "available": self.available,
+            "watching": self.task is not None and not self.task.done(),
+            "connections": sum(len(tenant) for tenant in self.subscribers.values()),
+            "tenants": len(self.subscribers),
+            "changes": self.changes,
+            "delivered": self.delivered,
+            "resyncs": self.resyncs,
+            "restarts": self.restarts
+        }
+
+tenant_events = TenantEventHub(EVENT_STREAM_QUEUE_SIZE, EVENT_STREAM_HEARTBEAT)
+
+async def send_notifications(notifications: List[Notification]):
+    """Queue notifications for the background dispatcher"""
+    await notification_outbox.enqueue(notifications)
 
 async def send_notification(user_id: str, company_id: str, notification_type: str, payload: Dict[str, Any]):
-    """Mock notification sender - logs to console"""
+    """Queue one notification for the background dispatcher"""
     notification = Notification(
         user_id=user_id,
         company_id=company_id,
         type=notification_type,
         payload=payload
     )
-    await db.notifications.insert_one(notification.model_dump())
-    logging.info(f"Notification sent to {user_id}: {notification_type}")
+    await notification_outbox.enqueue([notification])
 
 async def update_last_login(user_id: str):
     """Update user's last login time"""
     await db.users.update_one(
         {"id": user_id},
-        {"$set": {"last_login": datetime.now(timezone.utc).isoformat()}}
+        {"$set": {"last_login": utc_now()}}
     )
 
-def calculate_next_due_date(start_date: str, frequency: str) -> str:
+def calculate_next_due_date(start_date: Optional[datetime], frequency: str) -> datetime:
     """Calculate next due date based on frequency"""
-    start = datetime.fromisoformat(start_date) if start_date else datetime.now(timezone.utc)
+    start = start_date or utc_now()
     
     if frequency == "daily":
         next_date = start + timedelta(days=1)
@@ -639,7 +2409,7 @@ def calculate_next_due_date(start_date: str, frequency: str) -> str:
     else:
         next_date = start + timedelta(days=30)  # default monthly
     
-    return next_date.isoformat()
+    return next_date
 
 # =======================
 # Authentication Routes
@@ -647,26 +2417,48 @@ def calculate_next_due_date(start_date: str, frequency: str) -> str:
 
 @api_router.post("/auth/login")
 async def login(credentials: UserLogin):
-    # Use hint to ensure we use the email index for faster lookup
-    user_doc = await db.users.find_one({"email": credentials.email}, {"_id": 0})
-    if not user_doc or not verify_password(credentials.password, user_doc.get('password_hash', '')):
-        raise HTTPException(status_code=401, detail="Invalid credentials")
+    read_started = begin_user_read()
+    try:
+        # Use hint to ensure we use the email index for faster lookup
+        user_doc = await db.users.find_one({"email": credentials.email}, {"_id": 0})
+        if not user_doc or not await verify_password(credentials.password, user_doc.get('password_hash', '')):
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+        
+        if not user_doc.get('is_active'):
+            raise HTTPException(status_code=403, detail="Account is inactive")
+        
+        # Update last login (non-blocking)
+        asyncio.create_task(
+            update_last_login(user_doc['id'])
+        )
+        
+        token = create_token(user_doc['id'], user_doc.get('company_id'), user_doc['role'])
+        user_doc.pop('password_hash', None)
+        
+        # Pre-cache the user to speed up subsequent requests
+        await cache_user_read(user_doc, read_started)
+    finally:
+        end_user_read(read_started)
+    
+    response = {"token": token, "user": user_doc}
+    if STATELESS_PRINCIPAL:
+        response["access_token"] = create_access_token(user_doc)
+        response["access_token_expires_in"] = ACCESS_TOKEN_EXPIRATION * 60
+    return response
+
+@api_router.post("/auth/access-token")
+async def refresh_access_token(current_user: dict = Depends(get_current_user)):
+    """Issue a fresh short-lived access token after a full user check"""
+    if not STATELESS_PRINCIPAL:
+        raise HTTPException(status_code=404, detail="Stateless principal mode is disabled")
     
-    if not user_doc.get('is_active'):
+    if not current_user.get('is_active'):
         raise HTTPException(status_code=403, detail="Account is inactive")
     
-    # Update last login (non-blocking)
-    asyncio.create_task(
-        update_last_login(user_doc['id'])
-    )
-    
-    token = create_token(user_doc['id'], user_doc.get('company_id'), user_doc['role'])
-    user_doc.pop('password_hash', None)
-    
-    # Pre-cache the user to speed up subsequent requests
-    user_cache[user_doc['id']] = CacheEntry(user_doc)
-    
-    return {"token": token, "user": user_doc}
+    return {
+        "access_token": create_access_token(current_user),
+        "access_token_expires_in": ACCESS_TOKEN_EXPIRATION * 60
+    }
 
 @api_router.get("/users/me")
 async def get_me(current_user: dict = Depends(get_current_user)):
@@ -693,13 +2485,6 @@ async def create_user(user_data: UserCreate, current_user: dict = Depends(get_cu
         elif current_user['role'] != 'SUPERADMIN':
             raise HTTPException(status_code=403, detail="Insufficient permissions")
         
-        # Check if email exists
-        logging.info(f"Checking if email exists: {user_data.email}")
-        existing = await db.users.find_one({"email": user_data.email})
-        logging.info(f"Existing user check result: {existing}")
-        if existing:
-            raise HTTPException(status_code=400, detail="Email already exists")
-        
         # For CLIENT users, verify the client_id if provided
         if user_data.role == 'CLIENT' and user_data.client_id:
             client = await db.clients.find_one({"id": user_data.client_id, "company_id": user_data.company_id})
@@ -721,7 +2506,7 @@ async def create_user(user_data: UserCreate, current_user: dict = Depends(get_cu
         user_dict = user.model_dump()
         logging.info(f"User dict: {user_dict}")
         logging.info("Hashing password")
-        user_dict['password_hash'] = hash_password(user_data.password)
+        user_dict['password_hash'] = await hash_password(user_data.password)
         
         # Add client_id for CLIENT users if provided
         if user_data.role == 'CLIENT' and user_data.client_id:
@@ -729,11 +2514,16 @@ async def create_user(user_data: UserCreate, current_user: dict = Depends(get_cu
         
         logging.info(f"User dict with password: {user_dict}")
         
+        # The unique email index rejects duplicates, so no read-before-write is needed
         logging.info("Inserting user into database")
-        result = await db.users.insert_one(user_dict)
+        try:
+            result = await db.users.insert_one(user_dict)
+        except DuplicateKeyError:
+            raise HTTPException(status_code=400, detail="Email already exists")
         logging.info(f"Insert result: {result}")
         logging.info("Removing password_hash from response")
         user_dict.pop('password_hash')
+        user_dict.pop('_id', None)  # Added by insert_one
         logging.info("User created successfully")
         return user_dict
     except HTTPException as he:
@@ -744,16 +2534,17 @@ async def create_user(user_data: UserCreate, current_user: dict = Depends(get_cu
         raise HTTPException(status_code=500, detail=f"Error creating user: {str(e)}")
 
 @api_router.get("/users")
-async def get_users(current_user: dict = Depends(get_current_user)):
+async def get_users(fields: Optional[str] = None, current_user: dict = Depends(get_principal)):
     query = {}
     if current_user['role'] == 'ADMIN':
         query['company_id'] = current_user['company_id']
     
-    users = await db.users.find(query, {"_id": 0, "password_hash": 0}).to_list(1000)
+    projection = field_projection(fields, User, excluded=('password_hash',))
+    users = await db.users.find(query, projection).to_list(1000)
     return users
 
 @api_router.get("/users/{user_id}")
-async def get_user(user_id: str, current_user: dict = Depends(get_current_user)):
+async def get_user(user_id: str, current_user: dict = Depends(get_principal)):
     user = await db.users.find_one({"id": user_id}, {"_id": 0, "password_hash": 0})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -776,28 +2567,27 @@ async def update_user(user_id: str, user_data: UserCreate, current_user: dict =
     elif current_user['role'] != 'SUPERADMIN':
         raise HTTPException(status_code=403, detail="Insufficient permissions")
     
-    # Check if user exists
-    existing_user = await db.users.find_one({"id": user_id})
-    if not existing_user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    # Check if email is being changed and if it already exists
-    if user_data.email != existing_user['email']:
-        email_exists = await db.users.find_one({"email": user_data.email})
-        if email_exists:
-            raise HTTPException(status_code=400, detail="Email already exists")
-    
-    # Update user
-    update_data = user_data.model_dump()
+    # Update and read back in one round trip; email uniqueness is enforced by the unique index
+    query = {"id": user_id, **version_filter(user_data.version)}
+    if current_user['role'] == 'ADMIN':
+        query['company_id'] = current_user['company_id']
+    update_data = user_data.model_dump(exclude={'password', 'version'})
     if user_data.password:
-        update_data['password_hash'] = hash_password(user_data.password)
+        update_data['password_hash'] = await hash_password(user_data.password)
     
-    await db.users.update_one(
-        {"id": user_id},
-        {"$set": update_data}
-    )
+    try:
+        updated_user = await db.users.find_one_and_update(
+            query,
+            {"$set": update_data, "$inc": {"version": 1}},
+            projection={"_id": 0, "password_hash": 0},
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already exists")
+    if not updated_user:
+        await raise_update_miss("users", {k: v for k, v in query.items() if k != 'version'}, "User not found")
+    await invalidate_cached_users([user_id])
     
-    updated_user = await db.users.find_one({"id": user_id}, {"_id": 0, "password_hash": 0})
     return updated_user
 
 @api_router.delete("/users/{user_id}")
@@ -821,6 +2611,8 @@ async def delete_user(user_id: str, current_user: dict = Depends(get_current_use
     
     # Delete user
     await db.users.delete_one({"id": user_id})
+    await revocation_list.revoke([user_id])
+    await invalidate_cached_users([user_id])
     return {"message": "User deleted successfully"}
 
 # =======================
@@ -837,7 +2629,7 @@ async def create_company(company_data: CompanyCreate, current_user: dict = Depen
     return company
 
 @api_router.get("/companies")
-async def get_companies(current_user: dict = Depends(get_current_user)):
+async def get_companies(current_user: dict = Depends(get_principal)):
     if current_user['role'] == 'SUPERADMIN':
         # Use hint for better performance with SUPERADMIN users
         companies_cursor = db.companies.find({}, {"_id": 0})
@@ -849,7 +2641,7 @@ async def get_companies(current_user: dict = Depends(get_current_user)):
     return companies
 
 @api_router.get("/companies/{company_id}")
-async def get_company(company_id: str, current_user: dict = Depends(get_current_user)):
+async def get_company(company_id: str, current_user: dict = Depends(get_principal)):
     if current_user['role'] != 'SUPERADMIN' and current_user['company_id'] != company_id:
         raise HTTPException(status_code=403, detail="Access denied")
     
@@ -872,18 +2664,19 @@ async def create_client(company_id: str, client_data: ClientCreate, current_user
     
     client = Client(company_id=company_id, **client_data.model_dump())
     await db.clients.insert_one(client.model_dump())
+    await inc_company_stats(company_id, {"clients": 1})
     return client
 
 @api_router.get("/companies/{company_id}/clients")
-async def get_clients(company_id: str, current_user: dict = Depends(get_current_user)):
+async def get_clients(company_id: str, fields: Optional[str] = None, current_user: dict = Depends(get_principal)):
     if current_user['role'] != 'SUPERADMIN' and current_user['company_id'] != company_id:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    clients = await db.clients.find({"company_id": company_id}, {"_id": 0}).to_list(1000)
+    clients = await db.clients.find({"company_id": company_id}, field_projection(fields, Client)).to_list(1000)
     return clients
 
 @api_router.get("/companies/{company_id}/clients/{client_id}")
-async def get_client(company_id: str, client_id: str, current_user: dict = Depends(get_current_user)):
+async def get_client(company_id: str, client_id: str, current_user: dict = Depends(get_principal)):
     if current_user['role'] != 'SUPERADMIN' and current_user['company_id'] != company_id:
         raise HTTPException(status_code=403, detail="Access denied")
     
@@ -912,10 +2705,15 @@ async def delete_client(company_id: str, client_id: str, current_user: dict = De
         raise HTTPException(status_code=400, detail="Cannot delete client with existing work orders")
     
     # Delete client
-    await db.clients.delete_one({"id": client_id, "company_id": company_id})
+    result = await db.clients.delete_one({"id": client_id, "company_id": company_id})
+    await inc_company_stats(company_id, {"clients": -result.deleted_count})
     
     # Also delete any users associated with this client
+    client_users = await db.users.find({"client_id": client_id, "company_id": company_id}, {"_id": 0, "id": 1}).to_list(1000)
     await db.users.delete_many({"client_id": client_id, "company_id": company_id})
+    client_user_ids = [user['id'] for user in client_users]
+    await revocation_list.revoke(client_user_ids)
+    await invalidate_cached_users(client_user_ids)
     
     return {"message": "Client deleted successfully"}
 
@@ -932,22 +2730,29 @@ async def create_employee(company_id: str, emp_data: EmployeeCreate, current_use
         raise HTTPException(status_code=403, detail="Access denied")
     
     employee = Employee(company_id=company_id, **emp_data.model_dump())
-    await db.employees.insert_one(employee.model_dump())
+    # The unique user_id index allows one employee record per user
+    try:
+        await db.employees.insert_one(employee.model_dump())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="User is already an employee")
+    await inc_company_stats(company_id, {"employees": 1})
     return employee
 
 @api_router.get("/companies/{company_id}/employees")
-async def get_employees(company_id: str, current_user: dict = Depends(get_current_user)):
+async def get_employees(company_id: str, current_user: dict = Depends(get_principal)):
     if current_user['role'] != 'SUPERADMIN' and current_user['company_id'] != company_id:
         raise HTTPException(status_code=403, detail="Access denied")
     
     # Get employees
     employees = await db.employees.find({"company_id": company_id}, {"_id": 0}).to_list(1000)
     
-    # Enrich employees with user details
+    # Enrich employees with user details, fetched in one query
+    user_ids = list({employee['user_id'] for employee in employees})
+    users = await db.users.find({"id": {"$in": user_ids}}, {"_id": 0, "password_hash": 0}).to_list(None)
+    users_by_id = {user['id']: user for user in users}
     enriched_employees = []
     for employee in employees:
-        # Get user details
-        user = await db.users.find_one({"id": employee['user_id']}, {"_id": 0, "password_hash": 0})
+        user = users_by_id.get(employee['user_id'])
         if user:
             # Merge user details into employee object
             enriched_employee = {**employee, "user": user}
@@ -974,6 +2779,7 @@ async def create_vehicle(company_id: str, vehicle_data: VehicleCreate, current_u
         vehicle = Vehicle(company_id=company_id, **vehicle_data.model_dump())
         result = await db.vehicles.insert_one(vehicle.model_dump())
         if result.acknowledged:
+            await inc_company_stats(company_id, {"vehicles": 1})
             return vehicle
         else:
             raise HTTPException(status_code=500, detail="Failed to save vehicle to database")
@@ -981,18 +2787,22 @@ async def create_vehicle(company_id: str, vehicle_data: VehicleCreate, current_u
         raise HTTPException(status_code=500, detail=f"Error creating vehicle: {str(e)}")
 
 @api_router.get("/companies/{company_id}/vehicles")
-async def get_vehicles(company_id: str, current_user: dict = Depends(get_current_user)):
+async def get_vehicles(company_id: str, fields: Optional[str] = None, current_user: dict = Depends(get_principal)):
     if current_user['role'] != 'SUPERADMIN' and current_user['company_id'] != company_id:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    vehicles = await db.vehicles.find({"company_id": company_id}, {"_id": 0}).to_list(1000)
+    projection = field_projection(fields, Vehicle, computed=('owner_client_name',))
+    with_owner_name = not fields or 'owner_client_name' in {name.strip() for name in fields.split(',')}
+    if fields and with_owner_name:
+        projection['owner_client_id'] = 1  # Needed to look the name up
+    vehicles = await db.vehicles.find({"company_id": company_id}, projection).to_list(1000)
     
     # Enrich vehicles with client details
     enriched_vehicles = []
     for vehicle in vehicles:
         enriched_vehicle = vehicle.copy()
         owner_client_id = vehicle.get('owner_client_id')
-        if owner_client_id:
+        if owner_client_id and with_owner_name:
             client = await db.clients.find_one(
                 {"id": owner_client_id, "company_id": company_id}, 
                 {"_id": 0, "name": 1}
@@ -1039,6 +2849,10 @@ async def create_work_order(company_id: str, wo_data: WorkOrderCreate, current_u
     )
     
     await db.work_orders.insert_one(work_order.model_dump())
+    invalidate_list_counts("work_orders", company_id)
+    await inc_company_stats(company_id, work_order_status_deltas(None, work_order.status))
+    await inc_daily_rollup(company_id, rollup_day(work_order.created_at), {"created": 1})
+    return work_order
 
 # =======================
 # File Upload
@@ -1081,13 +2895,38 @@ async def get_work_orders(
     client_id: Optional[str] = None,
     priority: Optional[str] = None,
     search: Optional[str] = None,
-    page: int = 1,
-    limit: int = 10,
-    current_user: dict = Depends(get_current_user)
+    page: int = Query(1, ge=1),
+    limit: int = Query(10, ge=1, le=100),
+    after: Optional[str] = None,
+    include_total: bool = True,
+    fields: Optional[str] = None,
+    request: Request = None,
+    response: Response = None,
+    current_user: dict = Depends(get_principal)
 ):
+    """List work orders newest first.
+    
+    Pages can be addressed by number (page) or by the opaque next_cursor of
+    the previous response (after). Cursor pages are served straight from the
+    (company_id, created_at, id) index no matter how deep they are; pass
+    include_total=false to skip counting the whole result set as well.
+    Totals come from list_counts; pagination.total_exact is false while a
+    cached or capped figure is served and the exact count is refreshed.
+    
+    search matches whole words in title, description and order number and
+    orders results by relevance, so those pages are addressed by number only.
+    
+    fields=a,b,c limits each work order to those fields (id and created_at
+    are always included for the cursor).
+    
+    Responses carry a weak ETag over the page's ids and updated_at (and the
+    total); with If-None-Match only those two fields of the page are read
+    before answering 304.
+    """
     if current_user['role'] != 'SUPERADMIN' and current_user['company_id'] != company_id:
         raise HTTPException(status_code=403, detail="Access denied")
     
+    projection = field_projection(fields, WorkOrder, required=('id', 'created_at'))
     query = {"company_id": company_id}
     
     if status:
@@ -1151,23 +2990,65 @@ async def get_work_orders(
                 # This shouldn't happen for CLIENT users, but just in case
                 query['requested_by_client_id'] = 'IMPOSSIBLE_VALUE_TO_RETURN_EMPTY_RESULTS'
     
-    # Text search in title or description
+    # Search: an exact order number goes straight to the (company_id, order_number) index,
+    # anything else uses the work_orders_search text index ranked by relevance. Both are
+    # added as separate top-level conditions so they AND with the role filter's $or.
+    sort = [("created_at", -1), ("id", -1)]
+    ranked = False
+    search = (search or '').strip()
     if search:
-        query['$or'] = [  # pyright: ignore[reportArgumentType]
-            {'title': {'$regex': search, '$options': 'i'}},
-            {'description': {'$regex': search, '$options': 'i'}},
-            {'order_number': {'$regex': search, '$options': 'i'}}
-        ]
-    
-    # Calculate skip value for pagination
-    skip = (page - 1) * limit
-    
-    # Get total count for pagination info - remove hint that might be causing issues
-    total_count = await db.work_orders.count_documents(query)
-    
-    # Get paginated work orders with sorting
-    work_orders_cursor = db.work_orders.find(query, {"_id": 0}).sort("created_at", -1).skip(skip).limit(limit)
-    work_orders = await work_orders_cursor.to_list(limit)
+        order_number = ORDER_NUMBER_PATTERN.fullmatch(search)
+        if order_number:
+            query['order_number'] = f"WO-{int(order_number.group(1)):06d}"
+        else:
+            query['$text'] = {'$search': search}
+            sort = [("score", {"$meta": "textScore"})] + sort
+            ranked = True
+    
+    if after and ranked:
+        raise HTTPException(status_code=400, detail="Search results are ranked by relevance; use page instead of after")
+    
+    # Get total count for pagination info before the cursor narrows the query
+    total_count, total_exact = None, None
+    if include_total:
+        total_count, total_exact = await list_counts.total("work_orders", company_id, query)
+    
+    # Keyset pagination: continue strictly after the (created_at, id) of the previous page's last item
+    etag_query = query
+    skip = 0
+    if after:
+        last_created_at, last_id = decode_page_cursor(after)
+        keyset = {'$or': [
+            {'created_at': {'$lt': last_created_at}},
+            {'created_at': last_created_at, 'id': {'$lt': last_id}}
+        ]}
+        query = {'$and': [query, keyset]}
+    else:
+        # Calculate skip value for pagination
+        skip = (page - 1) * limit
+    
+    # A revalidation reads only the ids and timestamps of the page to compare ETags
+    if request is not None and request.headers.get('if-none-match'):
+        stamps = await db.work_orders.find(query, LIST_STAMP_PROJECTION).sort(sort).skip(skip).limit(limit + 1).to_list(limit + 1)
+        etag = list_etag("work_orders", etag_query, request, stamps, total_count)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+    
+    # Fetch one extra document to know whether another page follows
+    if request is not None:
+        projection, strip_stamp = stamped_projection(projection)
+    work_orders_cursor = db.work_orders.find(query, projection).sort(sort).skip(skip).limit(limit + 1)
+    work_orders = await work_orders_cursor.to_list(limit + 1)
+    if request is not None:
+        response.headers['ETag'] = list_etag("work_orders", etag_query, request, work_orders, total_count)
+        if strip_stamp:
+            for work_order in work_orders:
+                work_order.pop('updated_at', None)
+    has_more = len(work_orders) > limit
+    work_orders = work_orders[:limit]
+    next_cursor = None
+    if has_more and not ranked:
+        next_cursor = encode_page_cursor(work_orders[-1]['created_at'], work_orders[-1]['id'])
     
     # Return work orders with pagination info
     return {
@@ -1176,16 +3057,38 @@ async def get_work_orders(
             "page": page,
             "limit": limit,
             "total": total_count,
-            "pages": (total_count + limit - 1) // limit  # Ceiling division
+            "pages": (total_count + limit - 1) // limit if total_count is not None else None,  # Ceiling division
+            "total_exact": total_exact,
+            "has_more": has_more,
+            "next_cursor": next_cursor
         }
     }
 
 
 @api_router.get("/companies/{company_id}/workorders/{work_order_id}")
-async def get_work_order(company_id: str, work_order_id: str, current_user: dict = Depends(get_current_user)):
+async def get_work_order(
+    company_id: str,
+    work_order_id: str,
+    request: Request = None,
+    response: Response = None,
+    current_user: dict = Depends(get_principal)
+):
     if current_user['role'] != 'SUPERADMIN' and current_user['company_id'] != company_id:
         raise HTTPException(status_code=403, detail="Access denied")
     
+    # Revalidation reads only updated_at (plus the fields visibility depends on for
+    # employees and clients); for admins the (id, company_id, updated_at) index covers it
+    if request is not None and request.headers.get('if-none-match'):
+        projection = {"_id": 0, "updated_at": 1}
+        if current_user['role'] in ('EMPLOYEE', 'CLIENT'):
+            projection.update({"assigned_technicians": 1, "status": 1, "requested_by_client_id": 1})
+        stamp = await db.work_orders.find_one({"id": work_order_id, "company_id": company_id}, projection)
+        if stamp:
+            check_work_order_visibility(stamp, current_user)
+            etag = make_etag(work_order_id, stamp.get('updated_at'))
+            if etag_matches(request, etag):
+                return not_modified(etag)
+    
     # Remove hint that might be causing issues
     work_order = await db.work_orders.find_one(
         {"id": work_order_id, "company_id": company_id}, 
@@ -1194,17 +3097,24 @@ async def get_work_order(company_id: str, work_order_id: str, current_user: dict
     if not work_order:
         raise HTTPException(status_code=404, detail="Work order not found")
     
-    # Check visibility
-    if current_user['role'] == 'EMPLOYEE':
-        if current_user['id'] not in work_order['assigned_technicians'] and work_order['status'] != 'APPROVED':
-            raise HTTPException(status_code=403, detail="Access denied")
-    elif current_user['role'] == 'CLIENT':
-        client_id = current_user.get('client_id')
-        if not client_id or work_order['requested_by_client_id'] != client_id:
-            raise HTTPException(status_code=403, detail="Access denied")
+    check_work_order_visibility(work_order, current_user)
     
+    if response is not None:
+        response.headers['ETag'] = make_etag(work_order_id, work_order.get('updated_at'))
     return work_order
 
+def work_order_visible(work_order: Dict[str, Any], current_user: dict) -> bool:
+    if current_user['role'] == 'EMPLOYEE':
+        return current_user['id'] in work_order.get('assigned_technicians', []) or work_order.get('status') == 'APPROVED'
+    if current_user['role'] == 'CLIENT':
+        client_id = current_user.get('client_id')
+        return bool(client_id) and work_order.get('requested_by_client_id') == client_id
+    return True
+
+def check_work_order_visibility(work_order: Dict[str, Any], current_user: dict):
+    if not work_order_visible(work_order, current_user):
+        raise HTTPException(status_code=403, detail="Access denied")
+
 @api_router.put("/companies/{company_id}/workorders/{work_order_id}")
 async def update_work_order(
     company_id: str,
@@ -1215,10 +3125,6 @@ async def update_work_order(
     if current_user['role'] != 'SUPERADMIN' and current_user['company_id'] != company_id:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    work_order = await db.work_orders.find_one({"id": work_order_id, "company_id": company_id})
-    if not work_order:
-        raise HTTPException(status_code=404, detail="Work order not found")
-    
     # Check company for MSAM Technical Solutions asset code requirement
     update_dict = update_data.model_dump(exclude_unset=True)
     if update_dict:
@@ -1229,25 +3135,35 @@ async def update_work_order(
                 raise HTTPException(status_code=400, detail="Asset code is required for MSAM Technical Solutions work orders")
     
     # Prepare update
-    update_dict = {k: v for k, v in update_data.model_dump().items() if v is not None}
-    update_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
-    
-    if update_dict:
-        await db.work_orders.update_one(
-            {"id": work_order_id},
-            {"$set": update_dict}
+    update_dict = {k: v for k, v in update_data.model_dump(exclude={'version'}).items() if v is not None}
+    update_dict['updated_at'] = utc_now()
+    if update_dict.get('status') == 'COMPLETED':
+        update_dict['completed_at'] = update_dict['updated_at']
+    
+    # Update in one round trip; the old status is needed for company_stats, and
+    # a plain $set lets the new document be derived from the old one
+    query = {"id": work_order_id, "company_id": company_id}
+    previous_wo = await db.work_orders.find_one_and_update(
+        {**query, **version_filter(update_data.version)},
+        {"$set": update_dict, "$inc": {"version": 1}},
+        projection={"_id": 0}
+    )
+    if not previous_wo:
+        await raise_update_miss("work_orders", query, "Work order not found")
+    updated_wo = {**previous_wo, **update_dict, "version": (previous_wo.get('version') or 0) + 1}
+    invalidate_list_counts("work_orders", company_id)
+    await inc_company_stats(company_id, work_order_status_deltas(previous_wo.get('status'), updated_wo.get('status')))
+    await inc_completed_rollups(company_id, completed_rollup_deltas(previous_wo, updated_wo))
+    
+    # Send notification on status change
+    if 'status' in update_dict:
+        await send_notification(
+            updated_wo['created_by'],
+            company_id,
+            "work_order_status_changed",
+            {"work_order_id": work_order_id, "new_status": update_dict['status']}
         )
-        
-        # Send notification on status change
-        if 'status' in update_dict:
-            await send_notification(
-                work_order['created_by'],
-                company_id,
-                "work_order_status_changed",
-                {"work_order_id": work_order_id, "new_status": update_dict['status']}
-            )
     
-    updated_wo = await db.work_orders.find_one({"id": work_order_id}, {"_id": 0})
     return updated_wo
 
 @api_router.post("/companies/{company_id}/workorders/{work_order_id}/approve")
@@ -1258,26 +3174,133 @@ async def approve_work_order(company_id: str, work_order_id: str, current_user:
     if current_user['role'] == 'ADMIN' and current_user['company_id'] != company_id:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    work_order = await db.work_orders.find_one({"id": work_order_id, "company_id": company_id})
+    work_order = await db.work_orders.find_one_and_update(
+        {"id": work_order_id, "company_id": company_id},
+        {"$set": {"status": "APPROVED", "updated_at": utc_now()}, "$inc": {"version": 1}},
+        projection={"_id": 0, "assigned_technicians": 1, "title": 1, "status": 1, "completed_at": 1, "updated_at": 1}
+    )
     if not work_order:
         raise HTTPException(status_code=404, detail="Work order not found")
-    
-    await db.work_orders.update_one(
-        {"id": work_order_id},
-        {"$set": {"status": "APPROVED", "updated_at": datetime.now(timezone.utc).isoformat()}}
-    )
+    invalidate_list_counts("work_orders", company_id)
+    await inc_company_stats(company_id, work_order_status_deltas(work_order.get('status'), "APPROVED"))
+    await inc_completed_rollups(company_id, completed_rollup_deltas(work_order, {"status": "APPROVED"}))
     
     # Notify assigned technicians
-    for tech_id in work_order['assigned_technicians']:  # pyright: ignore[reportGeneralTypeIssues]
-        await send_notification(
-            tech_id,
-            company_id,
-            "work_order_approved",
-            {"work_order_id": work_order_id, "title": work_order['title']}
-        )
+    await send_notifications([
+        Notification(user_id=tech_id, company_id=company_id, type="work_order_approved",
+                     payload={"work_order_id": work_order_id, "title": work_order['title']})
+        for tech_id in work_order['assigned_technicians']  # pyright: ignore[reportGeneralTypeIssues]
+    ])
     
     return {"message": "Work order approved"}
 
+@api_router.post("/companies/{company_id}/workorders/bulk")
+async def bulk_update_work_orders(company_id: str, bulk: WorkOrderBulkUpdate, current_user: dict = Depends(get_current_user)):
+    """Apply one operation to many work orders.
+    
+    One read resolves the ids (and notification recipients), one unordered
+    bulk_write applies the updates and one insert_many sends the
+    notifications. Each id gets its own result: updated, not_found or error.
+    """
+    if current_user['role'] not in ['SUPERADMIN', 'ADMIN']:
+        raise HTTPException(status_code=403, detail="Only Admins can bulk update work orders")
+    
+    if current_user['role'] == 'ADMIN' and current_user['company_id'] != company_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    now = utc_now()
+    if bulk.operation == 'status':
+        if bulk.status not in WORK_ORDER_STATUSES:
+            raise HTTPException(status_code=400, detail=f"status must be one of {', '.join(WORK_ORDER_STATUSES)}")
+        changes = {"status": bulk.status}
+        if bulk.status == 'COMPLETED':
+            changes['completed_at'] = now
+    elif bulk.operation == 'approve':
+        changes = {"status": "APPROVED"}
+    elif bulk.operation == 'priority':
+        if bulk.priority not in WORK_ORDER_PRIORITIES:
+            raise HTTPException(status_code=400, detail=f"priority must be one of {', '.join(WORK_ORDER_PRIORITIES)}")
+        changes = {"priority": bulk.priority}
+    elif bulk.operation == 'assign':
+        if bulk.assigned_technicians is None:
+            raise HTTPException(status_code=400, detail="assigned_technicians is required")
+        changes = {"assigned_technicians": bulk.assigned_technicians}
+    else:
+        raise HTTPException(status_code=400, detail="operation must be one of status, assign, priority, approve")
+    
+    ids = list(dict.fromkeys(bulk.ids))
+    found = {
+        work_order['id']: work_order
+        async for work_order in db.work_orders.find(
+            {"company_id": company_id, "id": {"$in": ids}},
+            {"_id": 0, "id": 1, "created_by": 1, "assigned_technicians": 1, "title": 1, "status": 1,
+             "completed_at": 1, "updated_at": 1}
+        )
+    }
+    targets = [work_order_id for work_order_id in ids if work_order_id in found]
+    
+    failed: Dict[str, str] = {}
+    if targets:
+        requests = [
+            UpdateOne(
+                {"id": work_order_id, "company_id": company_id},
+                {"$set": {**changes, "updated_at": now}, "$inc": {"version": 1}}
+            )
+            for work_order_id in targets
+        ]
+        try:
+            await db.work_orders.bulk_write(requests, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get('writeErrors', []):
+                failed[targets[error['index']]] = error.get('errmsg', 'write failed')
+        invalidate_list_counts("work_orders", company_id)
+        if 'status' in changes:
+            updated = [found[work_order_id] for work_order_id in targets if work_order_id not in failed]
+            await inc_company_stats(company_id, merge_deltas(*(
+                work_order_status_deltas(work_order.get('status'), changes['status']) for work_order in updated
+            )))
+            await inc_completed_rollups(company_id, merge_deltas(*(
+                completed_rollup_deltas(work_order, {**work_order, **changes, "updated_at": now}) for work_order in updated
+            )))
+    
+    # Same notifications as update_work_order / approve_work_order, sent as one batch
+    notifications = []
+    for work_order_id in targets:
+        if work_order_id in failed:
+            continue
+        work_order = found[work_order_id]
+        if bulk.operation == 'approve':
+            notifications.extend(
+                Notification(user_id=tech_id, company_id=company_id, type="work_order_approved",
+                             payload={"work_order_id": work_order_id, "title": work_order.get('title')})
+                for tech_id in work_order.get('assigned_technicians', [])
+            )
+        elif bulk.operation == 'status':
+            notifications.append(
+                Notification(user_id=work_order['created_by'], company_id=company_id, type="work_order_status_changed",
+                             payload={"work_order_id": work_order_id, "new_status": bulk.status})
+            )
+    await send_notifications(notifications)
+    
+    results = []
+    for work_order_id in ids:
+        if work_order_id not in found:
+            results.append({"id": work_order_id, "result": "not_found"})
+        elif work_order_id in failed:
+            results.append({"id": work_order_id, "result": "error", "error": failed[work_order_id]})
+        else:
+            results.append({"id": work_order_id, "result": "updated"})
+    
+    return {
+        "operation": bulk.operation,
+        "requested": len(ids),
+        "updated": len(targets) - len(failed),
+        "not_found": len(ids) - len(targets),
+        "failed": len(failed),
+        "notifications": len(notifications),
+        "results": results
+    }
+
 # =======================
 # Expense Management
 # =======================
@@ -1300,15 +3323,17 @@ async def add_expense(
         work_order_id=work_order_id,
         company_id=company_id,
         uploaded_by=current_user['id'],
-        date=expense_data.date or datetime.now(timezone.utc).isoformat(),
+        date=expense_data.date or utc_now(),
         **expense_data.model_dump(exclude={'date'})
     )
     
     await db.expenses.insert_one(expense.model_dump())
+    await inc_company_stats(company_id, {"expenses": expense.amount})
+    await inc_daily_rollup(company_id, rollup_day(expense.date), {"expenses": expense.amount})
     return expense
 
 @api_router.get("/companies/{company_id}/workorders/{work_order_id}/expenses")
-async def get_expenses(company_id: str, work_order_id: str, current_user: dict = Depends(get_current_user)):
+async def get_expenses(company_id: str, work_order_id: str, current_user: dict = Depends(get_principal)):
     if current_user['role'] != 'SUPERADMIN' and current_user['company_id'] != company_id:
         raise HTTPException(status_code=403, detail="Access denied")
     
@@ -1356,11 +3381,13 @@ async def create_invoice(company_id: str, invoice_data: InvoiceCreate, current_u
         total_amount=total_with_tax,
         tax_amount=invoice_data.tax_amount,
         status="ISSUED",
-        issued_date=datetime.now(timezone.utc).isoformat(),
-        due_date=(datetime.now(timezone.utc) + timedelta(days=invoice_data.due_days)).isoformat()
+        issued_date=utc_now(),
+        due_date=utc_now() + timedelta(days=invoice_data.due_days)
     )
     
     await db.invoices.insert_one(invoice.model_dump())
+    await inc_company_stats(company_id, invoice_deltas(invoice.model_dump()))
+    await inc_daily_rollup(company_id, rollup_day(invoice.issued_date), {"revenue": invoice_revenue(invoice.model_dump())})
     
     # Notify client
     if work_order.get('requested_by_client_id'):
@@ -1374,10 +3401,17 @@ async def create_invoice(company_id: str, invoice_data: InvoiceCreate, current_u
     return invoice
 
 @api_router.get("/companies/{company_id}/invoices")
-async def get_invoices(company_id: str, current_user: dict = Depends(get_current_user)):
+async def get_invoices(
+    company_id: str,
+    fields: Optional[str] = None,
+    request: Request = None,
+    response: Response = None,
+    current_user: dict = Depends(get_principal)
+):
     if current_user['role'] != 'SUPERADMIN' and current_user['company_id'] != company_id:
         raise HTTPException(status_code=403, detail="Access denied")
     
+    projection = field_projection(fields, Invoice)
     query = {"company_id": company_id}
     
     if current_user['role'] == 'CLIENT':
@@ -1387,22 +3421,56 @@ async def get_invoices(company_id: str, current_user: dict = Depends(get_current
             # This shouldn't happen for CLIENT users, return empty list
             client_wos = []
         else:
-            client_wos = await db.work_orders.find({"requested_by_client_id": client_id}, {"_id": 0}).to_list(1000)
+            client_wos = await db.work_orders.find(
+                {"company_id": company_id, "requested_by_client_id": client_id}, {"_id": 0, "id": 1}
+            ).to_list(1000)
         wo_ids = [wo['id'] for wo in client_wos]
         query['work_order_id'] = {"$in": wo_ids}  # pyright: ignore[reportArgumentType]
     
-    invoices = await db.invoices.find(query, {"_id": 0}).to_list(1000)
+    # Unsorted, so the ETag is taken over the invoices in id order
+    by_id = lambda invoice: invoice['id']
+    if request is not None and request.headers.get('if-none-match'):
+        stamps = await db.invoices.find(query, LIST_STAMP_PROJECTION).to_list(1000)
+        etag = list_etag("invoices", query, request, sorted(stamps, key=by_id))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+    
+    if request is not None:
+        projection, strip_stamp = stamped_projection(projection)
+    invoices = await db.invoices.find(query, projection).to_list(1000)
+    if request is not None:
+        response.headers['ETag'] = list_etag("invoices", query, request, sorted(invoices, key=by_id))
+        if strip_stamp:
+            for invoice in invoices:
+                invoice.pop('updated_at', None)
     return invoices
 
 @api_router.get("/companies/{company_id}/invoices/{invoice_id}")
-async def get_invoice(company_id: str, invoice_id: str, current_user: dict = Depends(get_current_user)):
+async def get_invoice(
+    company_id: str,
+    invoice_id: str,
+    request: Request = None,
+    response: Response = None,
+    current_user: dict = Depends(get_principal)
+):
     if current_user['role'] != 'SUPERADMIN' and current_user['company_id'] != company_id:
         raise HTTPException(status_code=403, detail="Access denied")
     
+    # Covered by the (id, company_id, updated_at) index; invoices created before updated_at
+    # existed have never been modified, so a missing timestamp is still a stable validator
+    if request is not None and request.headers.get('if-none-match'):
+        stamp = await db.invoices.find_one({"id": invoice_id, "company_id": company_id}, {"_id": 0, "updated_at": 1})
+        if stamp is not None:
+            etag = make_etag(invoice_id, stamp.get('updated_at'))
+            if etag_matches(request, etag):
+                return not_modified(etag)
+    
     invoice = await db.invoices.find_one({"id": invoice_id, "company_id": company_id}, {"_id": 0})
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
     
+    if response is not None:
+        response.headers['ETag'] = make_etag(invoice_id, invoice.get('updated_at'))
     return invoice
 
 @api_router.put("/companies/{company_id}/invoices/{invoice_id}")
@@ -1418,24 +3486,33 @@ async def update_invoice(
     if current_user['role'] == 'ADMIN' and current_user['company_id'] != company_id:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    invoice = await db.invoices.find_one({"id": invoice_id, "company_id": company_id})
-    if not invoice:
-        raise HTTPException(status_code=404, detail="Invoice not found")
-    
     # Prepare update
-    update_dict = {k: v for k, v in update_data.model_dump().items() if v is not None}
-    
-    if update_dict:
-        await db.invoices.update_one(
-            {"id": invoice_id},
-            {"$set": update_dict}
-        )
-    
-    updated_invoice = await db.invoices.find_one({"id": invoice_id}, {"_id": 0})
+    update_dict = {k: v for k, v in update_data.model_dump(exclude={'version'}).items() if v is not None}
+    query = {"id": invoice_id, "company_id": company_id}
+    
+    if not update_dict:
+        updated_invoice = await db.invoices.find_one(query, {"_id": 0})
+        if not updated_invoice:
+            raise HTTPException(status_code=404, detail="Invoice not found")
+        return updated_invoice
+    
+    # Update in one round trip, keeping the old status and amount for company_stats
+    update_dict['updated_at'] = utc_now()
+    previous_invoice = await db.invoices.find_one_and_update(
+        {**query, **version_filter(update_data.version)},
+        {"$set": update_dict, "$inc": {"version": 1}},
+        projection={"_id": 0}
+    )
+    if not previous_invoice:
+        await raise_update_miss("invoices", query, "Invoice not found")
+    updated_invoice = {**previous_invoice, **update_dict, "version": (previous_invoice.get('version') or 0) + 1}
+    await inc_company_stats(company_id, merge_deltas(invoice_deltas(previous_invoice, -1), invoice_deltas(updated_invoice)))
+    await inc_daily_rollup(company_id, rollup_day(previous_invoice.get('issued_date') or previous_invoice.get('created_at')),
+                           {"revenue": invoice_revenue(updated_invoice) - invoice_revenue(previous_invoice)})
     return updated_invoice
 
 @api_router.get("/companies/{company_id}/invoices/{invoice_id}/pdf")
-async def generate_invoice_pdf(company_id: str, invoice_id: str, current_user: dict = Depends(get_current_user)):
+async def generate_invoice_pdf(company_id: str, invoice_id: str, current_user: dict = Depends(get_principal)):
     from fastapi.responses import StreamingResponse
     
     if current_user['role'] != 'SUPERADMIN' and current_user['company_id'] != company_id:
@@ -1462,8 +3539,8 @@ async def generate_invoice_pdf(company_id: str, invoice_id: str, current_user: d
     c.setFont("Helvetica-Bold", 16)
     c.drawString(1*inch, height - 2*inch, f"Invoice #{invoice['invoice_number']}")
     c.setFont("Helvetica", 10)
-    c.drawString(1*inch, height - 2.3*inch, f"Issued: {invoice['issued_date'][:10]}")
-    c.drawString(1*inch, height - 2.5*inch, f"Due: {invoice['due_date'][:10]}")
+    c.drawString(1*inch, height - 2.3*inch, f"Issued: {to_timestamp(invoice['issued_date']):%Y-%m-%d}")
+    c.drawString(1*inch, height - 2.5*inch, f"Due: {to_timestamp(invoice['due_date']):%Y-%m-%d}")
     
     # Items
     y = height - 3*inch
@@ -1540,12 +3617,14 @@ async def process_payment(company_id: str, payment_data: PaymentCreate, current_
     
     # Insert payment record
     await db.payments.insert_one(payment.model_dump())
+    await inc_company_stats(company_id, {"payments": payment.amount})
+    await inc_daily_rollup(company_id, rollup_day(payment.created_at), {"payments": payment.amount})
     
     # Update work order paid amount
     new_paid_amount = paid_amount + payment_data.amount
     await db.work_orders.update_one(
         {"id": payment_data.work_order_id},
-        {"$set": {"paid_amount": new_paid_amount, "updated_at": datetime.now(timezone.utc).isoformat()}}
+        {"$set": {"paid_amount": new_paid_amount, "updated_at": utc_now()}}
     )
     
     return {"message": "Payment processed successfully", "payment": payment}
@@ -1562,8 +3641,7 @@ async def create_preventive_task(company_id: str, task_data: PreventiveTaskCreat
     if current_user['role'] == 'ADMIN' and current_user['company_id'] != company_id:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    start_date = task_data.start_date or datetime.now(timezone.utc).isoformat()
-    next_due = calculate_next_due_date(start_date, task_data.frequency)
+    next_due = calculate_next_due_date(task_data.start_date, task_data.frequency)
     
     task = PreventiveTask(
         company_id=company_id,
@@ -1572,10 +3650,12 @@ async def create_preventive_task(company_id: str, task_data: PreventiveTaskCreat
     )
     
     await db.preventive_tasks.insert_one(task.model_dump())
+    await inc_company_stats(company_id, {"preventive_tasks.total": 1,
+                                         "preventive_tasks.active": 1 if task.status == 'ACTIVE' else 0})
     return task
 
 @api_router.get("/companies/{company_id}/preventive_tasks")
-async def get_preventive_tasks(company_id: str, current_user: dict = Depends(get_current_user)):
+async def get_preventive_tasks(company_id: str, current_user: dict = Depends(get_principal)):
     if current_user['role'] != 'SUPERADMIN' and current_user['company_id'] != company_id:
         raise HTTPException(status_code=403, detail="Access denied")
     
@@ -1594,7 +3674,7 @@ async def complete_preventive_task(company_id: str, task_id: str, current_user:
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    now = datetime.now(timezone.utc).isoformat()
+    now = utc_now()
     next_due = calculate_next_due_date(now, task['frequency'])
     
     await db.preventive_tasks.update_one(
@@ -1609,7 +3689,7 @@ async def complete_preventive_task(company_id: str, task_id: str, current_user:
 # =======================
 
 @api_router.get("/users/{user_id}/notifications")
-async def get_notifications(user_id: str, current_user: dict = Depends(get_current_user)):
+async def get_notifications(user_id: str, current_user: dict = Depends(get_principal)):
     if current_user['id'] != user_id and current_user['role'] != 'SUPERADMIN':
         raise HTTPException(status_code=403, detail="Access denied")
     
@@ -1627,7 +3707,7 @@ async def mark_notification_read(notification_id: str, current_user: dict = Depe
     
     await db.notifications.update_one(
         {"id": notification_id},
-        {"$set": {"read_at": datetime.now(timezone.utc).isoformat()}}
+        {"$set": {"read_at": utc_now()}}
     )
     
     return {"message": "Notification marked as read"}
@@ -1671,7 +3751,7 @@ async def create_comment(
 async def get_comments(
     company_id: str,
     work_order_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_principal)
 ):
     if current_user['role'] != 'SUPERADMIN' and current_user['company_id'] != company_id:
         raise HTTPException(status_code=403, detail="Access denied")
@@ -1706,26 +3786,24 @@ async def update_comment(
     if current_user['role'] != 'SUPERADMIN' and current_user['company_id'] != company_id:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    comment = await db.comments.find_one({"id": comment_id, "company_id": company_id})
-    if not comment:
-        raise HTTPException(status_code=404, detail="Comment not found")
-    
-    # Only the comment author or admins can edit
-    if current_user['role'] not in ['SUPERADMIN', 'ADMIN'] and comment['user_id'] != current_user['id']:
-        raise HTTPException(status_code=403, detail="Access denied")
-    
-    await db.comments.update_one(
-        {"id": comment_id},
-        {"$set": {"content": comment_data.content, "updated_at": datetime.now(timezone.utc).isoformat()}}
+    # Only the comment author or admins can edit - folded into the update filter so the
+    # edit is a single round trip; the failure path reads the comment to pick the error
+    query = {"id": comment_id, "company_id": company_id}
+    author_filter = {} if current_user['role'] in ['SUPERADMIN', 'ADMIN'] else {"user_id": current_user['id']}
+    updated_comment = await db.comments.find_one_and_update(
+        {**query, **author_filter, **version_filter(comment_data.version)},
+        {"$set": {"content": comment_data.content, "updated_at": utc_now()}, "$inc": {"version": 1}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
     )
+    if not updated_comment:
+        comment = await db.comments.find_one(query, {"_id": 0, "user_id": 1})
+        if comment and author_filter and comment['user_id'] != current_user['id']:
+            raise HTTPException(status_code=403, detail="Access denied")
+        await raise_update_miss("comments", query, "Comment not found")
     
-    updated_comment = await db.comments.find_one({"id": comment_id}, {"_id": 0})
-    
-    # Enrich comment with user details
-    if updated_comment:
-        user = await db.users.find_one({"id": current_user['id']}, {"_id": 0, "password_hash": 0})
-        if user:
-            updated_comment['user'] = user
+    # Enrich comment with user details - the editor is the authenticated user already in hand
+    updated_comment['user'] = {k: v for k, v in current_user.items() if k != 'token_payload'}
     
     return updated_comment
 
@@ -1755,85 +3833,95 @@ async def delete_comment(
 # =======================
 
 @api_router.get("/companies/{company_id}/reports/overview")
-async def get_overview_report(company_id: str, current_user: dict = Depends(get_current_user)):
+async def get_overview_report(company_id: str, current_user: dict = Depends(get_principal)):
     if current_user['role'] != 'SUPERADMIN' and current_user['company_id'] != company_id:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    # Count work orders by status
-    work_orders = await db.work_orders.find({"company_id": company_id}, {"_id": 0}).to_list(10000)
-    status_counts = {}
-    for wo in work_orders:
-        status = wo['status']
-        status_counts[status] = status_counts.get(status, 0) + 1
+    # company_stats is kept current by the write handlers; a tenant without one
+    # gets it built from its collections on first read
+    stats = await db.company_stats.find_one({"_id": company_id})
+    if stats is None:
+        stats = await rebuild_company_stats(company_id)
     
-    # Count invoices
-    invoices = await db.invoices.find({"company_id": company_id}, {"_id": 0}).to_list(10000)
+    invoices = stats.get('invoices', {})
     # Include both issued and paid invoices in revenue calculation
-    total_revenue = sum(inv['total_amount'] for inv in invoices if inv['status'] in ['ISSUED', 'PAID'])
-    pending_invoices = sum(1 for inv in invoices if inv['status'] == 'ISSUED')
-    
-    # Count expenses
-    expenses = await db.expenses.find({"company_id": company_id}, {"_id": 0}).to_list(10000)
-    total_expenses = sum(exp['amount'] for exp in expenses)
-    
-    # Count vehicles for automotive companies
-    vehicle_count = await db.vehicles.count_documents({"company_id": company_id})
-    
-    # Count preventive tasks for technical solutions companies
-    preventive_task_count = await db.preventive_tasks.count_documents({"company_id": company_id})
+    total_revenue = sum(invoices.get(status, {}).get('amount', 0) for status in ('ISSUED', 'PAID'))
+    status_counts = {status: count for status, count in stats.get('work_orders', {}).items() if count}
     
     return {
-        "total_work_orders": len(work_orders),
+        "total_work_orders": sum(status_counts.values()),
         "status_breakdown": status_counts,
         "total_revenue": total_revenue,
-        "total_expenses": total_expenses,
-        "profit_margin": total_revenue - total_expenses,
-        "pending_invoices": pending_invoices,
-        "active_clients": len(await db.clients.find({"company_id": company_id}, {"_id": 0}).to_list(10000)),
-        "active_employees": len(await db.employees.find({"company_id": company_id}, {"_id": 0}).to_list(10000)),
-        "total_vehicles": vehicle_count,
+        "total_expenses": stats.get('expenses', 0),
+        "profit_margin": total_revenue - stats.get('expenses', 0),
+        "pending_invoices": invoices.get('ISSUED', {}).get('count', 0),
+        "total_payments": stats.get('payments', 0),
+        "active_clients": stats.get('clients', 0),
+        "active_employees": stats.get('employees', 0),
+        "total_vehicles": stats.get('vehicles', 0),
         "preventive_tasks": {
-            "total": preventive_task_count,
-            "active": len([t for t in await db.preventive_tasks.find({"company_id": company_id}, {"_id": 0}).to_list(10000) if t.get('status') == 'ACTIVE'])
+            "total": stats.get('preventive_tasks', {}).get('total', 0),
+            "active": stats.get('preventive_tasks', {}).get('active', 0)
         }
     }
 
+@api_router.post("/companies/{company_id}/reports/stats/reconcile")
+async def reconcile_company_stats(company_id: str, current_user: dict = Depends(get_current_user)):
+    """Rebuild company_stats from the collections and report which counters had drifted"""
+    if current_user['role'] not in ['SUPERADMIN', 'ADMIN']:
+        raise HTTPException(status_code=403, detail="Only Admins can reconcile statistics")
+    
+    if current_user['role'] == 'ADMIN' and current_user['company_id'] != company_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    stored = await db.company_stats.find_one({"_id": company_id})
+    rebuilt = await rebuild_company_stats(company_id)
+    return {"drift": company_stats_drift(stored, rebuilt), "reconciled_at": rebuilt['reconciled_at']}
+
 @api_router.get("/companies/{company_id}/reports/workorder-trends")
 async def get_workorder_trends(
     company_id: str,
     from_date: Optional[str] = None,
     to_date: Optional[str] = None,
     group_by: str = "month",
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_principal)
 ):
     if current_user['role'] != 'SUPERADMIN' and current_user['company_id'] != company_id:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    query = {"company_id": company_id}
-    if from_date:
-        query['created_at'] = {"$gte": from_date}  # pyright: ignore[reportArgumentType]
-    if to_date:
-        query.setdefault('created_at', {})['$lte'] = to_date  # pyright: ignore[reportArgumentType, reportIndexIssue]
-    
-    work_orders = await db.work_orders.find(query, {"_id": 0}).to_list(10000)
+    if group_by not in TREND_GROUPS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {', '.join(TREND_GROUPS)}")
     
-    # Group by date
-    trends = {}
-    for wo in work_orders:
-        date_str = wo['created_at'][:10]  # YYYY-MM-DD
-        if group_by == "month":
-            key = date_str[:7]  # YYYY-MM
-        elif group_by == "week":
-            key = date_str[:7]  # Simplified to month
-        else:
-            key = date_str
-        
-        trends[key] = trends.get(key, 0) + 1
+    # Served from daily_rollups: one small document per day with activity,
+    # regrouped here into ISO weeks, months or quarters
+    await ensure_daily_rollups(company_id)
+    query = {"company_id": company_id}
+    try:
+        # Rollup days are UTC, so a bound with an offset lands on its UTC day
+        if from_date:
+            query['day'] = {"$gte": rollup_day(from_date)}  # pyright: ignore[reportArgumentType]
+        if to_date:
+            query.setdefault('day', {})['$lte'] = rollup_day(to_date)  # pyright: ignore[reportArgumentType, reportIndexIssue]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="from_date and to_date must be ISO 8601 dates")
+    
+    rollups = await db.daily_rollups.find(query, {"_id": 0, "company_id": 0}).sort("day", 1).to_list(None)
+    
+    periods: Dict[str, Dict[str, Any]] = {}
+    for rollup in rollups:
+        period = trend_period(rollup['day'], group_by)
+        totals = periods.setdefault(period, {"period": period, **{field: 0 for field in ROLLUP_FIELDS}})
+        for field in ROLLUP_FIELDS:
+            totals[field] += rollup.get(field, 0)
     
-    return {"trends": trends, "group_by": group_by}
+    return {
+        "trends": {period: totals['created'] for period, totals in periods.items() if totals['created']},
+        "series": list(periods.values()),
+        "group_by": group_by
+    }
 
 @api_router.get("/companies/{company_id}/reports/profit-loss-details")
-async def get_profit_loss_details(company_id: str, current_user: dict = Depends(get_current_user)):
+async def get_profit_loss_details(company_id: str, current_user: dict = Depends(get_principal)):
     if current_user['role'] != 'SUPERADMIN' and current_user['company_id'] != company_id:
         raise HTTPException(status_code=403, detail="Access denied")
     
@@ -1900,7 +3988,7 @@ async def get_profit_loss_details(company_id: str, current_user: dict = Depends(
     return {"details": details}
 
 @api_router.get("/superadmin/reports/companies-summary")
-async def get_companies_summary(current_user: dict = Depends(get_current_user)):
+async def get_companies_summary(current_user: dict = Depends(get_principal)):
     if current_user['role'] != 'SUPERADMIN':
         raise HTTPException(status_code=403, detail="Only SuperAdmin can access this report")
     
@@ -1926,7 +4014,7 @@ async def get_companies_summary(current_user: dict = Depends(get_current_user)):
 
 
 @api_router.get("/superadmin/reports/all-workorders-profit")
-async def get_all_workorders_profit(current_user: dict = Depends(get_current_user)):
+async def get_all_workorders_profit(current_user: dict = Depends(get_principal)):
     if current_user['role'] != 'SUPERADMIN':
         raise HTTPException(status_code=403, detail="Only SuperAdmin can access this report")
     
@@ -2014,13 +4102,150 @@ async def get_all_workorders_profit(current_user: dict = Depends(get_current_use
     
     return {"details": details}
 
+# =======================
+# Dashboard
+# =======================
+
+# Sections each role's dashboard renders, in the order the frontend used to request them
+DASHBOARD_SECTIONS = {
+    'SUPERADMIN': ('company', 'work_orders', 'clients', 'employees', 'overview'),
+    'ADMIN': ('company', 'work_orders', 'clients', 'employees', 'overview'),
+    'EMPLOYEE': ('work_orders', 'clients', 'employees'),
+    'CLIENT': ('work_orders', 'invoices', 'clients', 'employees'),
+}
+
+@api_router.get("/companies/{company_id}/dashboard")
+async def get_dashboard(
+    company_id: str,
+    sections: Optional[str] = None,
+    status: Optional[str] = None,
+    assigned_to: Optional[str] = None,
+    client_id: Optional[str] = None,
+    priority: Optional[str] = None,
+    search: Optional[str] = None,
+    page: int = Query(1, ge=1),
+    limit: int = Query(10, ge=1, le=100),
+    current_user: dict = Depends(get_principal)
+):
+    """Everything a dashboard renders on first load, in one response.
+    
+    Runs the company, work order, client, employee, invoice and overview
+    lookups concurrently for the caller's role, reusing the list endpoints so
+    the payload matches what separate calls would return. sections=a,b limits
+    the response to some of the role's sections; work order filters and
+    paging apply to the work_orders section, which is assigned_to the caller
+    for employees.
+    """
+    if current_user['role'] != 'SUPERADMIN' and current_user['company_id'] != company_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    allowed = DASHBOARD_SECTIONS.get(current_user['role'], ())
+    requested = allowed if not sections else tuple(section.strip() for section in sections.split(',') if section.strip())
+    unknown = [section for section in requested if section not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown sections: {', '.join(unknown)}")
+    
+    lookups = {
+        'company': lambda: get_company(company_id, current_user=current_user),
+        'work_orders': lambda: get_work_orders(
+            company_id, status=status, client_id=client_id, priority=priority, search=search, page=page, limit=limit,
+            assigned_to=current_user['id'] if current_user['role'] == 'EMPLOYEE' else assigned_to,
+            current_user=current_user
+        ),
+        'clients': lambda: get_clients(company_id, current_user=current_user),
+        'employees': lambda: get_employees(company_id, current_user=current_user),
+        'invoices': lambda: get_invoices(company_id, current_user=current_user),
+        'overview': lambda: get_overview_report(company_id, current_user=current_user),
+    }
+    results = await asyncio.gather(*(lookups[section]() for section in requested))
+    return dict(zip(requested, results))
+
+# =======================
+# Change Events
+# =======================
+
+@api_router.get("/companies/{company_id}/events")
+async def stream_company_events(company_id: str, current_user: dict = Depends(get_principal)):
+    """Server-Sent Events feed of work order, comment, invoice and notification changes.
+    
+    Events are named <kind>.<created|updated|deleted> and carry the document as
+    JSON. A resync event means changes may have been missed: re-fetch and reconnect.
+    The token is re-checked every heartbeat; once it expires or is revoked the
+    stream ends with an auth event, and the client must log in again.
+    """
+    if current_user['role'] != 'SUPERADMIN' and current_user['company_id'] != company_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    if not tenant_events.available:
+        raise HTTPException(status_code=503, detail="Change events need MongoDB running as a replica set")
+    
+    payload = current_user['token_payload']
+    
+    async def auth_failure() -> Optional[str]:
+        if payload.get('exp') is not None and payload['exp'] <= time.time():
+            return "token_expired"
+        if await revocation_list.is_revoked(payload):
+            return "token_revoked"
+        return None
+    
+    async def stream():
+        queue = tenant_events.subscribe(company_id, current_user)
+        try:
+            yield "retry: 5000\nevent: ready\ndata: {}\n\n"
+            next_check = time.monotonic() + tenant_events.heartbeat
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=tenant_events.heartbeat)
+                except asyncio.TimeoutError:
+                    message = ": keep-alive\n\n"
+                # Re-checked on a schedule, not just when idle, so a busy tenant cannot keep a dead token streaming
+                if time.monotonic() >= next_check:
+                    next_check = time.monotonic() + tenant_events.heartbeat
+                    reason = await auth_failure()
+                    if reason:
+                        yield f"event: auth\ndata: {json.dumps({'reason': reason})}\n\n"
+                        return
+                if message is None:
+                    yield "event: resync\ndata: {}\n\n"
+                    return
+                yield message
+        finally:
+            tenant_events.unsubscribe(company_id, queue)
+    
+    # identity encoding keeps GZipMiddleware from buffering the stream
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache", "Content-Encoding": "identity", "X-Accel-Buffering": "no"
+    })
+
+# =======================
+# Runtime Metrics
+# =======================
+
+@api_router.get("/superadmin/metrics")
+async def get_runtime_metrics(current_user: dict = Depends(get_principal)):
+    """Per-worker metrics for the auth and password hashing hot paths"""
+    if current_user['role'] != 'SUPERADMIN':
+        raise HTTPException(status_code=403, detail="Only SuperAdmin can access metrics")
+    
+    return {
+        "pid": os.getpid(),
+        "password_pool": password_pool.stats(),
+        "user_cache": user_cache.stats(),
+        "cache_invalidation": invalidation_bus.stats(),
+        "token_cache": verified_token_cache.stats(),
+        "user_lookups": user_lookups.stats(),
+        "token_revocations": revocation_list.stats(),
+        "list_counts": list_counts.stats(),
+        "notifications": notification_outbox.stats(),
+        "events": tenant_events.stats()
+    }
+
 # =======================
 # Activity Logs Endpoint
 # =======================
 
 @api_router.get("/superadmin/logs")
 async def get_activity_logs(
-    current_user: dict = Depends(get_current_user),
+    current_user: dict = Depends(get_principal),
     skip: int = 0,
     limit: int = 100,
     start_date: Optional[str] = None,
@@ -2043,7 +4268,7 @@ async def get_activity_logs(
             # Parse the date string properly
             try:
                 parsed_start = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-                date_query["$gte"] = parsed_start.isoformat()
+                date_query["$gte"] = as_utc(parsed_start)
             except ValueError:
                 # If parsing fails, use the original string
                 date_query["$gte"] = start_date
@@ -2051,7 +4276,7 @@ async def get_activity_logs(
             # Parse the date string properly
             try:
                 parsed_end = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-                date_query["$lte"] = parsed_end.isoformat()
+                date_query["$lte"] = as_utc(parsed_end)
             except ValueError:
                 # If parsing fails, use the original string
                 date_query["$lte"] = end_date
@@ -2083,7 +4308,7 @@ async def get_activity_logs(
             # Parse the date string properly
             try:
                 parsed_start = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-                date_query["$gte"] = parsed_start.isoformat()
+                date_query["$gte"] = as_utc(parsed_start)
             except ValueError:
                 # If parsing fails, use the original string
                 date_query["$gte"] = start_date
@@ -2091,7 +4316,7 @@ async def get_activity_logs(
             # Parse the date string properly
             try:
                 parsed_end = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-                date_query["$lte"] = parsed_end.isoformat()
+                date_query["$lte"] = as_utc(parsed_end)
             except ValueError:
                 # If parsing fails, use the original string
                 date_query["$lte"] = end_date
@@ -2137,7 +4362,7 @@ async def get_activity_logs(
             # Parse the date string properly
             try:
                 parsed_start = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-                date_query["$gte"] = parsed_start.isoformat()
+                date_query["$gte"] = as_utc(parsed_start)
             except ValueError:
                 # If parsing fails, use the original string
                 date_query["$gte"] = start_date
@@ -2145,7 +4370,7 @@ async def get_activity_logs(
             # Parse the date string properly
             try:
                 parsed_end = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-                date_query["$lte"] = parsed_end.isoformat()
+                date_query["$lte"] = as_utc(parsed_end)
             except ValueError:
                 # If parsing fails, use the original string
                 date_query["$lte"] = end_date
@@ -2190,7 +4415,7 @@ async def get_activity_logs(
             # Parse the date string properly
             try:
                 parsed_start = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-                date_query["$gte"] = parsed_start.isoformat()
+                date_query["$gte"] = as_utc(parsed_start)
             except ValueError:
                 # If parsing fails, use the original string
                 date_query["$gte"] = start_date
@@ -2198,7 +4423,7 @@ async def get_activity_logs(
             # Parse the date string properly
             try:
                 parsed_end = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-                date_query["$lte"] = parsed_end.isoformat()
+                date_query["$lte"] = as_utc(parsed_end)
             except ValueError:
                 # If parsing fails, use the original string
                 date_query["$lte"] = end_date
@@ -2248,7 +4473,7 @@ async def get_activity_logs(
             # Parse the date string properly
             try:
                 parsed_start = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-                date_query["$gte"] = parsed_start.isoformat()
+                date_query["$gte"] = as_utc(parsed_start)
             except ValueError:
                 # If parsing fails, use the original string
                 date_query["$gte"] = start_date
@@ -2256,7 +4481,7 @@ async def get_activity_logs(
             # Parse the date string properly
             try:
                 parsed_end = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-                date_query["$lte"] = parsed_end.isoformat()
+                date_query["$lte"] = as_utc(parsed_end)
             except ValueError:
                 # If parsing fails, use the original string
                 date_query["$lte"] = end_date
@@ -2298,8 +4523,8 @@ async def get_activity_logs(
             }
         })
     
-    # Sort logs by timestamp
-    logs.sort(key=lambda x: x["timestamp"], reverse=True)
+    # Sort logs by timestamp; documents not yet migrated to BSON dates still hold ISO strings
+    logs.sort(key=lambda x: to_timestamp(x["timestamp"] or EPOCH), reverse=True)
     
     return {"logs": logs[:limit]}
 
@@ -0,0 +1,78 @@
+import asyncio
+import uuid
+
+import server
+from server import (ClientCreate, EmployeeCreate, ExpenseCreate, InvoiceCreate, InvoiceUpdate, PaymentCreate,
+                    PreventiveTaskCreate, VehicleCreate, WorkOrderBulkUpdate, WorkOrderCreate, WorkOrderUpdate)
+
+
+async def run_company_stats_checks(db):
+    company_id = str(uuid.uuid4())
+    admin = {"id": str(uuid.uuid4()), "company_id": company_id, "role": "ADMIN"}
+
+    await server.apply_index_specs()
+    await db.companies.insert_one({"id": company_id, "name": "Stats", "industry": "automotive"})
+    # Built from the (empty) collections on first read
+    overview = await server.get_overview_report(company_id, current_user=admin)
+    assert overview["total_work_orders"] == 0 and overview["total_revenue"] == 0, overview
+
+    clients = [await server.create_client(company_id, ClientCreate(name=f"Client {i}"), current_user=admin)
+               for i in range(3)]
+    await server.delete_client(company_id, clients[0].id, current_user=admin)
+    await server.create_employee(company_id, EmployeeCreate(user_id=str(uuid.uuid4())), current_user=admin)
+    await server.create_vehicle(
+        company_id, VehicleCreate(plate_number="STATS-1", make="Toyota", model="Hilux", owner_client_id=clients[1].id),
+        current_user=admin)
+    await server.create_preventive_task(company_id, PreventiveTaskCreate(title="Filters", frequency="monthly"),
+                                        current_user=admin)
+
+    work_orders = [
+        await server.create_work_order(company_id, WorkOrderCreate(title=f"Job {i}", quoted_price=100),
+                                       current_user=admin)
+        for i in range(6)
+    ]
+    await server.approve_work_order(company_id, work_orders[0].id, current_user=admin)
+    await server.update_work_order(company_id, work_orders[1].id, WorkOrderUpdate(status="IN_PROGRESS"),
+                                   current_user=admin)
+    await server.update_work_order(company_id, work_orders[1].id, WorkOrderUpdate(title="Renamed"),
+                                   current_user=admin)
+    await server.bulk_update_work_orders(
+        company_id, WorkOrderBulkUpdate(ids=[wo.id for wo in work_orders[2:5]], operation="status",
+                                        status="COMPLETED"), current_user=admin)
+    await server.add_expense(company_id, work_orders[2].id, ExpenseCreate(description="Parts", amount=40.5),
+                             current_user=admin)
+
+    invoices = [await server.create_invoice(company_id, InvoiceCreate(work_order_id=wo.id), current_user=admin)
+                for wo in work_orders[2:5]]
+    await server.update_invoice(company_id, invoices[0].id, InvoiceUpdate(status="PAID"), current_user=admin)
+    await server.update_invoice(company_id, invoices[1].id, InvoiceUpdate(status="CANCELLED"), current_user=admin)
+    await server.process_payment(company_id, PaymentCreate(work_order_id=work_orders[2].id, amount=60,
+                                                           payment_method="cash"), current_user=admin)
+
+    overview = await server.get_overview_report(company_id, current_user=admin)
+    assert overview["status_breakdown"] == {"PENDING": 1, "APPROVED": 1, "IN_PROGRESS": 1, "COMPLETED": 3}, overview
+    assert overview["total_revenue"] == 200 and overview["pending_invoices"] == 1, overview
+    assert overview["total_expenses"] == 40.5 and overview["total_payments"] == 60, overview
+    assert overview["active_clients"] == 2 and overview["active_employees"] == 1, overview
+    assert overview["total_vehicles"] == 1 and overview["preventive_tasks"] == {"total": 1, "active": 1}, overview
+
+    # The incremental counters agree with a full recount
+    result = await server.reconcile_company_stats(company_id, current_user=admin)
+    assert result["drift"] == {}, result
+
+    # Writes that bypass the handlers are repaired by reconciliation
+    await db.expenses.insert_one({"id": str(uuid.uuid4()), "company_id": company_id, "amount": 10})
+    result = await server.reconcile_company_stats(company_id, current_user=admin)
+    assert result["drift"] == {"expenses": {"stored": 40.5, "actual": 50.5}}, result
+    assert (await server.get_overview_report(company_id, current_user=admin))["total_expenses"] == 50.5
+
+    print("✅ company_stats matches a full recount after every write handler")
+
+
+def test_company_stats_track_writes(run_with_test_db):
+    run_with_test_db("company_stats", run_company_stats_checks)
+
+
+if __name__ == "__main__":
+    from conftest import with_test_db
+    asyncio.run(with_test_db("company_stats", run_company_stats_checks))
@@ -0,0 +1,78 @@
+import asyncio
+import uuid
+
+import httpx
+
+import server
+
+
+async def revalidate(api, url, etag, expected_status):
+    response = await api.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == expected_status, f"{url}: expected {expected_status}, got {response.status_code}"
+    return response
+
+
+async def run_conditional_get_checks(db):
+    company_id = str(uuid.uuid4())
+    admin = {"id": str(uuid.uuid4()), "company_id": company_id, "role": "ADMIN", "email": "etag-admin@example.com",
+             "display_name": "ETag Admin", "is_active": True, "password_hash": "unused"}
+    work_orders = [server.WorkOrder(company_id=company_id, order_number=f"WO-{i + 1:06d}", title=f"Job {i}",
+                                    created_by=admin["id"]).model_dump() for i in range(15)]
+    invoice = server.Invoice(company_id=company_id, work_order_id=work_orders[0]["id"], invoice_number="INV-000001",
+                             total_amount=100.0).model_dump()
+    await db.users.insert_one(dict(admin))
+    await db.companies.insert_one({"id": company_id, "name": "ETag Co", "industry": "automotive"})
+    await db.work_orders.insert_many(work_orders)
+    await db.invoices.insert_one(invoice)
+
+    token = server.create_token(admin["id"], company_id, "ADMIN")
+    transport = httpx.ASGITransport(app=server.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://test",
+                                     headers={"Authorization": f"Bearer {token}"}) as api:
+            base = f"/api/companies/{company_id}"
+            lists = {"work orders": f"{base}/workorders?limit=5",
+                     "sparse work orders": f"{base}/workorders?limit=5&fields=title",
+                     "invoices": f"{base}/invoices"}
+            newest = (await api.get(lists["work orders"])).json()["work_orders"][0]
+            details = {"work order": f"{base}/workorders/{newest['id']}", "invoice": f"{base}/invoices/{invoice['id']}"}
+
+            # Plain GETs carry an ETag; sending it back is answered 304 with the same ETag
+            etags = {}
+            for name, url in {**lists, **details}.items():
+                response = await api.get(url)
+                assert response.status_code == 200 and response.headers.get("etag"), (name, response.status_code)
+                etags[name] = response.headers["etag"]
+                not_modified = await revalidate(api, url, etags[name], 304)
+                assert not_modified.headers["etag"] == etags[name], name
+                assert not_modified.content == b"", name
+            sparse = (await api.get(lists["sparse work orders"])).json()["work_orders"]
+            assert all(set(wo) == {"id", "created_at", "title"} for wo in sparse), sparse[0]
+
+            # Writes change both the list and the detail ETags
+            updated = await api.put(details["work order"], json={"title": "Renamed"})
+            assert updated.status_code == 200, updated.text
+            updated = await api.put(details["invoice"], json={"tax_amount": 5.0})
+            assert updated.status_code == 200, updated.text
+            for name, url in {**lists, **details}.items():
+                response = await revalidate(api, url, etags[name], 200)
+                assert response.headers["etag"] != etags[name], f"{name} ETag did not change after a write"
+                await revalidate(api, url, response.headers["etag"], 304)
+
+            # A new work order lands on the first page and changes its ETag
+            etag = (await api.get(lists["work orders"])).headers["etag"]
+            created = await api.post(f"{base}/workorders", json={"title": "Fresh"})
+            assert created.status_code == 200, created.text
+            await revalidate(api, lists["work orders"], etag, 200)
+        print("✅ list and detail GETs revalidate with 304 and change ETag after writes")
+    finally:
+        await server.user_cache.delete(admin["id"])
+
+
+def test_conditional_get(run_with_test_db):
+    run_with_test_db("conditional_get", run_conditional_get_checks, tz_aware=True)
+
+
+if __name__ == "__main__":
+    from conftest import with_test_db
+    asyncio.run(with_test_db("conditional_get", run_conditional_get_checks, tz_aware=True))
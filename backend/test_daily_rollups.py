@@ -0,0 +1,132 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException
+from pymongo.errors import BulkWriteError
+
+import server
+from server import (ExpenseCreate, InvoiceCreate, InvoiceUpdate, PaymentCreate, WorkOrderBulkUpdate, WorkOrderCreate,
+                    WorkOrderUpdate)
+
+
+async def rollup_days(db, company_id):
+    return {rollup['day']: rollup async for rollup in
+            db.daily_rollups.find({"company_id": company_id}, {"_id": 0}).sort("day", 1)}
+
+
+def rollup_totals(rollups):
+    """Non-zero counters per day; increments can leave a counter at 0 where a rebuild leaves it out"""
+    totals = {day: {field: rollup[field] for field in server.ROLLUP_FIELDS if rollup.get(field)}
+              for day, rollup in rollups.items()}
+    return {day: fields for day, fields in totals.items() if fields}
+
+
+async def run_daily_rollup_checks(db):
+    server.rollup_tenants.clear()
+
+    company_id = str(uuid.uuid4())
+    admin = {"id": str(uuid.uuid4()), "company_id": company_id, "role": "ADMIN"}
+
+    await server.apply_index_specs()
+    await db.companies.insert_one({"id": company_id, "name": "Rollups", "industry": "automotive"})
+
+    # History written before rollups existed: one work order a day through Q4 2024 and Q1 2025
+    start = datetime(2024, 10, 1, 9, tzinfo=timezone.utc)
+    history = []
+    for i in range(182):
+        created_at = (start + timedelta(days=i)).isoformat()
+        history.append(server.WorkOrder(company_id=company_id, order_number=f"WO-{i + 1:06d}", title=f"Old {i}",
+                                        created_by=admin["id"], status="COMPLETED" if i % 2 else "PENDING",
+                                        created_at=created_at, updated_at=created_at).model_dump())
+    await db.work_orders.insert_many(history)
+    await db.invoices.insert_one({"id": str(uuid.uuid4()), "company_id": company_id, "work_order_id": history[0]["id"],
+                                  "invoice_number": "INV-000001", "total_amount": 120.0, "status": "PAID",
+                                  "issued_date": history[0]["created_at"], "created_at": history[0]["created_at"]})
+
+    # A backfill whose writes fail leaves the tenant unmarked, so the next read retries it
+    rebuild = server.rebuild_daily_rollups
+
+    async def failing_rebuild(failing_company_id):
+        raise BulkWriteError({"writeErrors": [{"index": 0, "code": 11000, "errmsg": "E11000 duplicate key"}]})
+
+    server.rebuild_daily_rollups = failing_rebuild
+    try:
+        await server.get_workorder_trends(company_id, group_by="quarter", current_user=admin)
+        raise AssertionError("failed backfill was not reported")
+    except HTTPException as e:
+        assert e.status_code == 503, e.status_code
+    finally:
+        server.rebuild_daily_rollups = rebuild
+    assert company_id not in server.rollup_tenants
+    assert not (await db.companies.find_one({"id": company_id})).get("rollups_backfilled_at")
+
+    # The first successful trend read backfills the rollups
+    quarters = await server.get_workorder_trends(company_id, from_date="2024-10-01", to_date="2025-03-31",
+                                                 group_by="quarter", current_user=admin)
+    assert quarters["trends"] == {"2024-Q4": 92, "2025-Q1": 90}, quarters
+    assert quarters["series"][0]["revenue"] == 120.0 and quarters["series"][0]["completed"] == 46, quarters
+    assert len(await rollup_days(db, company_id)) == 182
+
+    weeks = await server.get_workorder_trends(company_id, from_date="2024-12-30", to_date="2025-01-05",
+                                              group_by="week", current_user=admin)
+    assert weeks["trends"] == {"2025-W01": 7}, weeks
+    months = await server.get_workorder_trends(company_id, from_date="2025-02-01", to_date="2025-02-28",
+                                               group_by="month", current_user=admin)
+    assert months["trends"] == {"2025-02": 28}, months
+    try:
+        await server.get_workorder_trends(company_id, group_by="year", current_user=admin)
+        raise AssertionError("unknown group_by accepted")
+    except HTTPException as e:
+        assert e.status_code == 400
+
+    # Writes keep today's rollup current
+    work_orders = [await server.create_work_order(company_id, WorkOrderCreate(title=f"New {i}", quoted_price=80),
+                                                  current_user=admin) for i in range(4)]
+    await server.update_work_order(company_id, work_orders[0].id, WorkOrderUpdate(status="COMPLETED"),
+                                   current_user=admin)
+    await server.bulk_update_work_orders(
+        company_id, WorkOrderBulkUpdate(ids=[wo.id for wo in work_orders[:3]], operation="status",
+                                        status="COMPLETED"), current_user=admin)
+    await server.add_expense(company_id, work_orders[1].id, ExpenseCreate(description="Parts", amount=12.5),
+                             current_user=admin)
+    invoice = await server.create_invoice(company_id, InvoiceCreate(work_order_id=work_orders[1].id),
+                                          current_user=admin)
+    await server.update_invoice(company_id, invoice.id, InvoiceUpdate(status="CANCELLED"), current_user=admin)
+    await server.create_invoice(company_id, InvoiceCreate(work_order_id=work_orders[2].id), current_user=admin)
+    await server.process_payment(company_id, PaymentCreate(work_order_id=work_orders[2].id, amount=30,
+                                                           payment_method="cash"), current_user=admin)
+
+    today = server.rollup_day(None)
+    maintained = await rollup_days(db, company_id)
+    assert {key: maintained[today].get(key) for key in server.ROLLUP_FIELDS} == {
+        "created": 4, "completed": 3, "revenue": 80, "expenses": 12.5, "payments": 30}, maintained[today]
+
+    # completed counts orders that are COMPLETED now: reopening or approving one takes it off its completion day
+    legacy_day = server.rollup_day(history[1]["created_at"])
+    assert maintained[legacy_day]["completed"] == 1
+    await server.update_work_order(company_id, work_orders[2].id, WorkOrderUpdate(status="IN_PROGRESS"),
+                                   current_user=admin)
+    await server.approve_work_order(company_id, history[1]["id"], current_user=admin)
+    maintained = await rollup_days(db, company_id)
+    assert maintained[today]["completed"] == 2 and not maintained[legacy_day].get("completed"), maintained
+
+    # A rebuild racing with the write handlers' upserts neither fails nor duplicates days
+    await asyncio.gather(server.rebuild_daily_rollups(company_id),
+                         *(server.inc_daily_rollup(company_id, "2030-01-01", {"created": 1}) for _ in range(20)))
+    assert await db.daily_rollups.count_documents({"company_id": company_id, "day": "2030-01-01"}) <= 1
+
+    # A backfill from history produces the same totals
+    await server.rebuild_daily_rollups(company_id)
+    assert rollup_totals(await rollup_days(db, company_id)) == rollup_totals(maintained)
+
+    print("✅ daily_rollups are backfilled on first read and kept current by the write handlers")
+
+
+def test_trends_are_served_from_daily_rollups(run_with_test_db):
+    run_with_test_db("daily_rollups", run_daily_rollup_checks)
+
+
+if __name__ == "__main__":
+    from conftest import with_test_db
+    asyncio.run(with_test_db("daily_rollups", run_daily_rollup_checks))
@@ -0,0 +1,81 @@
+import asyncio
+import uuid
+
+import server
+
+
+def change(collection, operation, document, before=None):
+    """A change stream event as TenantEventHub receives it"""
+    event = {"ns": {"coll": collection}, "operationType": operation}
+    if operation == "delete":
+        event["fullDocumentBeforeChange"] = dict(before or document)
+    else:
+        event["fullDocument"] = dict(document)
+    return event
+
+
+def drain(queue):
+    events = []
+    while not queue.empty():
+        events.append(queue.get_nowait().split("\n")[0].removeprefix("event: "))
+    return events
+
+
+async def run_event_visibility_checks(db):
+    company_id = str(uuid.uuid4())
+    users = {
+        "admin": {"id": "admin", "company_id": company_id, "role": "ADMIN"},
+        "alice": {"id": "alice", "company_id": company_id, "role": "EMPLOYEE"},
+        "bob": {"id": "bob", "company_id": company_id, "role": "EMPLOYEE"},
+        "acme": {"id": "acme-user", "company_id": company_id, "role": "CLIENT", "client_id": "acme"},
+        "globex": {"id": "globex-user", "company_id": company_id, "role": "CLIENT", "client_id": "globex"},
+    }
+    # alice's job for acme, and an approved one for globex that every employee may see
+    alices_job = {"id": "wo-alice", "company_id": company_id, "status": "IN_PROGRESS",
+                  "assigned_technicians": ["alice"], "requested_by_client_id": "acme"}
+    approved_job = {"id": "wo-approved", "company_id": company_id, "status": "APPROVED",
+                    "assigned_technicians": [], "requested_by_client_id": "globex"}
+    await db.work_orders.insert_many([dict(alices_job), dict(approved_job)])
+
+    hub = server.TenantEventHub(queue_size=100, heartbeat=15)
+    queues = {name: asyncio.Queue(maxsize=100) for name in users}
+    hub.subscribers[company_id] = {id(queue): (users[name], queue) for name, queue in queues.items()}
+    comment = {"id": "c-1", "company_id": company_id, "work_order_id": "wo-alice", "user_id": "alice", "content": "Done"}
+    invoice = {"id": "inv-1", "company_id": company_id, "work_order_id": "wo-alice", "total_amount": 10.0}
+    for event in (change("work_orders", "update", alices_job), change("comments", "insert", comment),
+                  change("invoices", "insert", invoice), change("comments", "delete", comment)):
+        await hub._dispatch(event)
+    received = {name: drain(queue) for name, queue in queues.items()}
+
+    expected = ["work_order.updated", "comment.created", "invoice.created", "comment.deleted"]
+    assert received["admin"] == received["alice"] == received["acme"] == expected, received
+    # bob is not assigned and globex did not request the job; employees see every invoice, as GET /invoices does
+    assert received["bob"] == ["invoice.created"], received["bob"]
+    assert received["globex"] == [], received["globex"]
+
+    # An approved job is visible to all employees but still only to the client that requested it
+    for event in (change("work_orders", "update", approved_job),
+                  change("comments", "insert", {**comment, "id": "c-2", "work_order_id": "wo-approved"})):
+        await hub._dispatch(event)
+    received = {name: drain(queue) for name, queue in queues.items()}
+    assert received["bob"] == received["alice"] == received["globex"] == ["work_order.updated", "comment.created"]
+    assert received["acme"] == [], received["acme"]
+
+    # Notifications go to their recipient only, whatever the role
+    await hub._dispatch(change("notifications", "insert", {"id": "n-1", "company_id": company_id, "user_id": "bob"}))
+    received = {name: drain(queue) for name, queue in queues.items()}
+    assert received == {**{name: [] for name in users}, "bob": ["notification.created"]}, received
+
+    # Other tenants' changes reach nobody
+    await hub._dispatch(change("work_orders", "insert", {**alices_job, "company_id": "other-company"}))
+    assert not any(drain(queue) for queue in queues.values())
+    print("✅ change events reach only the subscribers allowed to see them")
+
+
+def test_events_follow_visibility_rules(run_with_test_db):
+    run_with_test_db("event_visibility", run_event_visibility_checks, tz_aware=True)
+
+
+if __name__ == "__main__":
+    from conftest import with_test_db
+    asyncio.run(with_test_db("event_visibility", run_event_visibility_checks, tz_aware=True))
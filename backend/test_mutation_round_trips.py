@@ -0,0 +1,98 @@
+import asyncio
+import uuid
+
+from fastapi import HTTPException
+from pymongo import monitoring
+
+import server
+from server import CommentUpdate, InvoiceUpdate, UserCreate, WorkOrderUpdate
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts every command sent to the server, except report counter updates"""
+    IGNORED_COLLECTIONS = ("company_stats", "daily_rollups")
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        if event.command.get(event.command_name) not in self.IGNORED_COLLECTIONS:
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def run_round_trip_checks(db, counter):
+    company_id = str(uuid.uuid4())
+    admin = {"id": str(uuid.uuid4()), "company_id": company_id, "role": "ADMIN", "email": "admin@example.com",
+             "display_name": "Admin"}
+    work_order = server.WorkOrder(company_id=company_id, order_number="WO-000001", title="Brakes", created_by=admin["id"])
+    invoice = server.Invoice(company_id=company_id, work_order_id=work_order.id, invoice_number="INV-000001", total_amount=100)
+    comment = server.Comment(work_order_id=work_order.id, company_id=company_id, user_id=admin["id"], content="First")
+
+    async def commands(call):
+        counter.count = 0
+        result = await call
+        return result, counter.count
+
+    async def rejected(call):
+        counter.count = 0
+        try:
+            await call
+        except HTTPException as e:
+            return e.status_code, counter.count
+        raise AssertionError("expected the request to be rejected")
+
+    await server.apply_index_specs()
+    await db.work_orders.insert_one(work_order.model_dump())
+    await db.invoices.insert_one(invoice.model_dump())
+    await db.comments.insert_one(comment.model_dump())
+
+    new_user = UserCreate(company_id=company_id, role="EMPLOYEE", email="tech@example.com",
+                          password="secret", display_name="Tech")
+    user, count = await commands(server.create_user(new_user, admin))
+    assert count == 1 and '_id' not in user and 'password_hash' not in user, (count, user)
+    assert await rejected(server.create_user(new_user, admin)) == (400, 1)
+
+    renamed = new_user.model_copy(update={"display_name": "Technician", "version": 0})
+    updated, count = await commands(server.update_user(user['id'], renamed, admin))
+    assert count == 1 and updated['display_name'] == "Technician" and updated['version'] == 1, (count, updated)
+    assert 'password' not in await db.users.find_one({"id": user['id']})
+    # Editing with the version read before the first edit is a conflict
+    assert (await rejected(server.update_user(user['id'], renamed, admin)))[0] == 409
+
+    updated, count = await commands(server.update_work_order(
+        company_id, work_order.id, WorkOrderUpdate(title="Brakes and pads", version=0), admin))
+    assert count == 1 and updated['title'] == "Brakes and pads" and updated['version'] == 1, (count, updated)
+    assert (await rejected(server.update_work_order(
+        company_id, work_order.id, WorkOrderUpdate(title="Stale", version=0), admin)))[0] == 409
+    assert (await rejected(server.update_work_order(
+        company_id, str(uuid.uuid4()), WorkOrderUpdate(title="Missing"), admin)))[0] == 404
+
+    updated, count = await commands(server.update_invoice(
+        company_id, invoice.id, InvoiceUpdate(status="ISSUED"), admin))
+    assert count == 1 and updated['status'] == "ISSUED", (count, updated)
+
+    updated, count = await commands(server.update_comment(
+        company_id, comment.id, CommentUpdate(content="Edited"), admin))
+    assert count == 1 and updated['content'] == "Edited" and updated['user']['id'] == admin['id'], (count, updated)
+    employee = {**admin, "id": user['id'], "role": "EMPLOYEE"}
+    assert (await rejected(server.update_comment(
+        company_id, comment.id, CommentUpdate(content="Not mine"), employee)))[0] == 403
+
+    print("✅ create/update handlers each issue a single database command")
+
+
+def test_mutations_take_one_round_trip(run_with_test_db):
+    counter = CommandCounter()
+    run_with_test_db("round_trips", lambda db: run_round_trip_checks(db, counter), event_listeners=[counter])
+
+
+if __name__ == "__main__":
+    from conftest import with_test_db
+    counter = CommandCounter()
+    asyncio.run(with_test_db("round_trips", lambda db: run_round_trip_checks(db, counter), event_listeners=[counter]))
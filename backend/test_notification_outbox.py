@@ -0,0 +1,62 @@
+import asyncio
+import time
+import uuid
+
+import server
+from server import Notification, WorkOrder, WorkOrderBulkUpdate
+
+
+async def run_outbox_checks(db):
+    outbox = server.notification_outbox
+
+    company_id = str(uuid.uuid4())
+    admin = {"id": str(uuid.uuid4()), "company_id": company_id, "role": "ADMIN"}
+    technicians = [str(uuid.uuid4()) for _ in range(50)]
+    work_orders = [
+        WorkOrder(company_id=company_id, order_number=f"WO-{i + 1:06d}", title=f"Outbox {i}", created_by=admin["id"],
+                  assigned_technicians=technicians).model_dump()
+        for i in range(20)
+    ]
+
+    try:
+        await server.apply_index_specs()
+        await db.work_orders.insert_many(work_orders)
+        outbox.start()
+
+        # Approving 20 work orders notifies 1000 technicians; the request only queues them
+        start = time.perf_counter()
+        result = await server.bulk_update_work_orders(
+            company_id, WorkOrderBulkUpdate(ids=[wo["id"] for wo in work_orders], operation="approve"),
+            current_user=admin)
+        elapsed = time.perf_counter() - start
+        assert result["notifications"] == 1000, result
+        assert outbox.stats()["inline"] == 0, outbox.stats()
+
+        await asyncio.wait_for(outbox.queue.join(), timeout=10)
+        assert await db.notifications.count_documents({"company_id": company_id}) == 1000
+        assert outbox.stats()["batches"] <= 4, outbox.stats()
+
+        # A retried batch whose first insert landed must not duplicate anything
+        repeat = [Notification(user_id=admin["id"], company_id=company_id, type="retry", payload={})]
+        await outbox.deliver(repeat)
+        await outbox.deliver(repeat)
+        assert await db.notifications.count_documents({"company_id": company_id, "type": "retry"}) == 1
+
+        await outbox.close()
+        # With the dispatcher stopped, delivery falls back to inline
+        await server.send_notification(admin["id"], company_id, "inline", {})
+        assert await db.notifications.count_documents({"company_id": company_id, "type": "inline"}) == 1
+
+        print(f"✅ bulk approve queued 1000 notifications in {elapsed * 1000:.1f} ms; "
+              f"delivered in {outbox.stats()['batches']} batches")
+    finally:
+        await outbox.close()
+
+
+def test_notifications_are_batched_off_the_request_path(run_with_test_db):
+    run_with_test_db("outbox", run_outbox_checks)
+
+
+if __name__ == "__main__":
+    from conftest import with_test_db
+    asyncio.run(with_test_db("outbox", run_outbox_checks))
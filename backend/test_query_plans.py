@@ -0,0 +1,229 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import httpx
+from pymongo import monitoring
+
+import server
+
+# A query may examine at most this many index keys per document it returns (or skips, or
+# counts) plus slack for small result sets before it counts as a poorly indexed query shape
+MAX_KEYS_PER_DOCUMENT = 3
+KEY_SLACK = 50
+
+WORK_ORDERS_PER_TENANT = 1000
+STATUSES = ["PENDING", "APPROVED", "IN_PROGRESS", "COMPLETED"]
+
+
+class ReadCommandRecorder(monitoring.CommandListener):
+    """Records the read commands the endpoints send while recording is on"""
+    READ_COMMANDS = ("find", "aggregate", "count", "distinct")
+
+    def __init__(self):
+        self.recording = False
+        self.label = None
+        self.commands = []
+
+    def started(self, event):
+        if self.recording and event.command_name in self.READ_COMMANDS:
+            self.commands.append((self.label, event.command_name, dict(event.command)))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def walk(node):
+    if isinstance(node, dict):
+        yield node
+        for value in node.values():
+            yield from walk(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from walk(value)
+
+
+def explainable(command):
+    """The recorded command without session and routing fields, ready to wrap in explain"""
+    return {key: value for key, value in command.items()
+            if not key.startswith('$') and key not in ('lsid', 'txnNumber', 'readConcern')}
+
+
+def command_filter(command_name, command):
+    if command_name == "find":
+        return command.get("filter", {})
+    if command_name == "aggregate":
+        pipeline = command.get("pipeline", [])
+        return pipeline[0].get("$match", {}) if pipeline else {}
+    return command.get("query", {})
+
+
+async def documents_needed(db, explain, command_name, command):
+    """How many documents the command legitimately has to touch.
+    
+    A find needs what it returns plus what it skips; counts and aggregations
+    have to visit every document their filter matches.
+    """
+    if command_name == "find":
+        stats = next(node['executionStats'] for node in walk(explain) if isinstance(node.get('executionStats'), dict))
+        return stats['nReturned'] + command.get("skip", 0)
+    return await db[command[command_name]].count_documents(command_filter(command_name, command))
+
+
+async def seed(db):
+    now = datetime.now(timezone.utc)
+    for tenant in range(2):
+        company_id = f"plans-company-{tenant}"
+        await db.companies.insert_one({"id": company_id, "name": f"Plans {tenant}", "industry": "automotive"})
+        clients = [{"id": f"{company_id}-client-{i}", "company_id": company_id, "name": f"Client {i}",
+                    "created_at": now} for i in range(20)]
+        await db.clients.insert_many(clients)
+        await db.vehicles.insert_many([{"id": str(uuid.uuid4()), "company_id": company_id,
+                                        "plate_number": f"P-{tenant}-{i}", "owner_client_id": clients[i]["id"]}
+                                       for i in range(20)])
+        work_orders, invoices, expenses, comments = [], [], [], []
+        for i in range(WORK_ORDERS_PER_TENANT):
+            created_at = now - timedelta(hours=i)
+            work_order_id = str(uuid.uuid4())
+            work_orders.append({
+                "id": work_order_id, "company_id": company_id, "order_number": f"WO-{i + 1:06d}",
+                "title": f"Brake inspection {i}" if i % 10 == 0 else f"Engine service {i}",
+                "description": "Routine maintenance", "created_by": "plans-admin",
+                "requested_by_client_id": clients[i % len(clients)]["id"],
+                "assigned_technicians": [f"{company_id}-employee"] if i % 20 == 0 else [],
+                "status": STATUSES[i % len(STATUSES)], "priority": "MEDIUM", "quoted_price": 100.0,
+                "created_at": created_at, "updated_at": created_at,
+            })
+            if i % 2 == 0:
+                invoices.append({"id": str(uuid.uuid4()), "company_id": company_id, "work_order_id": work_order_id,
+                                 "invoice_number": f"INV-{i + 1:06d}", "total_amount": 100.0, "status": "ISSUED",
+                                 "created_at": created_at})
+            expenses.append({"id": str(uuid.uuid4()), "company_id": company_id, "work_order_id": work_order_id,
+                             "description": "Parts", "amount": 40.0, "uploaded_by": "plans-admin",
+                             "created_at": created_at})
+            comments.append({"id": str(uuid.uuid4()), "company_id": company_id, "work_order_id": work_order_id,
+                             "user_id": "plans-admin", "content": "Checked", "created_at": created_at})
+        await db.work_orders.insert_many(work_orders)
+        await db.invoices.insert_many(invoices)
+        await db.expenses.insert_many(expenses)
+        await db.comments.insert_many(comments)
+        await db.notifications.insert_many([
+            {"id": str(uuid.uuid4()), "user_id": f"{company_id}-user-{i % 50}", "company_id": company_id,
+             "type": "WORK_ORDER_UPDATED", "payload": {}, "sent_at": now - timedelta(minutes=i)}
+            for i in range(WORK_ORDERS_PER_TENANT)
+        ])
+    company_id = "plans-company-1"
+    await db.users.insert_many([
+        {"id": user_id, "company_id": company_id, "role": role, "client_id": client_id, "email": f"{user_id}@example.com",
+         "display_name": user_id, "is_active": True, "password_hash": "unused"}
+        for user_id, role, client_id in (("plans-admin", "ADMIN", None), (f"{company_id}-employee", "EMPLOYEE", None),
+                                         ("plans-client", "CLIENT", f"{company_id}-client-3"),
+                                         (f"{company_id}-user-7", "ADMIN", None))
+    ])
+    return work_orders[0]["id"]
+
+
+def endpoint_calls(work_order_id):
+    """(label, user id, path, query params) for each endpoint, called as that user"""
+    company_id = "plans-company-1"
+    base = f"/api/companies/{company_id}"
+    admin, employee, client = "plans-admin", f"{company_id}-employee", "plans-client"
+    week_ago = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
+
+    return [
+        ("work orders", admin, f"{base}/workorders", {}),
+        ("work orders page 20", admin, f"{base}/workorders", {"page": 20}),
+        ("work orders by status", admin, f"{base}/workorders", {"status": "COMPLETED"}),
+        ("work orders by client", admin, f"{base}/workorders", {"client_id": f"{company_id}-client-7"}),
+        ("work orders by technician", admin, f"{base}/workorders", {"assigned_to": employee}),
+        ("work orders as employee", employee, f"{base}/workorders", {}),
+        ("work orders as client", client, f"{base}/workorders", {}),
+        ("work orders search", employee, f"{base}/workorders", {"search": "brake"}),
+        ("work orders order number", admin, f"{base}/workorders", {"search": "WO-000042"}),
+        ("work orders short order number", admin, f"{base}/workorders", {"search": "wo-42"}),
+        ("work order", admin, f"{base}/workorders/{work_order_id}", {}),
+        ("invoices", admin, f"{base}/invoices", {}),
+        ("invoices as client", client, f"{base}/invoices", {}),
+        ("expenses", admin, f"{base}/workorders/{work_order_id}/expenses", {}),
+        ("comments", admin, f"{base}/workorders/{work_order_id}/comments", {}),
+        ("notifications", f"{company_id}-user-7", f"/api/users/{company_id}-user-7/notifications", {}),
+        ("overview report", admin, f"{base}/reports/overview", {}),
+        ("trends report", admin, f"{base}/reports/workorder-trends", {"from_date": week_ago, "group_by": "day"}),
+        ("profit/loss report", admin, f"{base}/reports/profit-loss-details", {}),
+    ]
+
+
+async def run_query_plan_checks(db, recorder):
+    try:
+        await server.apply_index_specs()
+        work_order_id = await seed(db)
+
+        # Through the app, so dependencies run as in production; responses with an ETag are
+        # requested again with If-None-Match to record the revalidation reads too
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test") as api:
+            for label, user_id, path, params in endpoint_calls(work_order_id):
+                user = await db.users.find_one({"id": user_id})
+                headers = {"Authorization": f"Bearer {server.create_token(user_id, user['company_id'], user['role'])}"}
+                recorder.label = label
+                recorder.recording = True
+                try:
+                    response = await api.get(path, params=params, headers=headers)
+                    assert response.status_code == 200, f"{label}: {response.status_code} {response.text}"
+                    if "order number" in label:
+                        found = [wo["order_number"] for wo in response.json()["work_orders"]]
+                        assert found == ["WO-000042"], f"{label}: found {found}"
+                    if response.headers.get("etag"):
+                        recorder.label = f"{label} (If-None-Match)"
+                        revalidated = await api.get(path, params=params,
+                                                    headers={**headers, "If-None-Match": response.headers["etag"]})
+                        assert revalidated.status_code == 304, f"{label}: revalidation got {revalidated.status_code}"
+                finally:
+                    recorder.recording = False
+        # Let background total recounts finish so they are recorded too
+        recorder.label = "background recount"
+        recorder.recording = True
+        while server.list_counts.recounts.in_flight:
+            await asyncio.gather(*server.list_counts.recounts.in_flight.values(), return_exceptions=True)
+        recorder.recording = False
+
+        assert recorder.commands, "no read commands were recorded"
+        failures, seen = [], set()
+        for label, command_name, command in recorder.commands:
+            collection = command[command_name]
+            shape = (label, command_name, repr(explainable(command)))
+            if shape in seen:
+                continue
+            seen.add(shape)
+
+            explain = await db.command({"explain": explainable(command), "verbosity": "executionStats"})
+            stages = {node['stage'] for node in walk(explain) if isinstance(node.get('stage'), str)}
+            keys_examined = next((node['totalKeysExamined'] for node in walk(explain) if 'totalKeysExamined' in node), 0)
+            needed = await documents_needed(db, explain, command_name, command)
+
+            summary = f"{label}: {command_name} {collection} keys={keys_examined} needed={needed} stages={sorted(stages)}"
+            if 'COLLSCAN' in stages:
+                failures.append(f"COLLSCAN - {summary}")
+            elif keys_examined > MAX_KEYS_PER_DOCUMENT * needed + KEY_SLACK:
+                failures.append(f"too many keys examined - {summary}")
+            else:
+                print(f"  ok {summary}")
+
+        assert not failures, "query plan regressions:\n" + "\n".join(failures)
+        print(f"✅ {len(seen)} query shapes across {len(endpoint_calls(work_order_id))} endpoints are index-backed")
+    finally:
+        for user_id in ("plans-admin", "plans-company-1-employee", "plans-client", "plans-company-1-user-7"):
+            await server.user_cache.delete(user_id)
+
+
+def test_endpoint_queries_use_indexes(run_with_test_db):
+    recorder = ReadCommandRecorder()
+    run_with_test_db("query_plans", lambda db: run_query_plan_checks(db, recorder), event_listeners=[recorder])
+
+
+if __name__ == "__main__":
+    from conftest import with_test_db
+    recorder = ReadCommandRecorder()
+    asyncio.run(with_test_db("query_plans", lambda db: run_query_plan_checks(db, recorder), event_listeners=[recorder]))
@@ -0,0 +1,32 @@
+import asyncio
+import uuid
+
+import server
+from server import WorkOrderCreate
+
+
+async def run_parallel_creates(db, total: int = 1000):
+    company_id = str(uuid.uuid4())
+    admin = {"id": str(uuid.uuid4()), "company_id": company_id, "role": "ADMIN"}
+    await server.apply_index_specs()
+    await db.companies.insert_one({"id": company_id, "name": "Sequence Test", "industry": "automotive"})
+
+    work_orders = await asyncio.gather(*(
+        server.create_work_order(company_id, WorkOrderCreate(title=f"Parallel {i}"), admin)
+        for i in range(total)
+    ))
+
+    numbers = sorted(int(work_order.order_number.split('-')[1]) for work_order in work_orders)
+    assert len(set(numbers)) == total, f"duplicate order numbers: {total - len(set(numbers))}"
+    assert numbers == list(range(1, total + 1)), "order numbers have gaps"
+    assert await db.work_orders.count_documents({"company_id": company_id}) == total
+    print(f"✅ {total} parallel work orders got WO-000001..WO-{total:06d} with no gaps or duplicates")
+
+
+def test_parallel_work_orders_get_unique_sequential_numbers(run_with_test_db):
+    run_with_test_db("sequences", run_parallel_creates, maxPoolSize=200)
+
+
+if __name__ == "__main__":
+    from conftest import with_test_db
+    asyncio.run(with_test_db("sequences", run_parallel_creates, maxPoolSize=200))
@@ -0,0 +1,78 @@
+import asyncio
+import uuid
+from datetime import datetime, timezone
+
+import server
+
+
+async def run_timestamp_migration_checks(db):
+    company_id = str(uuid.uuid4())
+    admin = {"id": str(uuid.uuid4()), "company_id": company_id, "role": "ADMIN"}
+    superadmin = {"id": str(uuid.uuid4()), "company_id": None, "role": "SUPERADMIN"}
+
+    # Documents written while timestamps were ISO strings, in the shapes the old code and clients produced
+    legacy = ["2024-03-01T10:00:00+00:00", "2024-03-01T14:00:00+04:00", "2024-03-02T09:30:00.123Z",
+              "2024-03-03", "2024-03-04T08:00:00.654321+00:00", "not a date"]
+    work_orders = [{"id": f"wo-{i}", "company_id": company_id, "order_number": f"WO-{i + 1:06d}", "title": f"Old {i}",
+                    "created_by": admin["id"], "status": "PENDING", "created_at": value, "updated_at": value}
+                   for i, value in enumerate(legacy)]
+    work_orders.append(server.WorkOrder(company_id=company_id, order_number="WO-000007", title="New",
+                                        created_by=admin["id"]).model_dump())
+    await db.work_orders.insert_many(work_orders)
+    await db.invoices.insert_one({"id": "inv-1", "company_id": company_id, "work_order_id": "wo-0",
+                                  "invoice_number": "INV-000001", "total_amount": 10.0, "status": "ISSUED",
+                                  "issued_date": legacy[0], "due_date": "2024-03-31T00:00:00+00:00",
+                                  "created_at": legacy[0]})
+
+    # Models read either form, so the API works before, during and after the migration
+    assert server.WorkOrder(**work_orders[1]).created_at == datetime(2024, 3, 1, 10, tzinfo=timezone.utc)
+
+    result = await server.migrate_timestamp_field("work_orders", "created_at", batch_size=2)
+    assert result == {"converted": 5, "unparseable": 1}, result
+    await server.migrate_timestamp_field("work_orders", "updated_at", batch_size=2)
+    await server.migrate_timestamp_field("invoices", "issued_date")
+    await server.migrate_timestamp_field("invoices", "due_date")
+    await server.migrate_timestamp_field("invoices", "created_at")
+
+    stored = {wo["id"]: wo["created_at"] async for wo in db.work_orders.find({}, {"_id": 0, "id": 1, "created_at": 1})}
+    assert stored["wo-0"] == stored["wo-1"] == datetime(2024, 3, 1, 10, tzinfo=timezone.utc), stored
+    assert stored["wo-2"] == datetime(2024, 3, 2, 9, 30, 0, 123000, tzinfo=timezone.utc)
+    assert stored["wo-3"] == datetime(2024, 3, 3, tzinfo=timezone.utc)
+    assert stored["wo-4"] == datetime(2024, 3, 4, 8, 0, 0, 654000, tzinfo=timezone.utc)  # BSON keeps milliseconds
+    assert stored["wo-5"] == "not a date"
+    assert await server.count_string_timestamps() == {"work_orders": {"created_at": 1, "updated_at": 1}}
+
+    # Running it again is a no-op
+    assert await server.migrate_timestamp_field("work_orders", "created_at") == {"converted": 0, "unparseable": 1}
+
+    # Range filters compare dates: 14:00+04:00 is 10:00 UTC and falls inside a UTC day filter
+    logs = await server.get_activity_logs(current_user=superadmin, start_date="2024-03-01T00:00:00Z",
+                                          end_date="2024-03-01T23:59:59Z")
+    assert sorted(log["resource_id"] for log in logs["logs"]) == ["wo-0", "wo-1"], logs
+
+    # Keyset pagination walks converted documents in created_at order
+    defaults = dict(status=None, assigned_to=None, client_id=None, priority=None, search=None,
+                    include_total=False, fields=None)
+    page = await server.get_work_orders(company_id, **defaults, page=1, limit=2, after=None, current_user=admin)
+    seen = [wo["id"] for wo in page["work_orders"]]
+    while page["pagination"]["next_cursor"]:
+        page = await server.get_work_orders(company_id, **defaults, page=1, limit=2,
+                                            after=page["pagination"]["next_cursor"], current_user=admin)
+        seen += [wo["id"] for wo in page["work_orders"]]
+    assert seen[:5] == [work_orders[6]["id"], "wo-4", "wo-3", "wo-2", "wo-1"], seen
+
+    # Trends rebuilt from migrated history land on UTC days
+    trends = await server.get_workorder_trends(company_id, from_date="2024-03-01", to_date="2024-03-31",
+                                               group_by="day", current_user=admin)
+    assert trends["trends"] == {"2024-03-01": 2, "2024-03-02": 1, "2024-03-03": 1, "2024-03-04": 1}, trends
+
+    print("✅ timestamps migrate to BSON dates in batches and read the same before and after")
+
+
+def test_timestamps_migrate_to_bson_dates(run_with_test_db):
+    run_with_test_db("timestamp_migration", run_timestamp_migration_checks, tz_aware=True)
+
+
+if __name__ == "__main__":
+    from conftest import with_test_db
+    asyncio.run(with_test_db("timestamp_migration", run_timestamp_migration_checks, tz_aware=True))
@@ -0,0 +1,113 @@
+import asyncio
+import math
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import jwt
+from fastapi.security import HTTPAuthorizationCredentials
+
+import server
+
+
+def bearer(token: str) -> HTTPAuthorizationCredentials:
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+def token_issued_at(user: dict, issued_at: datetime, access: bool = False) -> str:
+    """A token like create_token/create_access_token would mint at issued_at"""
+    token = server.create_access_token(user) if access else server.create_token(user['id'], user['company_id'], user['role'])
+    payload = jwt.decode(token, server.JWT_SECRET, algorithms=[server.JWT_ALGORITHM])
+    payload['iat'] = issued_at
+    payload['exp'] = issued_at + timedelta(hours=1)
+    return jwt.encode(payload, server.JWT_SECRET, algorithm=server.JWT_ALGORITHM)
+
+
+async def expect_status(call, status_code: int):
+    try:
+        await call
+    except server.HTTPException as e:
+        assert e.status_code == status_code, f"expected {status_code}, got {e.status_code}: {e.detail}"
+        return
+    raise AssertionError(f"expected HTTP {status_code}, the call succeeded")
+
+
+async def run_token_revocation_checks(db):
+    stateless = server.STATELESS_PRINCIPAL
+    server.STATELESS_PRINCIPAL = True
+
+    company_id = str(uuid.uuid4())
+    users = [{"id": str(uuid.uuid4()), "company_id": company_id, "role": "EMPLOYEE", "client_id": None,
+              "email": f"{name}@example.com", "display_name": name, "is_active": True, "password_hash": "unused"}
+             for name in ("revoked", "bystander", "later")]
+    revoked, bystander, later = users
+    await db.users.insert_many([dict(user) for user in users])
+    try:
+        await server.revocation_list.rebuild()
+        issued = datetime.now(timezone.utc) - timedelta(minutes=5)
+        old_token = token_issued_at(revoked, issued)
+        old_access = token_issued_at(revoked, issued, access=True)
+        assert (await server.get_current_user(bearer(old_token)))['id'] == revoked['id']
+        assert (await server.get_principal(bearer(old_access)))['id'] == revoked['id']
+
+        # A revoked user's existing tokens are rejected on both authentication paths
+        await server.revocation_list.revoke([revoked['id']])
+        await expect_status(server.get_current_user(bearer(old_token)), 401)
+        await expect_status(server.get_principal(bearer(old_access)), 401)
+        assert (await server.get_current_user(bearer(token_issued_at(bystander, issued))))['id'] == bystander['id']
+
+        # Tokens issued once not_before has passed (e.g. after logging in again) are accepted
+        record = await db.token_revocations.find_one({"user_id": revoked['id']})
+        await asyncio.sleep(max(0.0, record['not_before'] - datetime.now(timezone.utc).timestamp()))
+        fresh_token = server.create_token(revoked['id'], company_id, revoked['role'])
+        fresh_access = server.create_access_token(revoked)
+        assert jwt.decode(fresh_token, server.JWT_SECRET, algorithms=[server.JWT_ALGORITHM])['iat'] >= record['not_before']
+        assert (await server.get_current_user(bearer(fresh_token)))['id'] == revoked['id']
+        assert (await server.get_principal(bearer(fresh_access)))['id'] == revoked['id']
+
+        # Another worker's filter picks up a revocation made here on its next incremental refresh
+        other_worker = server.TokenRevocationList(capacity=100)
+        await other_worker.rebuild()
+        later_payload = {"user_id": later['id'], "iat": int(issued.timestamp())}
+        assert not await other_worker.is_revoked(later_payload)
+        await asyncio.sleep(0.01)  # revoked_at has millisecond precision
+        await server.revocation_list.revoke([later['id']])
+        assert not await other_worker.is_revoked(later_payload), "revocation seen before the refresh"
+        await other_worker.refresh()
+        assert await other_worker.is_revoked(later_payload), "incremental refresh missed the revocation"
+
+        # Revocations stamped by a worker whose clock is behind, or on the cursor itself, are still picked up,
+        # and re-reading the overlap window does not add records twice
+        skewed, tied = str(uuid.uuid4()), str(uuid.uuid4())
+        for user_id, revoked_at in ((skewed, other_worker.cursor - timedelta(seconds=10)), (tied, other_worker.cursor)):
+            await db.token_revocations.insert_one({"user_id": user_id, "revoked_at": revoked_at,
+                                                   "not_before": math.ceil(revoked_at.timestamp()),
+                                                   "expires_at": revoked_at + timedelta(hours=1)})
+        await other_worker.refresh()
+        for user_id in (skewed, tied):
+            assert await other_worker.is_revoked({"user_id": user_id, "iat": int(issued.timestamp())}), user_id
+        entries = other_worker.filter.count
+        await other_worker.refresh()
+        assert other_worker.filter.count == entries, "overlap window re-added revocations"
+
+        # A Bloom false positive is settled by the database and the token is accepted
+        tiny = server.TokenRevocationList(capacity=1)
+        tiny.filter = server.BloomFilter(1, error_rate=0.5)
+        tiny.filter.add(revoked['id'])
+        collision = next(candidate for candidate in (str(uuid.uuid4()) for _ in range(100000)) if candidate in tiny.filter)
+        assert not await tiny.is_revoked({"user_id": collision, "iat": int(issued.timestamp())})
+        assert tiny.stats()["filter_hits"] == 1 and tiny.stats()["false_positives"] == 1, tiny.stats()
+        assert await tiny.is_revoked({"user_id": revoked['id'], "iat": int(issued.timestamp())})
+        print("✅ revoked tokens are rejected, new ones accepted and revocations spread by refresh")
+    finally:
+        server.STATELESS_PRINCIPAL = stateless
+        for user in users:
+            await server.user_cache.delete(user['id'])
+
+
+def test_token_revocation(run_with_test_db):
+    run_with_test_db("token_revocation", run_token_revocation_checks, tz_aware=True)
+
+
+if __name__ == "__main__":
+    from conftest import with_test_db
+    asyncio.run(with_test_db("token_revocation", run_token_revocation_checks, tz_aware=True))
@@ -0,0 +1,126 @@
+import asyncio
+import os
+import tempfile
+import uuid
+from datetime import datetime, timezone
+
+from fastapi.security import HTTPAuthorizationCredentials
+from pymongo import monitoring
+
+import server
+import user_cache_server
+
+
+class UserFindCounter(monitoring.CommandListener):
+    """Counts find commands issued against the users collection"""
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        if event.command_name == "find" and event.command.get("find") == "users":
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def run_concurrent_misses(db, counter, requests: int = 100):
+    user_id = str(uuid.uuid4())
+    await db.users.insert_one({"id": user_id, "company_id": "test-company", "role": "ADMIN",
+                               "email": f"{user_id}@example.com", "display_name": "Single Flight",
+                               "is_active": True, "password_hash": "unused"})
+    token = server.create_token(user_id, "test-company", "ADMIN")
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    await server.user_cache.delete(user_id)
+    counter.count = 0
+
+    users = await asyncio.gather(*(server.get_current_user(credentials) for _ in range(requests)))
+
+    assert all(user['id'] == user_id for user in users)
+    assert all('password_hash' not in user for user in users)
+    assert counter.count == 1, f"expected exactly one users query, got {counter.count}"
+    print(f"✅ {requests} concurrent cache misses issued {counter.count} users query")
+
+
+async def run_stale_recache_check(db):
+    user_id = str(uuid.uuid4())
+    await db.users.insert_one({"id": user_id, "company_id": "test-company", "role": "ADMIN",
+                               "email": f"{user_id}@example.com", "display_name": "Before",
+                               "is_active": True, "password_hash": "unused"})
+    try:
+        token = server.create_token(user_id, "test-company", "ADMIN")
+        credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+        await server.user_cache.delete(user_id)
+
+        # A lookup reads the user, then an update commits and invalidates before the lookup caches its read
+        read_started = server.begin_user_read()
+        stale = await db.users.find_one({"id": user_id}, {"_id": 0, "password_hash": 0})
+        await db.users.update_one({"id": user_id}, {"$set": {"display_name": "After", "is_active": False}})
+        await server.invalidate_cached_users([user_id])
+        await server.cache_user_read(stale, read_started)
+        assert user_id in server.user_invalidated_at, "invalidation evicted while a read from before it was in flight"
+        server.end_user_read(read_started)
+        assert not server.user_invalidated_at, "invalidations kept after every read that needed them finished"
+
+        assert await server.user_cache.get(user_id) is None, "stale read was re-cached after the invalidation"
+        try:
+            await server.get_current_user(credentials)
+            raise AssertionError("deactivated user was served from a stale cache entry")
+        except server.HTTPException as e:
+            assert e.status_code == 403, e.status_code
+
+        # Reads that start after the invalidation cache normally
+        user = await server.load_user(user_id)
+        assert (await server.user_cache.get(user_id))["display_name"] == user["display_name"] == "After"
+        assert not server.active_user_reads and not server.user_invalidated_at
+        print("✅ a user invalidated during its lookup is not re-cached")
+    finally:
+        await server.user_cache.delete(user_id)
+
+
+async def run_shared_cache_round_trip_check():
+    socket_path = os.path.join(tempfile.mkdtemp(), "user-cache.sock")
+    cache_server = await asyncio.start_unix_server(user_cache_server.handle_connection, path=socket_path)
+    local = server.LocalUserCache(max_size=10, ttl=60)
+    shared = server.UnixSocketUserCache(socket_path, fallback=server.LocalUserCache(max_size=10, ttl=60))
+    user = {"id": str(uuid.uuid4()), "display_name": "Dates", "metadata": {"since": "2024-01-01"},
+            "created_at": datetime(2024, 1, 2, 3, 4, 5, 678000, tzinfo=timezone.utc), "last_login": None}
+    try:
+        for cache in (local, shared):
+            await cache.set(user["id"], dict(user))
+        from_local, from_shared = await local.get(user["id"]), await shared.get(user["id"])
+        assert shared.stats()["hits"] == 1, "read was not served by the shared cache"
+        assert from_shared == from_local == user, (from_shared, from_local)
+        assert isinstance(from_shared["created_at"], datetime)
+        print("✅ the shared and local user caches return the same types")
+    finally:
+        await shared.close()
+        await asyncio.sleep(0.1)  # let the server's handler see the connection close
+        cache_server.close()
+        await cache_server.wait_closed()
+        os.unlink(socket_path)
+
+
+def test_concurrent_misses_share_one_query(run_with_test_db):
+    counter = UserFindCounter()
+    run_with_test_db("singleflight", lambda db: run_concurrent_misses(db, counter), event_listeners=[counter])
+
+
+def test_invalidation_during_lookup_skips_recache(run_with_test_db):
+    run_with_test_db("singleflight", run_stale_recache_check)
+
+
+def test_shared_cache_round_trips_datetimes():
+    asyncio.run(run_shared_cache_round_trip_check())
+
+
+if __name__ == "__main__":
+    from conftest import with_test_db
+    counter = UserFindCounter()
+    asyncio.run(with_test_db("singleflight", lambda db: run_concurrent_misses(db, counter), event_listeners=[counter]))
+    asyncio.run(with_test_db("singleflight", run_stale_recache_check))
+    asyncio.run(run_shared_cache_round_trip_check())
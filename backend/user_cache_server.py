@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Host-wide user cache shared by every uvicorn worker on the machine.
+
+Workers started with USER_CACHE_BACKEND=unix talk to this process over a Unix
+socket using newline-delimited JSON, so a user fetched by one worker is warm
+for all of them and survives worker recycling (limit_max_requests).
+
+Usage:
+    python user_cache_server.py [--socket /tmp/multitenantcrm-user-cache.sock]
+
+Protocol (one JSON object per line, one response per request):
+    {"op": "get", "key": "<user_id>"}                      -> {"ok": true, "value": {...} | null}
+    {"op": "set", "key": "<user_id>", "value": {...}, "ttl": 600}
+    {"op": "delete", "key": "<user_id>"}
+    {"op": "stats"}
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+DEFAULT_SOCKET = os.environ.get('USER_CACHE_SOCKET', '/tmp/multitenantcrm-user-cache.sock')
+DEFAULT_TTL = 600
+DEFAULT_MAX_SIZE = int(os.environ.get('USER_CACHE_MAX_SIZE', 10000))
+
+
+class SharedUserStore:
+    """Bounded LRU of key -> (expires_at, serialized JSON) with lazy expiry on read"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, raw = entry
+        if time.monotonic() > expires_at:
+            del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return raw
+
+    def set(self, key, value, ttl):
+        self.entries[key] = (time.monotonic() + ttl, json.dumps(value, separators=(',', ':')))
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key):
+        self.entries.pop(key, None)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "evictions": self.evictions
+        }
+
+
+store = SharedUserStore(DEFAULT_MAX_SIZE)
+
+
+async def handle_connection(reader, writer):
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                message = json.loads(line)
+                op = message.get("op")
+                if op == "get":
+                    raw = store.get(message["key"])
+                    # Values are kept serialized, so a hit is spliced in without re-encoding
+                    response = b'{"ok":true,"value":' + (raw.encode('utf-8') if raw else b'null') + b'}'
+                elif op == "set":
+                    store.set(message["key"], message["value"], message.get("ttl", DEFAULT_TTL))
+                    response = b'{"ok":true}'
+                elif op == "delete":
+                    store.delete(message["key"])
+                    response = b'{"ok":true}'
+                elif op == "stats":
+                    response = json.dumps({"ok": True, "value": store.stats()}).encode('utf-8')
+                else:
+                    response = json.dumps({"ok": False, "error": f"unknown op {op}"}).encode('utf-8')
+            except (ValueError, KeyError) as e:
+                response = json.dumps({"ok": False, "error": str(e)}).encode('utf-8')
+            writer.write(response + b'\n')
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(socket_path):
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = await asyncio.start_unix_server(handle_connection, path=socket_path)
+    os.chmod(socket_path, 0o600)
+    logging.info(f"User cache server listening on {socket_path}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    parser.add_argument("--max-size", type=int, default=DEFAULT_MAX_SIZE)
+    args = parser.parse_args()
+    store.max_size = args.max_size
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    try:
+        asyncio.run(serve(args.socket))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
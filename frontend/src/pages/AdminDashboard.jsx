@@ -38,12 +38,12 @@ const AdminDashboard = ({ user, onLogout }) => {
       setLoading(true);
       const params = { page, limit: 10, ...filters };
       
-      const [workOrdersRes, clientsRes, employeesRes, companyRes] = await Promise.all([
-        axios.get(`${API}/companies/${user.company_id}/workorders`, { params }),
-        axios.get(`${API}/companies/${user.company_id}/clients`),
-        axios.get(`${API}/companies/${user.company_id}/employees`),
-        axios.get(`${API}/companies/${user.company_id}`)
-      ]);
+      const { data: dashboard } = await axios.get(`${API}/companies/${user.company_id}/dashboard`, {
+        params: { ...params, sections: 'work_orders,clients,employees,company' }
+      });
+      const [workOrdersRes, clientsRes, employeesRes, companyRes] = [
+        dashboard.work_orders, dashboard.clients, dashboard.employees, dashboard.company
+      ].map((data) => ({ data }));
       
       // Handle both old and new API response formats
       let workOrdersData, paginationData;
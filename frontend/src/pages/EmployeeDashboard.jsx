@@ -22,11 +22,10 @@ const EmployeeDashboard = ({ user, onLogout }) => {
     try {
       const params = { page, limit: 10, assigned_to: user.id, ...filters };
       
-      const [workOrdersRes, clientsRes, employeesRes] = await Promise.all([
-        axios.get(`${API}/companies/${user.company_id}/workorders`, { params }),
-        axios.get(`${API}/companies/${user.company_id}/clients`),
-        axios.get(`${API}/companies/${user.company_id}/employees`)
-      ]);
+      const { data: dashboard } = await axios.get(`${API}/companies/${user.company_id}/dashboard`, { params });
+      const [workOrdersRes, clientsRes, employeesRes] = [
+        dashboard.work_orders, dashboard.clients, dashboard.employees
+      ].map((data) => ({ data }));
       
       // Handle both old and new API response formats
       let workOrdersData, paginationData;
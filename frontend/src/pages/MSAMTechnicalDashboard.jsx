@@ -34,13 +34,10 @@ const MSAMTechnicalDashboard = ({ user, onLogout }) => {
     try {
       const params = { page, limit: 10, ...filters };
       
-      const [statsRes, workOrdersRes, companyRes, clientsRes, employeesRes] = await Promise.all([
-        axios.get(`${API}/companies/${user.company_id}/reports/overview`),
-        axios.get(`${API}/companies/${user.company_id}/workorders`, { params }),
-        axios.get(`${API}/companies/${user.company_id}`),
-        axios.get(`${API}/companies/${user.company_id}/clients`),
-        axios.get(`${API}/companies/${user.company_id}/employees`)
-      ]);
+      const { data: dashboard } = await axios.get(`${API}/companies/${user.company_id}/dashboard`, { params });
+      const [statsRes, workOrdersRes, companyRes, clientsRes, employeesRes] = [
+        dashboard.overview, dashboard.work_orders, dashboard.company, dashboard.clients, dashboard.employees
+      ].map((data) => ({ data }));
       
       // Handle both old and new API response formats
       let workOrdersData, paginationData;
@@ -41,6 +41,19 @@ echo.
 REM Navigate to project root directory
 cd /d "%~dp0"
 
+REM Apply database indexes once before the workers start; unique indexes
+REM (e.g. users.email) back duplicate checks, so a failed build stops here
+echo Applying database indexes...
+pushd backend
+python manage_indexes.py apply --strict
+if errorlevel 1 (
+    popd
+    echo Failed to create the database indexes. Fix the errors above and run this script again.
+    pause
+    exit /b 1
+)
+popd
+
 REM Start backend server in a new window
 echo [1/3] Starting backend server...
 start "Backend Server - FastAPI" /D "%cd%\backend" cmd /k "uvicorn server:app --host 0.0.0.0 --port 8000 --workers 8 --timeout-keep-alive 5 --limit-concurrency 100 --limit-max-requests 1000"